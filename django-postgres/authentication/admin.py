@@ -2,7 +2,7 @@ from django.contrib import admin
 from base.models import Event, Participant, Registration
 #Category
 # Submission
-from .models import User
+from .models import User, OutboxEmail
 
 # Register your models here.
 
@@ -10,7 +10,13 @@ class UserAdmin(admin.ModelAdmin):
     list_display = ['username', 'email', 'auth_provider', 'created_at']
 
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to_email', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+
+
 admin.site.register(User, UserAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
 admin.site.register(Event)
 admin.site.register(Participant)
 admin.site.register(Registration)
@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Attribute on the Django HttpRequest holding `(raw_token, validated_token)`
+VALIDATED_TOKEN_ATTR = '_jwt_validated_token'
+
+
+# The only columns kept in the cache; the rest of the user loads on first access
+CACHED_USER_FIELDS = ('id', 'is_active', 'is_staff')
+
+
+def get_user_cache():
+    return caches[getattr(settings, 'JWT_USER_CACHE_ALIAS', 'default')]
+
+
+def user_cache_enabled():
+    enabled = getattr(settings, 'JWT_USER_CACHE', None)
+    if enabled is None:
+        # Only safe when every process sees the same cache: with locmem a user
+        # deactivated in one worker would stay signed in on the others
+        return not isinstance(get_user_cache(), (LocMemCache, DummyCache))
+    return enabled
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    get_user_cache().delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that checks each token once per request and caches users.
+
+    The validated token is kept on the underlying HttpRequest, so
+    `TokenValidationMiddleware` and DRF share one signature check. Users come
+    from a TTL cache keyed by user id, which is cleared whenever the user is
+    saved or deleted (see `authentication.signals`). Only CACHED_USER_FIELDS
+    are cached, never the password hash, and only in a cache every process
+    shares unless JWT_USER_CACHE forces it on.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_request_token(request, raw_token)
+        return self.get_user(validated_token), validated_token
+
+    def get_request_token(self, request, raw_token):
+        """Validates `raw_token`, reusing the result from earlier in the same request."""
+        http_request = getattr(request, '_request', request)
+        validated = getattr(http_request, VALIDATED_TOKEN_ATTR, None)
+        if validated is not None and validated[0] == raw_token:
+            return validated[1]
+
+        validated_token = self.get_validated_token(raw_token)
+        setattr(http_request, VALIDATED_TOKEN_ATTR, (raw_token, validated_token))
+        return validated_token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not user_cache_enabled():
+            return super().get_user(validated_token)
+
+        cache = get_user_cache()
+        key = user_cache_key(user_id)
+        values = cache.get(key)
+        if values is None:
+            user = super().get_user(validated_token)
+            values = [getattr(user, field) for field in CACHED_USER_FIELDS]
+            cache.set(key, values, getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 60))
+            return user
+
+        # Unlisted fields are deferred, so reading one (e.g. the password for
+        # CHECK_REVOKE_TOKEN) costs a query
+        user = self.user_model.from_db(router.db_for_read(self.user_model), CACHED_USER_FIELDS, values)
+
+        # Same checks JWTAuthentication.get_user() runs after its query
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            from rest_framework_simplejwt.utils import get_md5_hash_password
+
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+class StatelessJWTAuthentication(CachedJWTAuthentication):
+    """
+    Builds a `TokenUser` from the token claims without loading the user.
+
+    Meant for read-only endpoints that never touch `request.user` beyond
+    knowing who is calling.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        return api_settings.TOKEN_USER_CLASS(validated_token)
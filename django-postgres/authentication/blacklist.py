@@ -0,0 +1,184 @@
+"""
+Cached lookups for the refresh token blacklist.
+
+Every refresh (and logout) asks whether the presented token's JTI is
+blacklisted. Almost never is the answer yes, so two cache layers answer
+most checks without touching `token_blacklist_blacklistedtoken`:
+
+* a positive entry per JTI, written when a token is blacklisted and kept
+  until the token would expire anyway;
+* a Bloom filter of every unexpired blacklisted JTI, rebuilt from the
+  database every `TOKEN_BLACKLIST_FILTER_TTL` seconds and shared through
+  the cache. A JTI the filter does not contain was not blacklisted when it
+  was built, and anything blacklisted since has a positive entry. Only a
+  "maybe" from the filter costs a query.
+
+Both layers need a cache every process shares (Redis, memcached, ...).
+With the per-process locmem default a token revoked in one worker would
+look valid to the others, so on locmem (and the dummy cache) the layers
+stay off unless `TOKEN_BLACKLIST_FILTER` forces them on.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+FILTER_KEY = 'auth:blacklist-filter'
+FILTER_LOCK_KEY = 'auth:blacklist-filter:lock'
+
+# The local copy of the shared filter and when it was fetched
+_local = {'filter': None, 'fetched_at': 0.0}
+
+
+def get_cache():
+    return caches[getattr(settings, 'TOKEN_BLACKLIST_CACHE_ALIAS', 'default')]
+
+
+def blacklisted_key(jti):
+    return f'auth:blacklisted:{jti}'
+
+
+def filter_enabled():
+    enabled = getattr(settings, 'TOKEN_BLACKLIST_FILTER', None)
+    if enabled is None:
+        # Only safe when every process sees the same cache
+        return not isinstance(get_cache(), (LocMemCache, DummyCache))
+    return enabled
+
+
+class BloomFilter:
+    """
+    A set of strings with no false negatives and about `error_rate` false positives.
+
+    The state is plain bytes plus two sizes, so it pickles compactly into the cache.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1000)
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def build_filter():
+    """Builds the filter from the database and shares it; returns it."""
+    now = timezone.now()
+    blacklisted = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+    bloom = BloomFilter(
+        blacklisted.count() * 2,  # Headroom for tokens blacklisted before the next rebuild
+        getattr(settings, 'TOKEN_BLACKLIST_FILTER_ERROR_RATE', 0.01),
+    )
+    for jti in blacklisted.values_list('token__jti', flat=True).iterator(chunk_size=5000):
+        bloom.add(jti)
+    # Kept twice as long as its TTL so a slow rebuild never leaves readers without one
+    get_cache().set(FILTER_KEY, (time.time(), bloom), filter_ttl() * 2)
+    _local.update(filter=bloom, fetched_at=time.monotonic())
+    return bloom
+
+
+def filter_ttl():
+    return getattr(settings, 'TOKEN_BLACKLIST_FILTER_TTL', 300)
+
+
+def get_filter():
+    """The current filter, or None while another process is (re)building it."""
+    if _local['filter'] is not None and time.monotonic() - _local['fetched_at'] < getattr(
+        settings, 'TOKEN_BLACKLIST_FILTER_LOCAL_TTL', 30
+    ):
+        return _local['filter']
+
+    cache = get_cache()
+    shared = cache.get(FILTER_KEY)
+    if shared is not None and time.time() - shared[0] < filter_ttl():
+        _local.update(filter=shared[1], fetched_at=time.monotonic())
+        return shared[1]
+
+    # Stale or missing; one process rebuilds, the rest keep using what they have
+    if cache.add(FILTER_LOCK_KEY, 1, 60):
+        try:
+            return build_filter()
+        finally:
+            cache.delete(FILTER_LOCK_KEY)
+    return shared[1] if shared is not None else None
+
+
+def is_blacklisted(jti):
+    """Whether the token with this JTI was blacklisted, querying only when the caches cannot say."""
+    if filter_enabled():
+        if get_cache().get(blacklisted_key(jti)):
+            return True
+        bloom = get_filter()
+        if bloom is not None and jti not in bloom:
+            return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def remember_blacklisted(jti, expires_at):
+    """Adds a positive entry for `jti` once the blacklisting commits."""
+    if not filter_enabled():
+        return
+    timeout = max(int((expires_at - timezone.now()).total_seconds()), 1)
+    transaction.on_commit(lambda: get_cache().set(blacklisted_key(jti), True, timeout))
+
+
+def blacklist(token, user=None):
+    """`token.blacklist()` without the extra user query, for callers that already have the user."""
+    outstanding = outstand(token, user)
+    return BlacklistedToken.objects.get_or_create(token=outstanding)
+
+
+def outstand(token, user=None):
+    """`token.outstand()` without the extra user query; returns the OutstandingToken."""
+    outstanding, _ = OutstandingToken.objects.get_or_create(
+        jti=token.payload[api_settings.JTI_CLAIM],
+        defaults={
+            'user': user,
+            'created_at': token.current_time,
+            'token': str(token),
+            'expires_at': datetime_from_epoch(token.payload['exp']),
+        },
+    )
+    return outstanding
+
+
+def purge_expired(batch_size=1000, now=None):
+    """
+    Deletes expired outstanding tokens and their blacklist rows, one batch per transaction.
+
+    Yields the number of outstanding tokens deleted by each batch, so callers
+    can report progress or pause between batches.
+    """
+    now = now or timezone.now()
+    while True:
+        with transaction.atomic():
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return
+            # Children first, so the parent delete has nothing left to cascade to
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        yield len(ids)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.blacklist import build_filter, filter_enabled, purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding and blacklisted refresh tokens in small batches, "
+        "then rebuild the blacklist filter. Batched replacement for flushexpiredtokens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Tokens deleted per transaction.")
+        parser.add_argument('--sleep', type=float, default=0, help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        deleted = 0
+        for count in purge_expired(options['batch_size']):
+            deleted += count
+            self.stdout.write(f"Deleted {deleted} expired tokens...", ending='\r')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        if filter_enabled():
+            build_filter()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tokens."))
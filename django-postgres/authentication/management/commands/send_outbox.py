@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from authentication.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox over pooled mail connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain what is due now and exit.")
+        parser.add_argument('--batch-size', type=int, help="Emails sent per connection (EMAIL_OUTBOX['BATCH_SIZE']).")
+        parser.add_argument('--rate', type=float, help="Messages per second (EMAIL_OUTBOX['RATE_LIMIT']).")
+        parser.add_argument('--interval', type=float, help="Seconds to sleep when idle (EMAIL_OUTBOX['POLL_INTERVAL']).")
+
+    def handle(self, *args, **options):
+        worker = OutboxWorker(batch_size=options['batch_size'], rate_limit=options['rate'])
+        if options['once']:
+            while worker.run_once():
+                pass
+            metrics = worker.metrics
+            self.stdout.write(self.style.SUCCESS(
+                f"Sent {metrics['sent']}, retrying {metrics['retried']}, failed {metrics['failed']} "
+                f"in {metrics['batches']} batches ({metrics['send_seconds']:.2f}s)."
+            ))
+            return
+
+        self.stdout.write("Outbox worker started.")
+        worker.run_forever(poll_interval=options['interval'])
@@ -1,41 +1,87 @@
 # authentication/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.contrib.auth.models import AnonymousUser
 from django.http import JsonResponse
 from django.utils import timezone
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.utils.functional import SimpleLazyObject
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from .authentication import CachedJWTAuthentication
+
 class TokenValidationMiddleware:
+    # Runs natively in both stacks, so async views under ASGI are not pushed onto a thread
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.jwt_auth = CachedJWTAuthentication()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Extract token from the Authorization header
-        auth = request.headers.get('Authorization', None)
-        if auth and auth.startswith("Bearer "):
-            try:
-                # Extract and validate the token
-                token = auth.split(' ')[1]
-                jwt_auth = JWTAuthentication()
-                validated_token = jwt_auth.get_validated_token(token)
-                
-                # Set the user on the request
-                request.user = jwt_auth.get_user(validated_token)
-                
-                # Check remaining time on the token; refresh if it's close to expiring
-                expiration_timestamp = validated_token['exp']
-                time_remaining = expiration_timestamp - timezone.now().timestamp()
-
-                if time_remaining < 300:  # If less than 5 minutes left
-                    refresh = RefreshToken.for_user(request.user)
-                    # Refresh token and set a new access token in the response
-                    response = self.get_response(request)
-                    response['Authorization'] = f'Bearer {refresh.access_token}'
-                    return response
-
-            except (TokenError, InvalidToken):
-                return JsonResponse({'detail': 'Token is invalid or expired.'}, status=401)
-
-        # Allow request to proceed if no token is present; DRF will enforce permissions
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        try:
+            validated_token = self.validate(request)
+            access_token = self.refresh(validated_token) if self.expires_soon(validated_token) else None
+        except (TokenError, InvalidToken, AuthenticationFailed):
+            return JsonResponse({'detail': 'Token is invalid or expired.'}, status=401)
+
         response = self.get_response(request)
+        if access_token is not None:
+            response['Authorization'] = f'Bearer {access_token}'
+        return response
+
+    async def __acall__(self, request):
+        try:
+            # Signature and expiry checks only; no query
+            validated_token = self.validate(request)
+            access_token = None
+            if self.expires_soon(validated_token):
+                # Loads the user and records the new token, so it runs in a thread
+                access_token = await sync_to_async(self.refresh)(validated_token)
+        except (TokenError, InvalidToken, AuthenticationFailed):
+            return JsonResponse({'detail': 'Token is invalid or expired.'}, status=401)
+
+        response = await self.get_response(request)
+        if access_token is not None:
+            response['Authorization'] = f'Bearer {access_token}'
         return response
+
+    def validate(self, request):
+        # Extract token from the Authorization header
+        auth = request.headers.get('Authorization', None)
+        if not auth or not auth.startswith("Bearer "):
+            # Allow request to proceed if no token is present; DRF will enforce permissions
+            return None
+
+        # Validate the token once; DRF's authentication reuses the result
+        raw_token = self.jwt_auth.get_raw_token(self.jwt_auth.get_header(request))
+        validated_token = self.jwt_auth.get_request_token(request, raw_token)
+
+        # Set the user on the request; it is only loaded if something reads it
+        request.user = SimpleLazyObject(lambda: self.load_user(validated_token))
+        return validated_token
+
+    def expires_soon(self, validated_token):
+        if validated_token is None:
+            return False
+        # Check remaining time on the token; refresh if it's close to expiring
+        expiration_timestamp = validated_token['exp']
+        time_remaining = expiration_timestamp - timezone.now().timestamp()
+        return time_remaining < 300  # If less than 5 minutes left
+
+    def refresh(self, validated_token):
+        # New access token, set on the response
+        refresh = RefreshToken.for_user(self.jwt_auth.get_user(validated_token))
+        return refresh.access_token
+
+    def load_user(self, validated_token):
+        try:
+            return self.jwt_auth.get_user(validated_token)
+        except (AuthenticationFailed, InvalidToken):
+            return AnonymousUser()
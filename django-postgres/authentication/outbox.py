@@ -0,0 +1,190 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 50,         # Emails claimed and sent per SMTP connection
+    'MAX_ATTEMPTS': 5,        # Attempts before an email is marked failed
+    'RETRY_BACKOFF': 30,      # Seconds before the first retry, doubled on each attempt
+    'MAX_BACKOFF': 3600,
+    'RATE_LIMIT': 10,         # Messages per second; 0 disables the limit
+    'POLL_INTERVAL': 5,       # Seconds the worker sleeps when the outbox is empty
+    'LEASE': 300,             # Seconds a claimed email stays hidden from other workers
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'EMAIL_OUTBOX', {}).get(name, DEFAULTS[name])
+
+
+def enqueue(subject, body, to_email):
+    """Stores an email for the worker; the request never talks to SMTP."""
+    return OutboxEmail.objects.create(subject=subject, body=body, to_email=to_email)
+
+
+def claim_batch(size=None):
+    """
+    Claims up to `size` due emails for this worker.
+
+    Rows are locked with SKIP LOCKED so concurrent workers take disjoint
+    batches, and their next attempt is pushed past the lease so a worker that
+    dies mid-batch only delays those emails instead of losing them.
+    """
+    size = size or get_setting('BATCH_SIZE')
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:size]
+        )
+        if batch:
+            OutboxEmail.objects.filter(id__in=[email.id for email in batch]).update(
+                next_attempt_at=now + timedelta(seconds=get_setting('LEASE'))
+            )
+    return batch
+
+
+def backoff(attempts):
+    return min(get_setting('RETRY_BACKOFF') * 2 ** (attempts - 1), get_setting('MAX_BACKOFF'))
+
+
+class RateLimiter:
+    """Spaces sends out to at most `rate` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_slot = time.monotonic()
+
+    def wait(self, count=1):
+        """Waits until `count` messages may go out together."""
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_slot > now:
+            time.sleep(self.next_slot - now)
+        self.next_slot = max(now, self.next_slot) + self.interval * count
+
+
+class OutboxMessage(EmailMessage):
+    """
+    Notes when the mail backend starts on it.
+
+    Backends send a list in order and raise on the first failure, so after an
+    exception the last message started is the one that failed, those before
+    it went out and those after it were never tried.
+    """
+    started = False
+
+    def recipients(self):
+        self.started = True
+        return super().recipients()
+
+    def message(self, *args, **kwargs):
+        self.started = True
+        return super().message(*args, **kwargs)
+
+
+class OutboxWorker:
+    """
+    Drains the outbox over one reused mail connection per batch, handing the
+    backend up to a second's worth of messages (RATE_LIMIT) per call.
+
+    Keeps running totals in `metrics` (sent, retried, failed, batches and
+    seconds spent sending) for the `send_outbox` command to report.
+    """
+
+    def __init__(self, batch_size=None, rate_limit=None, connection=None):
+        self.batch_size = batch_size or get_setting('BATCH_SIZE')
+        rate_limit = get_setting('RATE_LIMIT') if rate_limit is None else rate_limit
+        self.rate_limit = max(int(rate_limit), 1) if rate_limit else 0
+        self.limiter = RateLimiter(rate_limit)
+        self.connection = connection
+        self.metrics = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0, 'send_seconds': 0.0}
+
+    def run_once(self):
+        """Sends one batch and returns how many emails were claimed."""
+        batch = claim_batch(self.batch_size)
+        if not batch:
+            return 0
+
+        started = time.monotonic()
+        connection = self.connection or get_connection()
+        # Up to a second's worth of messages per send_messages() call
+        chunk_size = self.rate_limit or len(batch)
+        try:
+            connection.open()
+            for start in range(0, len(batch), chunk_size):
+                chunk = batch[start:start + chunk_size]
+                self.limiter.wait(len(chunk))
+                self.deliver(connection, chunk)
+        finally:
+            connection.close()
+
+        self.metrics['batches'] += 1
+        self.metrics['send_seconds'] += time.monotonic() - started
+        logger.info("Outbox batch of %d done: %s", len(batch), self.metrics)
+        return len(batch)
+
+    def deliver(self, connection, emails):
+        """Sends `emails` in one call and records on each row whether it went out."""
+        messages = [
+            OutboxMessage(subject=email.subject, body=email.body, to=[email.to_email], connection=connection)
+            for email in emails
+        ]
+        try:
+            connection.send_messages(messages)
+        except Exception as exc:
+            failed = max(sum(message.started for message in messages) - 1, 0)
+            self.mark_sent(emails[:failed])
+            self.mark_failed(emails[failed], exc)
+            # Never tried: due again right away, without using up an attempt
+            OutboxEmail.objects.filter(id__in=[email.id for email in emails[failed + 1:]]).update(
+                next_attempt_at=timezone.now()
+            )
+            return failed
+        self.mark_sent(emails)
+        return len(emails)
+
+    def mark_sent(self, emails):
+        if not emails:
+            return
+        OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            status=OutboxEmail.SENT, sent_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        self.metrics['sent'] += len(emails)
+
+    def mark_failed(self, email, exc):
+        email.attempts += 1
+        email.last_error = str(exc)
+        if email.attempts >= get_setting('MAX_ATTEMPTS'):
+            email.status = OutboxEmail.FAILED
+            self.metrics['failed'] += 1
+            logger.error("Giving up on outbox email %s after %d attempts: %s", email.id, email.attempts, exc)
+        else:
+            email.next_attempt_at = timezone.now() + timedelta(seconds=backoff(email.attempts))
+            self.metrics['retried'] += 1
+            logger.warning("Outbox email %s failed, retrying at %s: %s", email.id, email.next_attempt_at, exc)
+        email.save(update_fields=['attempts', 'status', 'next_attempt_at', 'last_error'])
+
+    def run_forever(self, poll_interval=None):
+        poll_interval = get_setting('POLL_INTERVAL') if poll_interval is None else poll_interval
+        while True:
+            try:
+                claimed = self.run_once()
+            except Exception:
+                # e.g. SMTP unreachable; the claimed emails come back after their lease
+                logger.exception("Outbox batch failed")
+                claimed = 0
+            if not claimed:
+                time.sleep(poll_interval)
@@ -0,0 +1,68 @@
+"""
+Password checks for login, off the request thread.
+
+Hashing is the one deliberately expensive step of a login. It runs in a
+small process-wide pool (`PASSWORD_HASH_WORKERS` threads) so a burst of
+logins can use at most that many cores, and once `PASSWORD_HASH_QUEUE`
+more checks are waiting, further attempts are turned away straight away
+instead of piling up behind them. The hashers used here release the GIL,
+so the pool runs in parallel with the request threads.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework.exceptions import Throttled
+
+_lock = threading.Lock()
+_pool = None
+_slots = None
+
+
+def get_pool():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            workers = getattr(settings, 'PASSWORD_HASH_WORKERS', 2)
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            _slots = threading.BoundedSemaphore(workers + getattr(settings, 'PASSWORD_HASH_QUEUE', 16))
+    return _pool, _slots
+
+
+def run_hashing(function, *args):
+    """Runs `function(*args)` in the hashing pool; raises Throttled when it is full."""
+    pool, slots = get_pool()
+    if not slots.acquire(blocking=False):
+        raise Throttled(wait=1, detail="Too many logins in progress, try again shortly.")
+    try:
+        return pool.submit(function, *args).result()
+    finally:
+        slots.release()
+
+
+def _check(password, encoded):
+    """Returns `(matches, new_hash)`; `new_hash` is set when the stored one is outdated."""
+    outdated = []
+    matches = check_password(password, encoded, setter=outdated.append)
+    return matches, make_password(password) if matches and outdated else None
+
+
+def verify_password(user, password):
+    """
+    Checks `password` for `user`, who may be None when no account matched.
+
+    A missing user still costs one hash, as in Django's ModelBackend, so
+    response times do not reveal which emails have accounts. A correct
+    password stored with an older hasher (or fewer iterations) than
+    `PASSWORD_HASHERS[0]` is rehashed and saved.
+    """
+    if user is None:
+        run_hashing(make_password, password)
+        return False
+
+    matches, new_hash = run_hashing(_check, password, user.password)
+    if new_hash:
+        user.password = new_hash
+        user.save(update_fields=['password'])
+    return matches
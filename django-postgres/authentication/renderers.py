@@ -1,14 +1,25 @@
-from rest_framework import renderers
-import json
+from rest_framework.exceptions import ErrorDetail
 
+from base.renderers import FastJSONRenderer
 
-class UserRenderer(renderers.JSONRenderer):
-    charset = 'utf-8'
+
+class UserRenderer(FastJSONRenderer):
+    """
+    Wraps payloads as `{'data': ...}`, or as `{'errors': ...}` when they hold
+    an ErrorDetail. Hand-built error responses, e.g. `{'error': '...'}` with a
+    400, stay under 'data' as they always have.
+    """
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
-        response = ''
-        if 'ErrorDetail' in str(data):
-            response = json.dumps({'errors': data})
-        else:
-            response = json.dumps({'data': data})
-        return response
\ No newline at end of file
+        key = 'errors' if contains_error_detail(data) else 'data'
+        return super().render({key: data}, accepted_media_type, renderer_context)
+
+
+def contains_error_detail(data):
+    if isinstance(data, ErrorDetail):
+        return True
+    if isinstance(data, dict):
+        return any(contains_error_detail(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(contains_error_detail(value) for value in data)
+    return False
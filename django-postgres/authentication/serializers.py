@@ -1,8 +1,12 @@
 from rest_framework import serializers
 from .models import User
-from django.contrib import auth
+from .passwords import verify_password
 from rest_framework.exceptions import AuthenticationFailed
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import TokenError
+from .blacklist import blacklist, outstand
+from .tokens import RefreshToken
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.encoding import force_str, smart_bytes
 from django.utils.http import urlsafe_base64_decode
@@ -40,32 +44,26 @@ class LoginSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(max_length=255, min_length=3)
     password = serializers.CharField(max_length=68, min_length=6, write_only=True)
     username = serializers.CharField(max_length=255, min_length=3, read_only=True)
-    tokens = serializers.SerializerMethodField()
+    tokens = serializers.DictField(read_only=True)
 
     class Meta:
         model = User
         fields = ['email', 'password', 'username', 'tokens']
 
-    def get_tokens(self, obj):
-        user = User.objects.get(email=obj['email'])
-        return {
-            'refresh': user.tokens()['refresh'],
-            'access': user.tokens()['access']
-        }
-
     def validate(self, attrs):
         email = attrs.get('email', '')
         password = attrs.get('password', '')
-        user = auth.authenticate(email=email, password=password)
+        # One query for the user; the hash check runs in the bounded hashing pool
+        user = User.objects.filter(email=email).first()
 
-        if user is None:
+        if not verify_password(user, password):
             raise AuthenticationFailed('Invalid credentials, try again')
         if not user.is_active:
             raise AuthenticationFailed('Account disabled, contact admin')
         if not user.is_verified:
             raise AuthenticationFailed('Email is not verified')
 
-        # Return user information and tokens
+        # Return user information and tokens, minted once
         return {
             'email': user.email,
             'username': user.username,
@@ -133,3 +131,38 @@ class LogoutSerializer(serializers.Serializer):
             RefreshToken(self.token).blacklist()
         except TokenError:
             raise serializers.ValidationError({'bad_token': 'Token is expired or invalid'})
+
+
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    simplejwt's refresh, with the blacklist check served from cache and one user query.
+
+    The stock serializer looks the user up again each time it blacklists the
+    old token and records the new one.
+    """
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = None
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                blacklist(refresh, user)
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            outstand(refresh, user)
+
+            data['refresh'] = str(refresh)
+
+        return data
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import invalidate_cached_user
+from .blacklist import remember_blacklisted
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    # Covers deactivation, password changes and deletion
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def cache_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        remember_blacklisted(instance.token.jti, instance.token.expires_at)
@@ -1,3 +1,311 @@
-from django.test import TestCase
+import datetime
+import smtplib
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password, make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import blacklist as blacklist_module
+from . import passwords as passwords_module
+from .authentication import CachedJWTAuthentication, get_user_cache
+from .blacklist import BloomFilter, blacklist, get_cache, is_blacklisted, purge_expired
+from .models import OutboxEmail, User
+from .outbox import OutboxWorker, backoff, claim_batch, enqueue
+from .passwords import run_hashing, verify_password
+from .tokens import RefreshToken
+
+
+class BloomFilterTests(SimpleTestCase):
+    """Members are always found; other values only rarely."""
+
+    def test_members_and_false_positives(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        members = [f'member-{n}' for n in range(1000)]
+        for value in members:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in members))
+        false_positives = sum(f'other-{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(TOKEN_BLACKLIST_FILTER=True)
+class BlacklistCacheTests(TestCase):
+    """With the caches on, only a "maybe" from the Bloom filter reaches the database."""
+
+    def setUp(self):
+        get_cache().clear()
+        blacklist_module._local.update(filter=None, fetched_at=0.0)
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'secret-password')
+
+    def test_unlisted_tokens_need_no_query(self):
+        is_blacklisted('warm-up')  # Builds the filter
+        token = RefreshToken.for_user(self.user)
+        with self.assertNumQueries(0):
+            self.assertFalse(is_blacklisted(token['jti']))
+
+    def test_tokens_blacklisted_after_the_filter_was_built(self):
+        is_blacklisted('warm-up')
+        token = RefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            blacklist(token, self.user)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_blacklisted(token['jti']))
+        with self.assertRaises(TokenError):
+            RefreshToken(str(token))
+
+    def test_rebuilt_filter_holds_blacklisted_tokens(self):
+        token = RefreshToken.for_user(self.user)
+        blacklist(token, self.user)  # Not committed, so no positive entry is cached
+        self.assertTrue(is_blacklisted(token['jti']))
+        self.assertFalse(is_blacklisted(RefreshToken.for_user(self.user)['jti']))
+
+    @override_settings(TOKEN_BLACKLIST_FILTER=None)
+    def test_per_process_cache_always_asks_the_database(self):
+        token = RefreshToken.for_user(self.user)
+        with self.assertNumQueries(1):
+            self.assertFalse(is_blacklisted(token['jti']))
+
+
+class PurgeExpiredTests(TestCase):
+    """Expired tokens and their blacklist rows go in batches; live ones stay."""
+
+    def test_purge(self):
+        user = User.objects.create_user('ann', 'ann@example.com', 'secret-password')
+        past = timezone.now() - datetime.timedelta(days=1)
+        for n in range(3):
+            expired = OutstandingToken.objects.create(user=user, jti=f'expired-{n}', token='x', expires_at=past)
+            BlacklistedToken.objects.create(token=expired)
+        live = RefreshToken.for_user(user)
+
+        self.assertEqual(list(purge_expired(batch_size=2)), [2, 1])
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class FlakyBackend(locmem.EmailBackend):
+    """Sends in order like SMTP does, and fails on the first message to `refuse`."""
+    refuse = 'bounce@example.com'
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.refuse in message.recipients():
+                raise smtplib.SMTPRecipientsRefused({self.refuse: (550, b'No such user')})
+            super().send_messages([message])
+        return len(messages)
+
+
+@override_settings(EMAIL_OUTBOX={'RATE_LIMIT': 0, 'MAX_ATTEMPTS': 3, 'RETRY_BACKOFF': 30, 'MAX_BACKOFF': 100, 'LEASE': 300})
+class OutboxWorkerTests(TestCase):
+    """Every claimed email ends up sent, retried later or failed, and never goes out twice."""
+
+    def enqueue(self, *addresses):
+        return [enqueue('Hello', 'Body', address) for address in addresses]
+
+    def row(self, email):
+        return OutboxEmail.objects.get(pk=email.pk)
+
+    def test_sends_due_emails(self):
+        first, second = self.enqueue('ann@example.com', 'bob@example.com')
+        later, = self.enqueue('cat@example.com')
+        OutboxEmail.objects.filter(pk=later.pk).update(next_attempt_at=timezone.now() + datetime.timedelta(hours=1))
+
+        self.assertEqual(OutboxWorker().run_once(), 2)
+        self.assertEqual([message.to for message in mail.outbox], [['ann@example.com'], ['bob@example.com']])
+        for email in (first, second):
+            row = self.row(email)
+            self.assertEqual((row.status, row.attempts), (OutboxEmail.SENT, 1))
+            self.assertIsNotNone(row.sent_at)
+        self.assertEqual((self.row(later).status, self.row(later).attempts), (OutboxEmail.PENDING, 0))
+        self.assertEqual(OutboxWorker().run_once(), 0)
+
+    def test_failure_mid_chunk(self):
+        sent, refused, untried = self.enqueue('ann@example.com', 'bounce@example.com', 'cat@example.com')
+        worker = OutboxWorker(connection=FlakyBackend())
+        before = timezone.now()
+
+        with self.assertLogs('authentication.outbox', 'WARNING'):
+            self.assertEqual(worker.run_once(), 3)
+        self.assertEqual([message.to for message in mail.outbox], [['ann@example.com']])
+        self.assertEqual((self.row(sent).status, self.row(sent).attempts), (OutboxEmail.SENT, 1))
+
+        refused = self.row(refused)
+        self.assertEqual((refused.status, refused.attempts, refused.sent_at), (OutboxEmail.PENDING, 1, None))
+        self.assertIn('No such user', refused.last_error)
+        self.assertGreaterEqual(refused.next_attempt_at, before + datetime.timedelta(seconds=backoff(1)))
+
+        # The message after the failure used no attempt and is due again at once
+        untried = self.row(untried)
+        self.assertEqual((untried.status, untried.attempts), (OutboxEmail.PENDING, 0))
+        self.assertLessEqual(untried.next_attempt_at, timezone.now())
+        self.assertEqual(worker.metrics, {**worker.metrics, 'sent': 1, 'retried': 1, 'failed': 0})
+
+        self.assertEqual(worker.run_once(), 1)
+        self.assertEqual(self.row(untried).status, OutboxEmail.SENT)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_backoff_and_giving_up(self):
+        self.assertEqual([backoff(attempts) for attempts in (1, 2, 3, 4)], [30, 60, 100, 100])
+
+        refused, = self.enqueue('bounce@example.com')
+        worker = OutboxWorker(connection=FlakyBackend())
+        with self.assertLogs('authentication.outbox', 'WARNING') as logs:
+            for attempts in (1, 2, 3):
+                OutboxEmail.objects.filter(pk=refused.pk).update(next_attempt_at=timezone.now())
+                self.assertEqual(worker.run_once(), 1)
+                self.assertEqual(self.row(refused).attempts, attempts)
+        self.assertEqual([record.levelname for record in logs.records], ['WARNING', 'WARNING', 'ERROR'])
+        self.assertEqual(self.row(refused).status, OutboxEmail.FAILED)
+        self.assertEqual(worker.metrics['failed'], 1)
+
+        OutboxEmail.objects.filter(pk=refused.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(worker.run_once(), 0)
+
+    def test_claimed_emails_come_back_after_the_lease(self):
+        emails = self.enqueue('ann@example.com', 'bob@example.com')
+        now = timezone.now()
+        self.assertEqual(claim_batch(), emails)  # A worker that dies before sending
+        self.assertEqual(claim_batch(), [])
+        for email in emails:
+            self.assertGreaterEqual(self.row(email).next_attempt_at, now + datetime.timedelta(seconds=300))
+
+        with mock.patch('django.utils.timezone.now', return_value=now + datetime.timedelta(seconds=301)):
+            self.assertEqual(claim_batch(), emails)
+
+
+class PasswordCheckTests(TestCase):
+    """Logins rehash outdated hashes and are turned away while the hashing pool is full."""
+
+    def setUp(self):
+        self.reset_pool()
+        self.addCleanup(self.reset_pool)
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'secret-password')
+        User.objects.filter(pk=self.user.pk).update(is_verified=True)
+
+    def reset_pool(self):
+        if passwords_module._pool is not None:
+            passwords_module._pool.shutdown()
+        passwords_module._pool = passwords_module._slots = None
+
+    def stored_password(self):
+        return User.objects.values_list('password', flat=True).get(pk=self.user.pk)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_outdated_hash_is_replaced_on_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('secret-password', hasher='md5'))
+        self.user.refresh_from_db()
+
+        self.assertFalse(verify_password(self.user, 'wrong-password'))
+        self.assertTrue(self.stored_password().startswith('md5$'))
+        self.assertTrue(verify_password(self.user, 'secret-password'))
+        self.assertTrue(self.stored_password().startswith('pbkdf2_sha256$'))
+        self.assertTrue(check_password('secret-password', self.stored_password()))
+        self.assertFalse(verify_password(None, 'secret-password'))
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0)
+    def test_full_pool_turns_logins_away(self):
+        hashing, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            hashing.set()
+            release.wait(timeout=10)
+
+        holder = threading.Thread(target=run_hashing, args=[slow_hash])
+        holder.start()
+        try:
+            hashing.wait(timeout=10)
+            with self.assertRaises(Throttled):
+                run_hashing(make_password, 'secret-password')
+            response = self.client.post('/auth/login/', {'email': 'ann@example.com', 'password': 'secret-password'})
+            self.assertEqual(response.status_code, 429)
+        finally:
+            release.set()
+            holder.join()
+        response = self.client.post('/auth/login/', {'email': 'ann@example.com', 'password': 'secret-password'})
+        self.assertEqual(response.status_code, 200)
+
+
+@mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', {'login_ip': '5/min', 'login_account': '2/min'})
+class LoginThrottleTests(TestCase):
+    """Failed logins slow down their own client, but cannot lock an account's owner out."""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('ann', 'ann@example.com', 'secret-password')
+        User.objects.filter(pk=user.pk).update(is_verified=True)
+
+    def login(self, address, email='ann@example.com', password='secret-password'):
+        return self.client.post('/auth/login/', {'email': email, 'password': password}, REMOTE_ADDR=address).status_code
+
+    def test_account_attempts_count_per_client(self):
+        self.assertEqual([self.login('10.0.0.1', password='wrong-password') for _ in range(3)], [400, 400, 429])
+        self.assertEqual(self.login('10.0.0.1'), 429)
+        self.assertEqual(self.login('10.0.0.2'), 200)
+
+    def test_attempts_per_client(self):
+        statuses = [self.login('10.0.0.1', email=f'user{n}@example.com') for n in range(6)]
+        self.assertEqual(statuses, [400] * 5 + [429])
+        self.assertEqual(self.login('10.0.0.2'), 200)
+
+
+@override_settings(JWT_USER_CACHE=True)
+class CachedJWTAuthenticationTests(TestCase):
+    """Cached users follow every save of the user, and each request checks its token once."""
+
+    def setUp(self):
+        get_user_cache().clear()
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'secret-password')
+        self.header = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+
+    def authenticate(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=self.header)
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_saving_the_user_invalidates_the_cache(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            self.assertEqual((self.authenticate().pk, self.authenticate().is_staff), (self.user.pk, False))
+
+        self.user.is_staff = True
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate().is_staff)
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        # Refused users are not cached either
+        with self.assertRaises(AuthenticationFailed), self.assertNumQueries(1):
+            self.authenticate()
+
+    def test_deleting_the_user_invalidates_the_cache(self):
+        self.authenticate()
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_token_is_decoded_once_per_request(self):
+        # The middleware checks the token, then DRF authenticates with the same result
+        with mock.patch.object(
+            CachedJWTAuthentication, 'get_validated_token', autospec=True, side_effect=JWTAuthentication.get_validated_token,
+        ) as decode, mock.patch.object(
+            CachedJWTAuthentication, 'get_user', autospec=True, side_effect=CachedJWTAuthentication.get_user,
+        ) as get_user:
+            response = self.client.post('/events/create/', {}, HTTP_AUTHORIZATION=self.header)
+        self.assertEqual(response.status_code, 400)  # Authenticated, then validated
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(get_user.call_count, 1)
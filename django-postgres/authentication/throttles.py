@@ -0,0 +1,31 @@
+import hashlib
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginIPThrottle(SimpleRateThrottle):
+    """Login attempts per client address (`login_ip` rate)."""
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginAccountThrottle(SimpleRateThrottle):
+    """
+    Login attempts per email address from one client (`login_account` rate).
+
+    Keyed on the client as well as the account: counting an account's
+    attempts from everywhere would let anyone lock its owner out by failing
+    on purpose. Guessing from many addresses is left to `LoginIPThrottle`
+    and the bounded hashing pool.
+    """
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email:
+            return None
+        # Hashed, so cache keys stay short and free of user input
+        ident = hashlib.sha256(f"{self.get_ident(request)} {email.strip().lower()}".encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
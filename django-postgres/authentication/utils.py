@@ -1,23 +1,8 @@
-from django.core.mail import EmailMessage
-
-
-import threading
-
-
-class EmailThread(threading.Thread):
-
-    def __init__(self, email):
-        self.email = email
-        threading.Thread.__init__(self)
-
-    def run(self):
-        self.email.send()
+from .outbox import enqueue
 
 
 class Util:
     @staticmethod
     def send_email(data):
-        email = EmailMessage(
-            subject=data['email_subject'], body=data['email_body'], to=[data['to_email']])
-        # email.send()
-        EmailThread(email).start()
\ No newline at end of file
+        # Queued in the outbox and delivered by `manage.py send_outbox`
+        enqueue(subject=data['email_subject'], body=data['email_body'], to_email=data['to_email'])
@@ -1,5 +1,6 @@
 from django.shortcuts import redirect
 from rest_framework import generics, status, views, permissions
+from rest_framework.exceptions import Throttled
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.sites.shortcuts import get_current_site
@@ -22,6 +23,7 @@ from .serializers import (
 from .models import User
 from .utils import Util
 from .renderers import UserRenderer
+from .throttles import LoginAccountThrottle, LoginIPThrottle
 
 from rest_framework.permissions import AllowAny
 
@@ -86,12 +88,16 @@ class VerifyEmail(views.APIView):
 
 class LoginAPIView(generics.GenericAPIView):
     serializer_class = LoginSerializer
+    # Per client, and per account from each client, so no one source can flood the hasher
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
+        except Throttled:
+            raise  # Hashing pool full; 429 with Retry-After
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
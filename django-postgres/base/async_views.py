@@ -0,0 +1,314 @@
+"""
+Async versions of the read-heavy event endpoints.
+
+They serve the same URLs, payloads, caching and conditional GET behaviour as
+their counterparts in `base.views`, but query through Django's async ORM so a
+request waiting on the database does not hold a worker thread. `base.urls`
+routes to them when `ASYNC_VIEWS` is on, which only pays off under an ASGI
+server (see `ratiba/asgi.py`).
+
+DRF's APIView is sync-only, so these are plain Django views that reuse DRF's
+`Request` wrapper, serializers and pagination, and the project's renderer. Authentication is
+`StatelessJWTAuthentication`, which checks the token without a query.
+
+`EventLiveUpdates` only exists here and is only routed with `ASYNC_VIEWS`:
+under WSGI a never-ending stream would hold a worker and never be sent.
+"""
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.request import Request
+
+from authentication.authentication import StatelessJWTAuthentication
+
+from .cache import (
+    adetail_cache_key,
+    alist_cache_key,
+    arefresh_stats,
+    aseconds_until_next_start,
+    cacheable_page,
+    get_default_timeout,
+    get_event_cache,
+    list_cache_timeout,
+)
+from .conditional import aaggregate_validators, make_validators, set_validator_headers
+from .filters import ParticipantFilter
+from .live import activity_after, get_broker, read_db
+from .metrics import measure
+from .models import Event, Registration
+from .pagination import EventKeysetPagination, ParticipantKeysetPagination
+from .renderers import FastJSONRenderer
+from .replicas import use_replica_for_reads
+from .read_serializers import EventParticipantReadSerializer, EventReadSerializer
+from .serializers import EventSerializer
+from .sparse import only, requested_fields
+from .streaming import astream_json_array
+
+
+class AsyncReadView(View):
+    """
+    Authenticates, answers conditional GETs and renders JSON for async views.
+
+    Subclasses implement `respond()`, and `get_validators()` when they take
+    part in conditional GETs.
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication_classes = [StatelessJWTAuthentication]
+    renderer_class = FastJSONRenderer
+    serializer_class = None
+    read_serializer_class = None  # Columns per field, for `?fields=`
+    conditional = False
+    read_from_replica = False
+
+    async def get(self, request, *args, **kwargs):
+        request = self.request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        if self.read_from_replica:
+            use_replica_for_reads()
+        try:
+            request.user  # Validates the token, if any; no query with stateless auth
+            if not self.conditional:
+                return await self.respond(request, *args, **kwargs)
+
+            last_modified, fingerprint = await self.get_validators(request, *args, **kwargs)
+            if fingerprint is None:
+                return await self.respond(request, *args, **kwargs)
+
+            etag, timestamp = make_validators(request, last_modified, fingerprint)
+            response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = await self.respond(request, *args, **kwargs)
+            return set_validator_headers(response, etag, timestamp)
+        except APIException as exc:
+            # Same body as DRF's exception handler
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return self.render(data, status=exc.status_code)
+
+    async def get_validators(self, request, *args, **kwargs):
+        raise NotImplementedError('`get_validators()` must be implemented.')
+
+    async def respond(self, request, *args, **kwargs):
+        raise NotImplementedError('`respond()` must be implemented.')
+
+    def get_fields(self):
+        """The `?fields=` selection, or None for every field."""
+        if self.read_serializer_class is None:
+            return None
+        return requested_fields(self.request, tuple(self.read_serializer_class.fields))
+
+    def get_serializer(self, *args, **kwargs):
+        if self.read_serializer_class is not None:
+            kwargs.setdefault('fields', self.get_fields())
+        return self.serializer_class(*args, context={'request': self.request}, **kwargs)
+
+    def render(self, data, status=200):
+        renderer = self.renderer_class()
+        with measure('render'):
+            content = renderer.render(data)
+        return HttpResponse(content, content_type=renderer.media_type, status=status)
+
+
+class AsyncListView(AsyncReadView):
+    """Keyset-paginated list with optional `?stream=true` export."""
+    pagination_class = None
+    stream_query_param = 'stream'
+    stream_chunk_size = 500
+
+    def get_queryset(self, request, *args, **kwargs):
+        raise NotImplementedError('`get_queryset()` must be implemented.')
+
+    async def respond(self, request, *args, **kwargs):
+        if self.should_stream(request):
+            return StreamingHttpResponse(
+                astream_json_array(self.get_queryset(request, *args, **kwargs), self.get_serializer(), self.stream_chunk_size),
+                content_type='application/json',
+            )
+        return self.render(await self.get_list_data(request, *args, **kwargs))
+
+    def should_stream(self, request):
+        value = request.query_params.get(self.stream_query_param, '')
+        return value.lower() in ('1', 'true', 'yes')
+
+    async def get_list_data(self, request, *args, **kwargs):
+        """The paginated payload: `{'next', 'previous', 'results'}`."""
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(self.get_queryset(request, *args, **kwargs), request)
+        data = self.get_serializer(page, many=True).data
+        return paginator.get_paginated_response(data).data
+
+
+class AsyncCachedEventListMixin:
+    """Async counterpart of `base.cache.CachedEventListMixin`."""
+    cache_scope = 'all'
+    expires_on_event_start = False
+
+    async def get_list_data(self, request, *args, **kwargs):
+        cache = get_event_cache()
+        key = await alist_cache_key(self.cache_scope, request)
+        data = await cache.aget(key)
+        if data is not None:
+            return await arefresh_stats(data)
+
+        remaining = await aseconds_until_next_start() if self.expires_on_event_start else None
+        timeout = list_cache_timeout(self.expires_on_event_start, remaining)
+        data = await super().get_list_data(request, *args, **kwargs)
+        if timeout and cacheable_page(data):
+            await cache.aset(key, data, timeout)
+        return data
+
+
+class EventList(AsyncCachedEventListMixin, AsyncListView):
+    """View to list all events."""
+    read_from_replica = True
+    serializer_class = read_serializer_class = EventReadSerializer
+    pagination_class = EventKeysetPagination
+    conditional = True
+
+    async def get_validators(self, request, *args, **kwargs):
+        return await aaggregate_validators(Event.objects.all(), 'updated_at', 'stats__updated_at')
+
+    def get_queryset(self, request, *args, **kwargs):
+        return EventReadSerializer.prepare(Event.objects.select_related('stats'), self.get_fields())
+
+
+class PastEventList(AsyncCachedEventListMixin, AsyncListView):
+    """View to list all past events."""
+    read_from_replica = True
+    serializer_class = read_serializer_class = EventReadSerializer
+    pagination_class = EventKeysetPagination
+    cache_scope = 'past'
+    expires_on_event_start = True
+
+    def get_queryset(self, request, *args, **kwargs):
+        return EventReadSerializer.prepare(Event.objects.filter(starts_at__lt=timezone.now()).select_related('stats'), self.get_fields())
+
+
+class FutureEventList(AsyncCachedEventListMixin, AsyncListView):
+    """View to list all future events."""
+    read_from_replica = True
+    serializer_class = read_serializer_class = EventReadSerializer
+    pagination_class = EventKeysetPagination
+    cache_scope = 'future'
+    expires_on_event_start = True
+
+    def get_queryset(self, request, *args, **kwargs):
+        return EventReadSerializer.prepare(Event.objects.filter(starts_at__gte=timezone.now()).select_related('stats'), self.get_fields())
+
+
+class EventDetail(AsyncReadView):
+    """View to retrieve details of a specific event."""
+    read_from_replica = True
+    serializer_class = EventSerializer
+    read_serializer_class = EventReadSerializer
+    conditional = True
+
+    async def get_validators(self, request, pk):
+        stamps = await Event.objects.filter(pk=pk).values_list('updated_at', 'stats__updated_at').afirst()
+        if stamps is None:
+            return None, None
+        last_modified = max(stamp for stamp in stamps if stamp is not None)
+        return last_modified, ':'.join(str(stamp) for stamp in stamps)
+
+    async def respond(self, request, pk):
+        cache = get_event_cache()
+        key = await adetail_cache_key(pk, request)
+        data = await cache.aget(key)
+        if data is not None:
+            return self.render(data)
+
+        queryset = Event.objects.select_related('stats')
+        fields = self.get_fields()
+        if fields is not None:
+            queryset = only(queryset, EventReadSerializer.get_columns(fields))
+        try:
+            event = await queryset.aget(pk=pk)
+        except Event.DoesNotExist:
+            raise NotFound("No Event matches the given query.")
+        data = self.get_serializer(event).data
+        await cache.aset(key, data, get_default_timeout())
+        return self.render(data)
+
+
+class ListParticipants(AsyncListView):
+    """View to list participants of a specific event, with their registration status."""
+    serializer_class = read_serializer_class = EventParticipantReadSerializer
+    pagination_class = ParticipantKeysetPagination
+    conditional = True
+
+    async def get_validators(self, request, pk):
+        registrations = Registration.objects.filter(event_id=pk)
+        return await aaggregate_validators(registrations, 'updated_at', 'participant__updated_at')
+
+    def get_queryset(self, request, pk):
+        queryset = Registration.objects.filter(event_id=pk).select_related('participant')
+        filterset = ParticipantFilter(request.query_params, queryset=queryset)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        return EventParticipantReadSerializer.prepare(filterset.qs, self.get_fields())
+
+
+class EventLiveUpdates(AsyncReadView):
+    """
+    Server-Sent Events stream of an event's registrations, RSVPs and bookings.
+
+    Each message is one `EventActivity` row: its id is the SSE id, its kind
+    the SSE event name and its data the JSON payload. A new connection starts
+    from now; a reconnecting client sends `Last-Event-ID` (browsers do this
+    on their own) or `?last_event_id=` and gets everything after it first.
+
+    Open streams hold no database connection: one feed per event and process
+    reads new rows and hands them to every stream (see `base.live`).
+    """
+    heartbeat = 15  # Seconds between keep-alive comments
+    retry = 3000  # Milliseconds a client waits before reconnecting
+
+    async def respond(self, request, pk):
+        if not isinstance(request._request, ASGIRequest):
+            # A WSGI server buffers a streaming response in full, and this one never ends
+            return self.render({'detail': "Live updates are only served under ASGI."}, status=501)
+        if not await read_db(Event.objects.filter(pk=pk).exists):
+            raise NotFound("No Event matches the given query.")
+
+        response = StreamingHttpResponse(self.stream(pk, self.get_last_event_id(request)), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Keep proxies such as nginx from buffering the stream
+        return response
+
+    def get_last_event_id(self, request):
+        value = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    async def stream(self, pk, last_id):
+        subscription = await get_broker().subscribe(pk)
+        try:
+            yield f'retry: {self.retry}\n\n'
+            if last_id is None:
+                last_id = subscription.start_id
+            else:
+                # Catch up on what a reconnecting client missed
+                for activity in await read_db(activity_after, pk, last_id):
+                    last_id = activity.id
+                    yield format_event(activity)
+            while True:
+                activities = await subscription.get(self.heartbeat)
+                if activities is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                for activity in activities:
+                    if activity.id > last_id:  # Not already sent by the catch-up
+                        last_id = activity.id
+                        yield format_event(activity)
+        finally:
+            subscription.close()
+
+
+def format_event(activity):
+    data = json.dumps(activity.data, separators=(',', ':'))
+    return f'id: {activity.id}\nevent: {activity.kind}\ndata: {data}\n\n'
@@ -0,0 +1,263 @@
+"""
+Load generator behind `manage.py run_benchmark`.
+
+Each scenario is one endpoint, driven over HTTP by `concurrency` threads for
+a fixed number of requests. Queries per request come from the
+`Server-Timing` header added by `base.metrics`, so the server under test
+must keep `SERVER_TIMING` on.
+"""
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.utils import timezone
+
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class Scenario:
+    """One endpoint under load; `request()` returns `(method, path, body)`."""
+    name = None
+
+    def __init__(self, data):
+        self.data = data
+
+    def request(self, rng):
+        raise NotImplementedError('`request()` must be implemented.')
+
+
+class EventListScenario(Scenario):
+    name = 'event-list'
+
+    def request(self, rng):
+        return 'GET', '/events/', None
+
+
+class FutureEventListScenario(Scenario):
+    name = 'future-event-list'
+
+    def request(self, rng):
+        return 'GET', '/events/future/', None
+
+
+class ListParticipantsScenario(Scenario):
+    name = 'list-participants'
+
+    def request(self, rng):
+        return 'GET', f'/events/{rng.choice(self.data.event_ids)}/participants/', None
+
+
+class RegisterEventScenario(Scenario):
+    name = 'register-event'
+
+    def request(self, rng):
+        # A new participant every time, so each request does the full insert
+        email = f'bench-{uuid.uuid4().hex}@example.com'
+        body = {'event_id': rng.choice(self.data.future_event_ids), 'participant': {'name': 'Benchmark', 'email': email}}
+        return 'POST', '/register/', body
+
+
+class RSVPEventScenario(Scenario):
+    name = 'rsvp-event'
+
+    def request(self, rng):
+        email = f'bench-{uuid.uuid4().hex}@example.com'
+        body = {'event_id': rng.choice(self.data.future_event_ids), 'participant': {'name': 'Benchmark', 'email': email}}
+        return 'POST', '/events/rsvp/', body
+
+
+class LoginScenario(Scenario):
+    """
+    Logins take turns over the seeded accounts, so each one gets an equal share
+    of the per-account throttle. The per-address throttle still applies: raise
+    LOGIN_RATE_IP and LOGIN_RATE_ACCOUNT on the server, or leave them empty.
+    """
+    name = 'login'
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.emails = itertools.cycle(data.user_emails)
+
+    def request(self, rng):
+        return 'POST', '/auth/login/', {'email': next(self.emails), 'password': self.data.password}
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (
+    EventListScenario,
+    FutureEventListScenario,
+    ListParticipantsScenario,
+    RegisterEventScenario,
+    RSVPEventScenario,
+    LoginScenario,
+)}
+
+
+class BenchmarkData:
+    """Ids and credentials the scenarios pick from, read from the seeded database."""
+
+    def __init__(self, event_ids, future_event_ids, user_emails, password):
+        self.event_ids = event_ids
+        self.future_event_ids = future_event_ids
+        self.user_emails = user_emails
+        self.password = password
+
+
+def send(base_url, method, path, body, timeout):
+    """Returns `(status, seconds, queries)`; `queries` is None without a Server-Timing header."""
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, method=method)
+    if data is not None:
+        request.add_header('Content-Type', 'application/json')
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status, headers = response.status, response.headers
+    except urllib.error.HTTPError as exc:
+        exc.read()
+        status, headers = exc.code, exc.headers
+    elapsed = time.perf_counter() - started
+    match = QUERIES.search(headers.get('Server-Timing', ''))
+    return status, elapsed, int(match.group(1)) if match else None
+
+
+def run_scenario(scenario, base_url, requests, concurrency, warmup=0, timeout=30, seed=0):
+    """Sends `requests` requests with `concurrency` threads and summarises them."""
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        send(base_url, *scenario.request(rng), timeout)
+
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+    samples = []
+
+    def worker(index):
+        # One generator per thread keeps each thread's picks reproducible
+        rng = random.Random(f'{seed}-{index}')
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            try:
+                sample = send(base_url, *scenario.request(rng), timeout)
+            except (OSError, urllib.error.URLError):
+                sample = (None, None, None)
+            with lock:
+                samples.append(sample)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return summarise(samples, time.perf_counter() - started)
+
+
+def summarise(samples, wall_time):
+    latencies = sorted(elapsed for status, elapsed, _ in samples if status is not None and status < 400)
+    queries = [count for status, _, count in samples if status is not None and status < 400 and count is not None]
+    statuses = {}
+    for status, _, _ in samples:
+        key = str(status) if status is not None else 'connection-error'
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': len(samples) - len(latencies),
+        'statuses': statuses,
+        'wall_time_s': round(wall_time, 3),
+        'throughput_rps': round(len(latencies) / wall_time, 2) if wall_time else 0,
+        'latency_ms': {
+            'p50': percentile_ms(latencies, 50),
+            'p95': percentile_ms(latencies, 95),
+            'p99': percentile_ms(latencies, 99),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            'max': round(latencies[-1] * 1000, 2) if latencies else None,
+        },
+        'queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+    }
+
+
+def percentile_ms(ordered, percent):
+    """Nearest-rank percentile of sorted seconds, in milliseconds."""
+    if not ordered:
+        return None
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return round(ordered[index] * 1000, 2)
+
+
+def compare(baseline, current, tolerance):
+    """
+    Yields `(scenario, metric, before, after, regressed)` for two result files.
+
+    A scenario regresses when its p95 latency or queries per request grew,
+    or its throughput dropped, by more than `tolerance` (a fraction).
+    """
+    for name, after in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        checks = [
+            ('p95_ms', before['latency_ms']['p95'], after['latency_ms']['p95'], 1),
+            ('throughput_rps', before['throughput_rps'], after['throughput_rps'], -1),
+            ('queries_per_request', before['queries_per_request']['mean'], after['queries_per_request']['mean'], 1),
+        ]
+        for metric, old, new, direction in checks:
+            if old is None or new is None:
+                continue
+            regressed = (new - old) * direction > tolerance * old
+            yield name, metric, old, new, regressed
+
+
+def sample_events(count):
+    """
+    Unsaved events with their stats attached, shaped like `EventList` rows.
+
+    For the microbenchmarks, which need payloads but no database. Every
+    fourth event has an image with renditions.
+    """
+    from .models import Event, EventStats
+
+    now = timezone.now()
+    events = []
+    for n in range(count):
+        starts_at = now + timedelta(hours=n)
+        event = Event(
+            id=n + 1,
+            title=f'Event {n}',
+            description='A description long enough to look like a real one. ' * 4,
+            date=starts_at.date(),
+            time=starts_at.time(),
+            venue=f'Hall {n % 50}',
+            capacity=100,
+            starts_at=starts_at,
+            updated_at=now,
+        )
+        if n % 4 == 0:
+            event.image = f'event_images/{n}.jpg'
+            event.image_renditions = {
+                'thumb': {'webp': f'event_images/renditions/{n}_thumb.webp', 'jpeg': f'event_images/renditions/{n}_thumb.jpg'},
+            }
+        event.stats = EventStats(event=event, confirmed=n % 40, pending=n % 7, rsvp=n % 5)
+        events.append(event)
+    return events
+
+
+def time_median(function, repeat):
+    """Median seconds of `repeat` calls."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2]
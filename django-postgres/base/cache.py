@@ -0,0 +1,217 @@
+import hashlib
+import math
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Min
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .replicas import reading_from_replica
+
+LIST_GENERATION_KEY = 'events:lists:generation'
+
+
+def get_event_cache():
+    return caches[getattr(settings, 'EVENT_CACHE_ALIAS', 'default')]
+
+
+def get_default_timeout():
+    timeout = getattr(settings, 'EVENT_CACHE_TIMEOUT', 300)
+    if reading_from_replica():
+        # A lagging replica can return rows from before the last invalidation,
+        # so whatever it served is only kept for the replication allowance
+        timeout = min(timeout, getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+    return timeout
+
+
+def _generation_key(pk=None):
+    if pk is None:
+        return LIST_GENERATION_KEY
+    return f'events:{pk}:generation'
+
+
+def get_generation(pk=None):
+    """
+    Returns the current generation token for the event lists, or for one
+    event (or another scope, e.g. 'calendar') when `pk` is given.
+
+    Tokens are random rather than counters, so a token that gets evicted is
+    replaced by a new one instead of restarting at a value whose entries may
+    still be cached.
+    """
+    cache = get_event_cache()
+    key = _generation_key(pk)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(pk=None):
+    """Async version of `get_generation()`."""
+    cache = get_event_cache()
+    key = _generation_key(pk)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, uuid.uuid4().hex, None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def bump_generation(pk=None):
+    get_event_cache().set(_generation_key(pk), uuid.uuid4().hex, None)
+
+
+def invalidate_event(pk):
+    """Drops the cached detail of one event and every cached list page."""
+    bump_generation(pk)
+    bump_generation()
+
+
+def _url_digest(request):
+    # The payload carries absolute URLs (image_url, next/previous links), so
+    # the full URL including host and query string is part of the key
+    return hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+
+
+def list_cache_key(scope, request):
+    return f'events:list:{scope}:{get_generation()}:{_url_digest(request)}'
+
+
+def detail_cache_key(pk, request):
+    return f'events:detail:{pk}:{get_generation(pk)}:{_url_digest(request)}'
+
+
+async def alist_cache_key(scope, request):
+    return f'events:list:{scope}:{await aget_generation()}:{_url_digest(request)}'
+
+
+async def adetail_cache_key(pk, request):
+    return f'events:detail:{pk}:{await aget_generation(pk)}:{_url_digest(request)}'
+
+
+def seconds_until_next_start(now=None):
+    """
+    Seconds until the next event crosses from future to past, or None.
+
+    Past/future lists are only valid until that moment, so their entries must
+    not outlive it.
+    """
+    from .models import Event
+
+    now = now or timezone.now()
+    next_start = Event.objects.filter(starts_at__gt=now).aggregate(next_start=Min('starts_at'))['next_start']
+    return _seconds_until(next_start, now)
+
+
+async def aseconds_until_next_start(now=None):
+    """Async version of `seconds_until_next_start()`."""
+    from .models import Event
+
+    now = now or timezone.now()
+    next_start = (await Event.objects.filter(starts_at__gt=now).aaggregate(next_start=Min('starts_at')))['next_start']
+    return _seconds_until(next_start, now)
+
+
+def _seconds_until(moment, now):
+    if moment is None:
+        return None
+    return (moment - now).total_seconds()
+
+
+def list_cache_timeout(expires_on_event_start, remaining=None):
+    """The default timeout, cut short at the next event start when the list depends on it."""
+    timeout = get_default_timeout()
+    if expires_on_event_start and remaining is not None:
+        # Not worth caching when the next boundary is less than a second away
+        timeout = min(timeout, math.floor(remaining))
+    return timeout
+
+
+def _stats_page(data):
+    """The ids of a list page whose `stats` need refreshing, or None."""
+    results = data.get('results') if isinstance(data, dict) else None
+    if not results or 'stats' not in results[0]:
+        return None
+    return [item['id'] for item in results]
+
+
+def _with_stats(data, rows):
+    stats = {row.pop('event_id'): row for row in rows}
+    return {**data, 'results': [{**item, 'stats': stats.get(item['id'])} for item in data['results']]}
+
+
+def refresh_stats(data):
+    """
+    A cached list page with its `stats` replaced by the current counters.
+
+    Registrations and bookings change the counters all the time, so they
+    only start a new generation for the event's detail (see base.stats);
+    cached list pages get fresh counts here, with one primary-key query.
+    """
+    from .models import EventStats
+    from .read_serializers import STATS_FIELDS
+
+    ids = _stats_page(data)
+    if ids is None:
+        return data
+    return _with_stats(data, EventStats.objects.filter(event_id__in=ids).values('event_id', *STATS_FIELDS))
+
+
+async def arefresh_stats(data):
+    """Async version of `refresh_stats()`."""
+    from .models import EventStats
+    from .read_serializers import STATS_FIELDS
+
+    ids = _stats_page(data)
+    if ids is None:
+        return data
+    return _with_stats(data, [row async for row in EventStats.objects.filter(event_id__in=ids).values('event_id', *STATS_FIELDS)])
+
+
+def cacheable_page(data):
+    """Whether `refresh_stats()` can bring the page up to date later."""
+    results = data.get('results') or [{}]
+    return 'stats' not in results[0] or 'id' in results[0]
+
+
+class CachedEventListMixin:
+    """Read-through cache for list views serving `EventSerializer` pages."""
+    cache_scope = 'all'
+    expires_on_event_start = False
+
+    def list(self, request, *args, **kwargs):
+        cache = get_event_cache()
+        key = list_cache_key(self.cache_scope, request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(refresh_stats(data))
+
+        timeout = self.get_cache_timeout()
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200 and timeout and cacheable_page(response.data):
+            cache.set(key, response.data, timeout)
+        return response
+
+    def get_cache_timeout(self):
+        remaining = seconds_until_next_start() if self.expires_on_event_start else None
+        return list_cache_timeout(self.expires_on_event_start, remaining)
+
+
+class CachedEventDetailMixin:
+    """Read-through cache for a single serialized event."""
+
+    def retrieve(self, request, *args, **kwargs):
+        cache = get_event_cache()
+        key = detail_cache_key(kwargs[self.lookup_url_kwarg or self.lookup_field], request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, get_default_timeout())
+        return response
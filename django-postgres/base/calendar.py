@@ -0,0 +1,115 @@
+"""
+Events grouped into day, week or month buckets for calendar views.
+
+Each bucket holds its event count and summaries of its first events. Counts
+are a GROUP BY over the truncated `date`, and the summaries are picked with a
+window function, so a month of buckets is two queries over the
+`event_date_time_idx` range, whatever the size of the catalogue.
+
+Requested ranges are widened to whole buckets, which makes every bucket the
+same whichever range asked for it, so each one is cached on its own. Any
+change to an event starts a new 'calendar' generation (see `base.cache`);
+registrations and stats do not, as buckets only hold event columns.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber, TruncDay, TruncMonth, TruncWeek
+
+from .cache import get_default_timeout, get_event_cache, get_generation
+from .models import Event
+from .read_serializers import EventReadSerializer
+
+BUCKETS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+SUMMARY_FIELDS = ('id', 'title', 'date', 'time', 'venue', 'charge')
+
+
+def bucket_start(day, bucket):
+    """The first day of the bucket `day` falls in; weeks start on Monday, as in SQL."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, bucket):
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if bucket == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def count_buckets(start, end, bucket):
+    """How many buckets `bucket_starts(start, end, bucket)` returns, without building them."""
+    if bucket == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    days = (bucket_start(end, bucket) - bucket_start(start, bucket)).days
+    return days // 7 + 1 if bucket == 'week' else days + 1
+
+
+def bucket_starts(start, end, bucket):
+    """Start dates of every bucket from the one holding `start` to the one holding `end`."""
+    starts = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        starts.append(current)
+        current = next_bucket(current, bucket)
+    return starts
+
+
+def get_max_buckets():
+    return getattr(settings, 'CALENDAR_MAX_BUCKETS', 366)
+
+
+def get_events_per_bucket():
+    return getattr(settings, 'CALENDAR_EVENTS_PER_BUCKET', 20)
+
+
+def _cache_key(generation, bucket, start):
+    return f'events:calendar:{generation}:{bucket}:{start.isoformat()}'
+
+
+def query_buckets(starts, bucket):
+    """`{start: {'start', 'count', 'events'}}` for each of `starts`, read from the database."""
+    truncate = BUCKETS[bucket]('date')
+    events = Event.objects.filter(date__gte=starts[0], date__lt=next_bucket(starts[-1], bucket))
+    buckets = {start: {'start': start.isoformat(), 'count': 0, 'events': []} for start in starts}
+
+    counts = events.annotate(bucket=truncate).values('bucket').annotate(count=Count('id')).order_by('bucket')
+    for row in counts:
+        if row['bucket'] in buckets:
+            buckets[row['bucket']]['count'] = row['count']
+
+    # The first few events of each bucket, in calendar order
+    order = [F('date').asc(), F('time').asc(), F('id').asc()]
+    summaries = (
+        events.annotate(bucket=truncate, position=Window(RowNumber(), partition_by=[truncate], order_by=order))
+        .filter(position__lte=get_events_per_bucket())
+        .values('bucket', *EventReadSerializer.get_columns(SUMMARY_FIELDS))
+        .order_by(*order)
+    )
+    serializer = EventReadSerializer(fields=SUMMARY_FIELDS)
+    for row in summaries:
+        if row['bucket'] in buckets:
+            buckets[row['bucket']]['events'].append(serializer.to_representation(row))
+    return buckets
+
+
+def get_buckets(starts, bucket):
+    """The buckets starting at `starts`, from the cache where possible."""
+    cache = get_event_cache()
+    generation = get_generation('calendar')
+    keys = {start: _cache_key(generation, bucket, start) for start in starts}
+    cached = cache.get_many(keys.values())
+
+    missing = [start for start in starts if keys[start] not in cached]
+    if missing:
+        # One query pair covers every missing bucket, and any cached ones between them
+        queried = query_buckets(bucket_starts(missing[0], missing[-1], bucket), bucket)
+        fresh = {keys[start]: queried[start] for start in missing}
+        cache.set_many(fresh, get_default_timeout())
+        cached.update(fresh)
+    return [cached[keys[start]] for start in starts]
@@ -0,0 +1,70 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    Answers `If-None-Match` / `If-Modified-Since` with a 304 before any rows
+    are loaded or serialized.
+
+    Views implement `get_validators()` with one cheap aggregate query that
+    returns `(last_modified, fingerprint)`. A `None` fingerprint skips the
+    check (e.g. so a missing object still gets its 404).
+    """
+
+    def get(self, request, *args, **kwargs):
+        last_modified, fingerprint = self.get_validators(request, *args, **kwargs)
+        if fingerprint is None:
+            return super().get(request, *args, **kwargs)
+
+        etag, timestamp = make_validators(request, last_modified, fingerprint)
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return set_validator_headers(response, etag, timestamp)
+
+    def get_validators(self, request, *args, **kwargs):
+        raise NotImplementedError('`get_validators()` must be implemented.')
+
+
+def make_validators(request, last_modified, fingerprint):
+    """Returns the `(etag, last_modified_timestamp)` pair for a response."""
+    # The payload embeds absolute URLs, so the ETag is tied to the full URL
+    digest = hashlib.md5(f'{request.build_absolute_uri()}|{fingerprint}'.encode('utf-8')).hexdigest()
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return quote_etag(digest), timestamp
+
+
+def set_validator_headers(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if timestamp is not None:
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+    return response
+
+
+def aggregate_validators(queryset, *timestamp_fields):
+    """
+    Row count plus the newest value of each timestamp field, in one query.
+
+    The count makes deletions change the fingerprint even though they leave
+    no newer timestamp behind. For the same reason there is no Last-Modified:
+    the newest timestamp does not move when a row is deleted, so a client
+    sending only If-Modified-Since would get a 304 for a list that lost rows.
+    """
+    aggregates = {f'last_{index}': Max(field) for index, field in enumerate(timestamp_fields)}
+    return _validators_from(queryset.order_by().aggregate(count=Count('pk'), **aggregates), aggregates)
+
+
+async def aaggregate_validators(queryset, *timestamp_fields):
+    """Async version of `aggregate_validators()`."""
+    aggregates = {f'last_{index}': Max(field) for index, field in enumerate(timestamp_fields)}
+    return _validators_from(await queryset.order_by().aaggregate(count=Count('pk'), **aggregates), aggregates)
+
+
+def _validators_from(stats, aggregates):
+    fingerprint = ':'.join([str(stats['count'])] + [str(stats[key]) for key in aggregates])
+    return None, fingerprint
@@ -0,0 +1,21 @@
+from django_filters import rest_framework as filters
+
+from .models import Event, Registration
+
+
+class EventSearchFilter(filters.FilterSet):
+    """`date_after` / `date_before` (inclusive) and `charge`, combinable with the search."""
+    date = filters.DateFromToRangeFilter()
+    charge = filters.ChoiceFilter(choices=Event.CHARGE_CHOICES)
+
+    class Meta:
+        model = Event
+        fields = ['date', 'charge']
+
+
+class ParticipantFilter(filters.FilterSet):
+    """`status` of the participant's registration."""
+
+    class Meta:
+        model = Registration
+        fields = ['status']
@@ -0,0 +1,154 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Name -> (width, height, crop). Cropped renditions fill the box exactly,
+# the others are scaled down to fit inside it.
+RENDITIONS = {
+    'thumbnail': (160, 160, True),
+    'card': (640, 360, True),
+    'full': (1600, 1600, False),
+}
+
+RENDITIONS_DIR = 'event_images/renditions'
+
+_executor = None
+
+
+def get_formats():
+    """Output formats, most preferred first; WebP only when Pillow was built with it."""
+    formats = ['jpeg']
+    if features.check('webp'):
+        formats.insert(0, 'webp')
+    return formats
+
+
+def render_renditions(data):
+    """
+    Decodes image bytes once and returns `{(name, format): bytes}` for every rendition.
+
+    EXIF orientation is applied to the pixels and no metadata is written to
+    the outputs. Pure CPU work with no Django access, so it can run in a
+    process pool.
+    """
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGB')
+
+    outputs = {}
+    for name, (width, height, crop) in RENDITIONS.items():
+        if crop:
+            resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail((width, height), Image.LANCZOS)
+        for format in get_formats():
+            buffer = BytesIO()
+            if format == 'jpeg':
+                resized.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+            else:
+                resized.save(buffer, 'WEBP', quality=80, method=4)
+            outputs[(name, format)] = buffer.getvalue()
+    return outputs
+
+
+def rendition_paths(renditions):
+    """Every file path in an `image_renditions` value."""
+    return {path for paths in (renditions or {}).values() for path in paths.values()}
+
+
+def delete_renditions(paths):
+    for path in paths:
+        try:
+            default_storage.delete(path)
+        except OSError:
+            logger.warning("Could not delete rendition %s", path, exc_info=True)
+
+
+def store_renditions(event_id, source_name, outputs):
+    """
+    Writes rendered files to storage and records them on the event.
+
+    Nothing is recorded if the event's image changed while rendering, so a
+    slow job never overwrites the renditions of a newer upload; its files are
+    deleted instead. Files of the renditions being replaced are deleted once
+    the new ones are recorded.
+    """
+    from .cache import invalidate_event
+    from .models import Event
+
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    renditions = {}
+    for (name, format), content in outputs.items():
+        extension = 'jpg' if format == 'jpeg' else format
+        path = default_storage.save(f'{RENDITIONS_DIR}/{event_id}/{stem}-{name}.{extension}', ContentFile(content))
+        renditions.setdefault(name, {})[format] = path
+
+    with transaction.atomic():
+        rows = Event.objects.select_for_update().filter(pk=event_id, image=source_name)
+        previous = rows.values_list('image_renditions', flat=True).first()
+        updated = rows.update(image_renditions=renditions, updated_at=timezone.now())
+    if not updated:
+        delete_renditions(rendition_paths(renditions))
+        return None
+    # queryset.update() sends no post_save, so drop the cached payloads here
+    invalidate_event(event_id)
+    delete_renditions(rendition_paths(previous) - rendition_paths(renditions))
+    return renditions
+
+
+def process_event_image(event_id, source_name):
+    """Renders and stores the renditions of one uploaded image."""
+    with default_storage.open(source_name, 'rb') as source:
+        data = source.read()
+    return store_renditions(event_id, source_name, render_renditions(data))
+
+
+def _run_job(event_id, source_name):
+    try:
+        process_event_image(event_id, source_name)
+    except Exception:
+        logger.exception("Could not render image %s of event %s", source_name, event_id)
+    finally:
+        # Worker threads are not request threads, so nobody else closes their connection
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+            thread_name_prefix='event-images',
+        )
+    return _executor
+
+
+def schedule_renditions(event):
+    """
+    Queues rendition work for the event's current image once the transaction commits.
+
+    Runs on a small background pool (Pillow releases the GIL while decoding
+    and encoding), or inline when `IMAGE_PIPELINE_ASYNC` is off, e.g. in tests.
+    """
+    if not event.image:
+        return
+    event_id, source_name = event.pk, event.image.name
+
+    def submit():
+        if getattr(settings, 'IMAGE_PIPELINE_ASYNC', True):
+            get_executor().submit(_run_job, event_id, source_name)
+        else:
+            process_event_image(event_id, source_name)
+
+    transaction.on_commit(submit)
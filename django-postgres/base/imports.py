@@ -0,0 +1,158 @@
+import csv
+import json
+import logging
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Event, Participant, Registration
+from .stats import rebuild_stats
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+
+class RegistrationImportRowSerializer(serializers.Serializer):
+    """One row of a bulk registration import."""
+    event_id = serializers.IntegerField()
+    name = serializers.CharField(max_length=100)
+    email = serializers.EmailField()
+    status = serializers.ChoiceField(choices=Registration.STATUS_CHOICES, required=False, allow_blank=True)
+
+
+def read_rows(lines, format='jsonl'):
+    """Yields `(row_number, data)` from an iterable of text lines, one row at a time."""
+    if format == 'csv':
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row
+        return
+
+    number = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def import_registrations(rows, batch_size=500, default_status='pending'):
+    """
+    Validates and upserts `(row_number, data)` rows, yielding one result per row.
+
+    Rows are consumed `batch_size` at a time and each batch is written in its
+    own transaction: participants are upserted by email and registrations by
+    (event, participant), each with a single INSERT ... ON CONFLICT.
+    Existing participants keep their name, and existing registrations keep
+    their status unless the row gives one; `default_status` is only used
+    for new registrations.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        yield from _import_batch(batch, default_status)
+
+
+def _failed(number, errors, data=None):
+    result = {'row': number, 'result': 'failed', 'errors': errors}
+    if isinstance(data, dict) and data.get('email'):
+        result['email'] = data['email']
+    return result
+
+
+def _import_batch(batch, default_status):
+    results = {}
+    valid = []
+    for number, data in batch:
+        if not isinstance(data, dict):
+            results[number] = _failed(number, {'row': ['Expected a JSON object.']})
+            continue
+        serializer = RegistrationImportRowSerializer(data=data)
+        if not serializer.is_valid():
+            results[number] = _failed(number, serializer.errors, data)
+            continue
+        valid.append((number, serializer.validated_data))
+
+    event_ids = {row['event_id'] for _, row in valid}
+    starts = dict(Event.objects.filter(id__in=event_ids).values_list('id', 'starts_at'))
+    now = timezone.now()
+
+    participants = {}
+    pending = {}
+    for number, row in valid:
+        key = (row['event_id'], row['email'])
+        starts_at = starts.get(row['event_id'])
+        if starts_at is None:
+            results[number] = _failed(number, {'event_id': ['Event not found.']}, row)
+        elif starts_at < now:
+            results[number] = _failed(number, {'event_id': ['Event date or time has passed. Registration is closed.']}, row)
+        elif key in pending:
+            # ON CONFLICT cannot touch the same row twice in one statement
+            results[number] = _failed(number, {'row': [f'Duplicate of row {pending[key][0]}.']}, row)
+        else:
+            participants[row['email']] = Participant(name=row['name'], email=row['email'])
+            pending[key] = (number, row.get('status') or None)
+
+    if pending:
+        # Rows without a status leave an existing registration's status alone
+        given = {key: value for key, value in pending.items() if value[1] is not None}
+        missing = {key: value for key, value in pending.items() if value[1] is None}
+        try:
+            with transaction.atomic():
+                Participant.objects.bulk_create(
+                    participants.values(),
+                    update_conflicts=True,
+                    unique_fields=['email'],
+                    # A no-op update, so the ids come back; existing participants
+                    # keep their stored name, as with upsert_participant()
+                    update_fields=['email'],
+                )
+                registrations = {}
+                for rows, update_fields in ((given, ['status', 'updated_at']), (missing, ['participant'])):
+                    if not rows:
+                        continue
+                    created = Registration.objects.bulk_create(
+                        [
+                            Registration(event_id=event_id, participant=participants[email], status=status or default_status)
+                            for (event_id, email), (number, status) in rows.items()
+                        ],
+                        update_conflicts=True,
+                        unique_fields=['event', 'participant'],
+                        # ['participant'] is a no-op update that only returns the id
+                        update_fields=update_fields,
+                    )
+                    registrations.update(zip(rows, created))
+                # The status each row without one ended up with, new or kept
+                statuses = {registration.pk: registration.status for registration in registrations.values()}
+                if missing:
+                    statuses.update(
+                        Registration.objects.filter(pk__in=[registrations[key].pk for key in missing])
+                        .values_list('pk', 'status')
+                    )
+                # bulk_create() sends no signals and does not say which rows were updated
+                rebuild_stats({event_id for event_id, email in pending})
+        except DatabaseError:
+            logger.exception("Bulk registration batch failed")
+            for (event_id, email), (number, status) in pending.items():
+                results[number] = _failed(number, {'row': ['Could not be saved. Try the import again.']}, {'email': email})
+        else:
+            for (event_id, email), (number, status) in pending.items():
+                registration = registrations[(event_id, email)]
+                results[number] = {
+                    'row': number,
+                    'result': 'imported',
+                    'email': email,
+                    'event_id': event_id,
+                    'registration_id': registration.pk,
+                    'status': statuses[registration.pk],
+                }
+
+    return [results[number] for number in sorted(results)]
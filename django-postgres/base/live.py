@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import select
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import EventActivity
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY channel shared by every process; the payload is the event id
+CHANNEL = 'ratiba_event_activity'
+
+
+def publish(event_id, kind, data):
+    """
+    Records a change of one event and wakes its live subscribers after commit.
+
+    The row is the durable part (subscribers read it back, and resuming
+    clients replay from it); the notification only says "look again".
+    """
+    activity = EventActivity.objects.create(event_id=event_id, kind=kind, data=data)
+    transaction.on_commit(lambda: get_broker().notify(event_id))
+    return activity
+
+
+def publish_many(event_id, kind, items):
+    """`publish()` for several changes of one kind: one INSERT and one notification."""
+    activities = EventActivity.objects.bulk_create(
+        [EventActivity(event_id=event_id, kind=kind, data=data) for data in items]
+    )
+    if activities:
+        transaction.on_commit(lambda: get_broker().notify(event_id))
+    return activities
+
+
+def registration_data(registration):
+    return {
+        'registration_id': registration.pk,
+        'participant_id': registration.participant_id,
+        'name': registration.participant.name,
+        'status': registration.status,
+        'timestamp': registration.timestamp,
+    }
+
+
+def booking_data(booking):
+    return {
+        'booking_id': booking.pk,
+        'participant_id': booking.participant_id,
+        'status': booking.status,
+        'booked': booking.booked,
+        'timestamp': booking.timestamp,
+    }
+
+
+def _read(function, *args):
+    # A connection is only held while reading, never for the life of a stream
+    try:
+        return function(*args)
+    finally:
+        connections.close_all()
+
+
+# Runs a query on a pool thread and closes that thread's connection afterwards
+read_db = sync_to_async(_read, thread_sensitive=False)
+
+
+def latest_activity_id(event_id):
+    return EventActivity.objects.filter(event_id=event_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def activity_after(event_id, last_id):
+    return list(EventActivity.objects.filter(event_id=event_id, id__gt=last_id).order_by('id'))
+
+
+class Feed:
+    """
+    Reads one event's new activity for every live connection in this process.
+
+    However many clients follow the event, one task queries `EventActivity`:
+    on each notification, and every `resync` seconds in case one was lost.
+    Each batch of rows goes to every subscription's queue.
+    """
+    resync = 60
+
+    def __init__(self, broker, event_id):
+        self.broker = broker
+        self.event_id = event_id
+        self.loop = asyncio.get_running_loop()
+        self.subscriptions = set()
+        self.wakeup = asyncio.Event()
+        self.ready = asyncio.Event()
+        self.last_id = None
+        self.task = self.loop.create_task(self.run())
+
+    def add(self, subscription):
+        self.subscriptions.add(subscription)
+        if self.ready.is_set():
+            subscription.start_id = self.last_id
+
+    def wake(self):
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def run(self):
+        while self.last_id is None:
+            try:
+                self.last_id = await read_db(latest_activity_id, self.event_id)
+            except Exception:
+                logger.exception("Live update feed of event %s could not read the log; retrying", self.event_id)
+                await asyncio.sleep(5)
+        for subscription in self.subscriptions:
+            subscription.start_id = self.last_id
+        self.ready.set()
+
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.resync)
+            except asyncio.TimeoutError:
+                pass
+            # Cleared before reading, so a notification that arrives mid-read wakes us again
+            self.wakeup.clear()
+            try:
+                activities = await read_db(activity_after, self.event_id, self.last_id)
+            except Exception:
+                logger.exception("Live update feed of event %s could not read the log; retrying", self.event_id)
+                await asyncio.sleep(5)
+                self.wakeup.set()
+                continue
+            if activities:
+                self.last_id = activities[-1].id
+                for subscription in self.subscriptions:
+                    subscription.queue.put_nowait(activities)
+
+
+class Subscription:
+    """One live connection: the batches of activity its feed reads after `start_id`."""
+
+    def __init__(self, feed):
+        self.feed = feed
+        self.queue = asyncio.Queue()
+        self.start_id = None  # Where the log ended when the subscription started
+
+    async def get(self, timeout):
+        """The next batch of activity rows, or None when `timeout` ran out first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.feed.broker.unsubscribe(self)
+
+
+class MemoryBroker:
+    """Wakes feeds in this process only; for tests and single-process servers."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.feeds = {}  # event id -> {event loop: Feed}
+
+    async def subscribe(self, event_id):
+        """Follows `event_id` from now; the caller must `close()` the subscription."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            feeds = self.feeds.setdefault(event_id, {})
+            feed = feeds.get(loop)
+            if feed is None:
+                feed = feeds[loop] = Feed(self, event_id)
+        subscription = Subscription(feed)
+        feed.add(subscription)
+        try:
+            await feed.ready.wait()
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    def unsubscribe(self, subscription):
+        feed = subscription.feed
+        feed.subscriptions.discard(subscription)
+        if feed.subscriptions:
+            return
+        feed.task.cancel()
+        with self.lock:
+            feeds = self.feeds.get(feed.event_id, {})
+            if feeds.get(feed.loop) is feed:
+                del feeds[feed.loop]
+            if not feeds:
+                self.feeds.pop(feed.event_id, None)
+
+    def notify(self, event_id):
+        self.wake(event_id)
+
+    def wake(self, event_id):
+        with self.lock:
+            feeds = list(self.feeds.get(event_id, {}).values())
+        for feed in feeds:
+            feed.wake()
+
+    def wake_all(self):
+        with self.lock:
+            feeds = [feed for feeds in self.feeds.values() for feed in feeds.values()]
+        for feed in feeds:
+            feed.wake()
+
+
+class PostgresBroker(MemoryBroker):
+    """
+    Fans notifications out across processes with Postgres LISTEN/NOTIFY.
+
+    Publishers send `NOTIFY` on the shared channel; each process runs one
+    listener thread on its own connection that wakes the local feeds.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        super().__init__()
+        self.using = using
+        self.listener = None
+
+    async def subscribe(self, event_id):
+        self.ensure_listener()
+        return await super().subscribe(event_id)
+
+    def notify(self, event_id):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, str(event_id)])
+
+    def ensure_listener(self):
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = threading.Thread(target=self.listen_forever, name='event-activity-listener', daemon=True)
+                self.listener.start()
+
+    def listen_forever(self):
+        # Connections are per thread, so this one is only used for LISTEN
+        connection = connections[self.using]
+        while True:
+            try:
+                connection.ensure_connection()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {CHANNEL}')
+                # Anything published while not listening is read now
+                self.wake_all()
+                for payload in self.receive(connection.connection):
+                    self.wake(int(payload))
+            except Exception:
+                logger.exception("Live update listener lost its connection; reconnecting")
+                connection.close()
+                time.sleep(5)
+
+    def receive(self, raw_connection):
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        if is_psycopg3:
+            for notify in raw_connection.notifies():
+                yield notify.payload
+            return
+
+        while True:
+            if select.select([raw_connection], [], [], 60) == ([], [], []):
+                continue
+            raw_connection.poll()
+            while raw_connection.notifies:
+                yield raw_connection.notifies.pop(0).payload
+
+
+_broker = None
+
+
+def get_broker():
+    """The process-wide broker chosen by `LIVE_UPDATES_BROKER` ('postgres' or 'memory')."""
+    global _broker
+    if _broker is None:
+        # The activity log always lives on the primary
+        default = 'postgres' if connections[DEFAULT_DB_ALIAS].vendor == 'postgresql' else 'memory'
+        if (getattr(settings, 'LIVE_UPDATES_BROKER', '') or default) == 'postgres':
+            _broker = PostgresBroker(DEFAULT_DB_ALIAS)
+        else:
+            _broker = MemoryBroker()
+    return _broker
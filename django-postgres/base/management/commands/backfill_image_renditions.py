@@ -0,0 +1,58 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from base.images import render_renditions, store_renditions
+from base.models import Event
+
+
+class Command(BaseCommand):
+    help = "Render thumbnail/card/full renditions for event images, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-render events that already have renditions.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+
+    def handle(self, *args, **options):
+        events = Event.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            events = events.filter(image_renditions={})
+        events = events.order_by('id').values_list('id', 'image')
+
+        done = failed = 0
+        pending = {}
+        # Decoding and encoding run in worker processes; storage and database
+        # writes stay in this process, which owns the connection.
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for event_id, source_name in events.iterator(chunk_size=200):
+                try:
+                    with default_storage.open(source_name, 'rb') as source:
+                        data = source.read()
+                except OSError as exc:
+                    failed += 1
+                    self.stderr.write(f"Event {event_id}: cannot read {source_name}: {exc}")
+                    continue
+
+                pending[pool.submit(render_renditions, data)] = (event_id, source_name)
+                # Keep a bounded number of images in memory
+                if len(pending) >= options['workers'] * 2:
+                    done, failed = self.collect(pending, done, failed, FIRST_COMPLETED)
+
+            while pending:
+                done, failed = self.collect(pending, done, failed)
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {done} images, {failed} failed."))
+
+    def collect(self, pending, done, failed, return_when='ALL_COMPLETED'):
+        finished, _ = wait(list(pending), return_when=return_when)
+        for future in finished:
+            event_id, source_name = pending.pop(future)
+            try:
+                store_renditions(event_id, source_name, future.result())
+                done += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"Event {event_id}: {exc}")
+        return done, failed
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from authentication.renderers import UserRenderer
+from base.benchmark import sample_events, time_median
+from base.renderers import FastJSONRenderer, orjson
+from base.serializers import EventSerializer
+
+
+class LegacyUserRenderer(JSONRenderer):
+    """`UserRenderer` as it was before FastJSONRenderer, for comparison."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import json
+
+        if 'ErrorDetail' in str(data):
+            return json.dumps({'errors': data})
+        return json.dumps({'data': data})
+
+
+class Command(BaseCommand):
+    help = (
+        "Time JSON rendering of an EventList payload with DRF's JSONRenderer, "
+        "FastJSONRenderer and UserRenderer. Needs no database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed renders per renderer.")
+
+    def handle(self, *args, **options):
+        data = {'next': None, 'previous': None, 'results': EventSerializer(sample_events(options['events']), many=True).data}
+        self.stdout.write(
+            f"{options['events']} events, orjson {'installed' if orjson else 'missing (stdlib fallback)'}"
+        )
+
+        # As in a view: the renderers can tell success from failure by the response
+        context = {'response': Response(status=200)}
+        baseline = None
+        for name, renderer in (
+            ('JSONRenderer', JSONRenderer()),
+            ('FastJSONRenderer', FastJSONRenderer()),
+            ('UserRenderer (before)', LegacyUserRenderer()),
+            ('UserRenderer', UserRenderer()),
+        ):
+            size = len(renderer.render(data, renderer_context=context))
+            median = time_median(lambda: renderer.render(data, renderer_context=context), options['repeat']) * 1000
+            baseline = baseline or median
+            self.stdout.write(f"  {name:<22} {median:8.2f} ms  {size / 1024:8.0f} KiB  {baseline / median:5.1f}x")
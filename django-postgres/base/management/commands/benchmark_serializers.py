@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from base.benchmark import sample_events, time_median
+from base.read_serializers import STATS_FIELDS, EventReadSerializer
+from base.serializers import EventSerializer
+
+
+def as_row(event):
+    """The `.values()` row `EventReadSerializer.prepare()` would fetch for `event`."""
+    row = {column: getattr(event, column) for column in EventReadSerializer.get_columns() if '__' not in column}
+    row['image'] = event.image.name or ''
+    row['stats__event'] = event.id
+    row.update({f'stats__{field}': getattr(event.stats, field) for field in STATS_FIELDS})
+    return row
+
+
+class Command(BaseCommand):
+    help = (
+        "Time serializing an EventList page with EventSerializer and EventReadSerializer. "
+        "Needs no database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=10, help="Timed runs per serializer.")
+        parser.add_argument('--fields', help="Comma-separated selection, as in ?fields=.")
+
+    def handle(self, *args, **options):
+        events = sample_events(options['events'])
+        rows = [as_row(event) for event in events]
+        # ALLOWED_HOSTS may not include RequestFactory's default testserver
+        context = {'request': RequestFactory().get('/events/', HTTP_HOST='localhost')}
+        fields = tuple(options['fields'].split(',')) if options['fields'] else None
+        self.stdout.write(f"{options['events']} events, fields: {options['fields'] or 'all'}")
+
+        baseline = None
+        for name, serialize in (
+            ('EventSerializer', lambda: EventSerializer(events, many=True, context=context, fields=fields).data),
+            ('EventReadSerializer', lambda: EventReadSerializer(rows, many=True, context=context, fields=fields).data),
+        ):
+            median = time_median(serialize, options['repeat']) * 1000
+            baseline = baseline or median
+            self.stdout.write(f"  {name:<22} {median:8.2f} ms  {baseline / median:5.1f}x")
@@ -0,0 +1,48 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.imports import IMPORT_FORMATS, import_registrations, read_rows
+from base.models import Registration
+
+
+class Command(BaseCommand):
+    help = "Bulk-register participants for events from a CSV or JSON lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="Defaults to csv for .csv files, jsonl otherwise.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--status', choices=[key for key, _ in Registration.STATUS_CHOICES], default='pending',
+                            help="Status for rows that do not set one.")
+        parser.add_argument('--report', help="Write the per-row JSON lines report to this file.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+
+        try:
+            source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+
+        report = open(options['report'], 'w', encoding='utf-8') if options['report'] else None
+        imported = failed = 0
+        try:
+            rows = read_rows(source, format)
+            for result in import_registrations(rows, batch_size=options['batch_size'], default_status=options['status']):
+                if result['result'] == 'imported':
+                    imported += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f"Row {result['row']}: {json.dumps(result['errors'])}")
+                if report:
+                    report.write(json.dumps(result) + '\n')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if report:
+                report.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} registrations, {failed} failed."))
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.models import EventActivity
+
+
+class Command(BaseCommand):
+    help = "Delete live update history older than --days; clients cannot resume from before that."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = EventActivity.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} activity rows older than {options['days']} days."))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from base.models import Event
+from base.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recount per-event registration and booking statistics and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, action='append', dest='events', help="Only this event; repeatable.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--check', action='store_true', help="Report drifted events without fixing them.")
+
+    def handle(self, *args, **options):
+        events = Event.objects.order_by('id').values_list('id', flat=True)
+        if options['events']:
+            events = events.filter(id__in=options['events'])
+
+        checked = 0
+        drifted = []
+        batch = []
+        for event_id in events.iterator(chunk_size=options['batch_size']):
+            batch.append(event_id)
+            if len(batch) >= options['batch_size']:
+                drifted += self.rebuild(batch, options['check'])
+                checked += len(batch)
+                batch = []
+        if batch:
+            drifted += self.rebuild(batch, options['check'])
+            checked += len(batch)
+
+        for event_id in drifted:
+            self.stdout.write(f"Event {event_id}: stats {'drifted' if options['check'] else 'rebuilt'}")
+        verb = "need fixing" if options['check'] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} events, {len(drifted)} {verb}."))
+
+    def rebuild(self, event_ids, dry_run):
+        with transaction.atomic():
+            return rebuild_stats(event_ids, dry_run=dry_run)
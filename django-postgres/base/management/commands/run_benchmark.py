@@ -0,0 +1,111 @@
+import json
+import platform
+import subprocess
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from base.benchmark import SCENARIOS, BenchmarkData, compare, run_scenario
+from base.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test a running server seeded with `seed_benchmark` and write the "
+        "latency, throughput and query counts of each endpoint to a JSON file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help="Server under test.")
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=list(SCENARIOS),
+                            help="Only this scenario; repeatable. Defaults to all of them.")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per scenario.")
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--warmup', type=int, default=20, help="Untimed requests before each scenario.")
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--password', default='benchmark-password', help="As given to seed_benchmark.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Result file; defaults to benchmark-<timestamp>.json.")
+        parser.add_argument('--compare', help="An earlier result file to check for regressions.")
+        parser.add_argument('--tolerance', type=float, default=0.1,
+                            help="Allowed change before --compare reports a regression (0.1 = 10%%).")
+
+    def handle(self, *args, **options):
+        data = self.load_data(options['password'])
+        base_url = options['base_url'].rstrip('/')
+        names = options['scenarios'] or list(SCENARIOS)
+
+        results = {
+            'started_at': timezone.now().isoformat(),
+            'base_url': base_url,
+            'commit': self.git_commit(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'scenarios': {},
+        }
+        for name in names:
+            self.stdout.write(f"Running {name}...")
+            summary = run_scenario(
+                SCENARIOS[name](data), base_url, options['requests'], options['concurrency'],
+                warmup=options['warmup'], timeout=options['timeout'], seed=options['seed'],
+            )
+            results['scenarios'][name] = summary
+            latency = summary['latency_ms']
+            self.stdout.write(
+                f"  {summary['throughput_rps']} req/s, p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+                f"p99 {latency['p99']} ms, {summary['queries_per_request']['mean']} queries/request, "
+                f"{summary['errors']} errors"
+            )
+            if summary['statuses'].get('429'):
+                self.stdout.write(self.style.WARNING(
+                    f"  {summary['statuses']['429']} requests were throttled; raise LOGIN_RATE_IP and "
+                    f"LOGIN_RATE_ACCOUNT on the server under test, or set them empty to turn the throttles off."
+                ))
+
+        output = Path(options['output'] or f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results, options['tolerance'])
+
+    def load_data(self, password):
+        event_ids = list(Event.objects.values_list('id', flat=True))
+        future_event_ids = list(Event.objects.filter(starts_at__gte=timezone.now()).values_list('id', flat=True))
+        user_emails = list(
+            get_user_model().objects.filter(email__startswith='bench-user-', is_verified=True).values_list('email', flat=True)
+        )
+        if not (event_ids and future_event_ids and user_emails):
+            raise CommandError("No benchmark data found; run `manage.py seed_benchmark` first.")
+        return BenchmarkData(event_ids, future_event_ids, user_emails, password)
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, path, results, tolerance):
+        try:
+            baseline = json.loads(Path(path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+        regressions = 0
+        for name, metric, before, after, regressed in compare(baseline, results, tolerance):
+            line = f"{name} {metric}: {before} -> {after}"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f"{line} (regressed)"))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"{regressions} regression(s) against {path}.")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {path}."))
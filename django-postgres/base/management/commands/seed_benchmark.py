@@ -0,0 +1,131 @@
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from base.models import Event, Participant, Registration
+from base.stats import rebuild_stats
+
+EVENT_TITLE = 'Benchmark event'
+PARTICIPANT_EMAIL = 'bench-participant-{}@example.com'
+USER_EMAIL = 'bench-user-{}@example.com'
+STATUS_WEIGHTS = {'confirmed': 60, 'pending': 25, 'rsvp': 10, 'cancelled': 5}
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill a disposable database with benchmark data: events, participants, "
+        "registrations and verified login users. Run it on an empty database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100_000)
+        parser.add_argument('--registrations', type=int, default=1_000_000)
+        parser.add_argument('--participants', type=int, help="Defaults to a tenth of --registrations.")
+        parser.add_argument('--users', type=int, default=50, help="Verified users for the login scenario.")
+        parser.add_argument('--password', default='benchmark-password', help="Password of every benchmark user.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for repeatable data.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        events = options['events']
+        registrations = options['registrations']
+        participants = options['participants'] or max(registrations // 10, 1)
+        # Every participant signs up for an event at most once, see seed_registrations()
+        participants = max(participants, -(-registrations // events))
+
+        event_ids = self.seed_events(events)
+        participant_ids = self.seed_participants(participants)
+        self.seed_registrations(registrations, event_ids, participant_ids)
+        self.seed_users(options['users'], options['password'])
+
+        # bulk_create() sends no signals, so the stats rows are built in one pass at the end
+        for start in range(0, len(event_ids), self.batch_size):
+            with transaction.atomic():
+                rebuild_stats(event_ids[start:start + self.batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {events} events, {participants} participants, {registrations} registrations "
+            f"and {options['users']} users."
+        ))
+
+    def insert(self, model, rows, total, label):
+        """bulk_create()s `rows` in batches, reporting progress as it goes."""
+        batch = []
+        done = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                done += len(batch)
+                batch = []
+                self.stdout.write(f"{label}: {done}/{total}", ending='\r')
+        if batch:
+            model.objects.bulk_create(batch)
+        self.stdout.write(f"{label}: {total}/{total}")
+
+    def seed_events(self, count):
+        # Half in the past year, half in the next one
+        today = timezone.localdate()
+
+        def rows():
+            for n in range(count):
+                date = today + timedelta(days=self.rng.randint(-365, 365))
+                start = time(self.rng.randint(8, 20), self.rng.choice((0, 15, 30, 45)))
+                yield Event(
+                    title=f'{EVENT_TITLE} {n}',
+                    description='Seeded for load testing.',
+                    date=date,
+                    time=start,
+                    venue=f'Hall {n % 50}',
+                    charge=self.rng.choice(('free', 'pay')),
+                    # bulk_create() skips Event.save(), which normally fills this in
+                    starts_at=timezone.make_aware(datetime.combine(date, start)),
+                )
+
+        self.insert(Event, rows(), count, "Events")
+        return list(Event.objects.filter(title__startswith=EVENT_TITLE).order_by('id').values_list('id', flat=True))
+
+    def seed_participants(self, count):
+        rows = (Participant(name=f'Participant {n}', email=PARTICIPANT_EMAIL.format(n)) for n in range(count))
+        self.insert(Participant, rows, count, "Participants")
+        return list(
+            Participant.objects.filter(email__startswith='bench-participant-').order_by('id').values_list('id', flat=True)
+        )
+
+    def seed_registrations(self, count, event_ids, participant_ids):
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+        now = timezone.now()
+        stride = max(len(participant_ids) // len(event_ids), 1)
+
+        def rows():
+            for n in range(count):
+                # Registration n goes to event n % E; within one event the
+                # participant index advances by one per round, so the
+                # (event, participant) pairs never repeat
+                event_index = n % len(event_ids)
+                participant_index = (n // len(event_ids) + event_index * stride) % len(participant_ids)
+                yield Registration(
+                    event_id=event_ids[event_index],
+                    participant_id=participant_ids[participant_index],
+                    status=self.rng.choices(statuses, weights)[0],
+                    timestamp=now - timedelta(minutes=self.rng.randint(0, 60 * 24 * 180)),
+                )
+
+        self.insert(Registration, rows(), count, "Registrations")
+
+    def seed_users(self, count, password):
+        # Hashing is deliberately slow, so every user shares one hash
+        hashed = make_password(password)
+        User = get_user_model()
+        rows = (
+            User(username=f'bench-user-{n}', email=USER_EMAIL.format(n), password=hashed, is_verified=True)
+            for n in range(count)
+        )
+        self.insert(User, rows, count, "Users")
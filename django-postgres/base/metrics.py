@@ -0,0 +1,267 @@
+"""
+Per-endpoint request metrics.
+
+`RequestMetricsMiddleware` measures every request and files it under the
+resolved URL name (`event-list`, `register-event`, ...): latency, number of
+queries and SQL time (recorded by a wrapper installed on every database
+connection), repeated statements (a likely N+1), serializer and renderer
+time, and response size. Each response gets a `Server-Timing` header, and
+`/metrics` serves the totals in the Prometheus text format.
+
+Totals are kept per process; with several gunicorn workers each scrape sees
+the worker that answered it.
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the queries-per-request histogram buckets
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_request_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request spent, filled in as it runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.timings = {'serialize': 0.0, 'render': 0.0}
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        self.statements[sql] += 1
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+
+@contextmanager
+def measure(name):
+    """Adds the time spent in the block to the current request's `name` timing."""
+    metrics = _request_metrics.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper; see `install_query_recorder()`."""
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        # The SQL still has its placeholders, so an N+1 shows up as one repeated statement
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(connection):
+    # Installed for good rather than per request: under ASGI the ORM runs on
+    # another thread's connection, which still sees the request's context
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with measure('serialize'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Counts the time spent building `.data` towards the request's serializer time."""
+
+    @property
+    def data(self):
+        with measure('serialize'):
+            return super().data
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms, labelled by endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()  # (endpoint, method, status)
+        self.durations = {}  # endpoint -> [bucket counts..., +Inf, sum]
+        self.query_counts = {}
+        self.totals = Counter()  # (metric, endpoint)
+
+    def observe(self, endpoint, method, status, metrics, duration, size):
+        with self.lock:
+            self.requests[(endpoint, method, status)] += 1
+            self._observe(self.durations, endpoint, DURATION_BUCKETS, duration)
+            self._observe(self.query_counts, endpoint, QUERY_BUCKETS, metrics.queries)
+            self.totals[('db_queries', endpoint)] += metrics.queries
+            self.totals[('db_seconds', endpoint)] += metrics.sql_time
+            self.totals[('duplicate_queries', endpoint)] += metrics.duplicate_queries
+            self.totals[('serialize_seconds', endpoint)] += metrics.timings['serialize']
+            self.totals[('render_seconds', endpoint)] += metrics.timings['render']
+            self.totals[('response_bytes', endpoint)] += size
+
+    @staticmethod
+    def _observe(histograms, endpoint, buckets, value):
+        counts = histograms.setdefault(endpoint, [0] * (len(buckets) + 2))
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                counts[index] += 1
+        counts[len(buckets)] += 1
+        counts[-1] += value
+
+    def render(self):
+        """The Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            lines += [
+                '# HELP ratiba_requests_total Requests by endpoint, method and status.',
+                '# TYPE ratiba_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'ratiba_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+            lines += self._render_histogram('ratiba_request_duration_seconds', 'Request latency.',
+                                            self.durations, DURATION_BUCKETS)
+            lines += self._render_histogram('ratiba_db_queries_per_request', 'Database queries per request.',
+                                            self.query_counts, QUERY_BUCKETS)
+            for metric, help_text in TOTALS:
+                lines += [f'# HELP ratiba_{metric}_total {help_text}', f'# TYPE ratiba_{metric}_total counter']
+                for (name, endpoint), value in sorted(self.totals.items()):
+                    if name == metric:
+                        lines.append(f'ratiba_{metric}_total{{endpoint="{endpoint}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(name, help_text, histograms, buckets):
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for endpoint, counts in sorted(histograms.items()):
+            for bound, count in zip(buckets, counts):
+                lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {counts[len(buckets)]}')
+            lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {counts[-1]:g}')
+            lines.append(f'{name}_count{{endpoint="{endpoint}"}} {counts[len(buckets)]}')
+        return lines
+
+
+TOTALS = (
+    ('db_queries', 'Database queries run.'),
+    ('db_seconds', 'Time spent in SQL.'),
+    ('duplicate_queries', 'Statements repeated within one request (likely N+1).'),
+    ('serialize_seconds', 'Time spent building serializer data.'),
+    ('render_seconds', 'Time spent rendering response bodies.'),
+    ('response_bytes', 'Response body bytes, streaming responses excluded.'),
+)
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """Measures each request, files it in `registry` and adds `Server-Timing`."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _request_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _request_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step
+        metrics = _request_metrics.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.timings['render'] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.started
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.url_name or match.view_name) if match else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(endpoint, request.method, response.status_code, metrics, duration, size)
+
+        threshold = getattr(settings, 'METRICS_DUPLICATE_QUERY_THRESHOLD', 5)
+        sql, count = next(iter(metrics.statements.most_common(1)), (None, 0))
+        if count >= threshold:
+            logger.warning("Possible N+1 on %s: %d runs of %s", endpoint, count, sql[:200])
+
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"',
+                f'serialize;dur={metrics.timings["serialize"] * 1000:.1f}',
+                f'render;dur={metrics.timings["render"] * 1000:.1f}',
+                f'total;dur={duration * 1000:.1f}',
+            ])
+        return response
+
+
+def may_scrape(request):
+    """
+    A request sending "Authorization: Token <METRICS_TOKEN>", or from a staff user.
+
+    Not a Bearer token: TokenValidationMiddleware rejects any Bearer value
+    that is not a JWT, while a staff user's own JWT is accepted here.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Token {token}'):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_active and user.is_staff)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint."""
+    if not may_scrape(request):
+        response = HttpResponse("Authentication required.", status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Token realm="metrics"'
+        return response
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:10
+
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_starts_at(apps, schema_editor):
+    Event = apps.get_model('base', 'Event')
+    batch = []
+    for event in Event.objects.only('id', 'date', 'time').iterator(chunk_size=1000):
+        event.starts_at = timezone.make_aware(datetime.combine(event.date, event.time))
+        batch.append(event)
+        if len(batch) >= 1000:
+            Event.objects.bulk_update(batch, ['starts_at'])
+            batch = []
+    if batch:
+        Event.objects.bulk_update(batch, ['starts_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_starts_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='event',
+            name='starts_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date', 'time'], name='event_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['starts_at', 'id'], name='event_starts_at_id_idx'),
+        ),
+    ]
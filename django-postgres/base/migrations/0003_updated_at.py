@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0002_event_starts_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='registration',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0003_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(fields=['event', 'status', 'timestamp'], name='registration_event_status_idx'),
+        ),
+    ]
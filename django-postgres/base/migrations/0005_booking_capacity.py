@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0004_registration_event_status_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSeats',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seats', serialize=False, to='base.event')),
+                ('remaining', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='status',
+            field=models.CharField(choices=[('allocated', 'Allocated'), ('waitlisted', 'Waitlisted'), ('cancelled', 'Cancelled')], default='allocated', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['event', 'status', 'timestamp'], name='booking_event_status_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_booking_capacity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
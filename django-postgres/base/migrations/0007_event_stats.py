@@ -0,0 +1,50 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+STATUS_COLUMNS = {
+    'Registration': {'confirmed': 'confirmed', 'pending': 'pending', 'cancelled': 'cancelled', 'rsvp': 'rsvp'},
+    'Booking': {'allocated': 'allocated', 'waitlisted': 'waitlisted', 'cancelled': 'bookings_cancelled'},
+}
+
+
+def populate_stats(apps, schema_editor):
+    Event = apps.get_model('base', 'Event')
+    EventStats = apps.get_model('base', 'EventStats')
+    counts = {event_id: {} for event_id in Event.objects.values_list('id', flat=True)}
+    for model_name, columns in STATUS_COLUMNS.items():
+        rows = apps.get_model('base', model_name).objects.order_by().values_list('event_id', 'status')
+        for event_id, status, total in rows.annotate(total=Count('pk')):
+            if status in columns:
+                counts[event_id][columns[status]] = total
+    EventStats.objects.bulk_create(
+        [EventStats(event_id=event_id, **columns) for event_id, columns in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_event_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventStats',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='base.event')),
+                ('confirmed', models.PositiveIntegerField(default=0)),
+                ('pending', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('rsvp', models.PositiveIntegerField(default=0)),
+                ('allocated', models.PositiveIntegerField(default=0)),
+                ('waitlisted', models.PositiveIntegerField(default=0)),
+                ('bookings_cancelled', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:41
+
+from django.db import migrations
+
+# Postgres only: the search column and indexes are outside the model, so
+# other databases (e.g. SQLite test runs) skip them and base.search falls
+# back to substring matching there.
+FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE base_event ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(venue, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX event_search_vector_idx ON base_event USING gin (search_vector)",
+    "CREATE INDEX event_title_trgm_idx ON base_event USING gin (title gin_trgm_ops)",
+]
+
+REVERSE_SQL = [
+    "DROP INDEX IF EXISTS event_title_trgm_idx",
+    "DROP INDEX IF EXISTS event_search_vector_idx",
+    "ALTER TABLE base_event DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_event_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(FORWARD_SQL), run_on_postgres(REVERSE_SQL)),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:29
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_event_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30)),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='base.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'id'], name='activity_event_id_idx')],
+            },
+        ),
+    ]
@@ -1,7 +1,10 @@
 
 # base/models.py
 
-from django.db import models
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.utils import timezone
 
 class Event(models.Model):
@@ -14,21 +17,83 @@ class Event(models.Model):
     title = models.CharField(max_length=100)  # Renamed from name to title
     description = models.TextField()
     image = models.ImageField(upload_to='event_images/', max_length=500, blank=True, null=True)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)  # {name: {format: path}}, filled in by base.images
     date = models.DateField(default=timezone.localdate)  # Gets today's date without time
     time = models.TimeField(default=timezone.now)  # Gets current time
     venue = models.CharField(max_length=255, blank=True)  # Replaces location
     charge = models.CharField(max_length=4, choices=CHARGE_CHOICES, default='free')  # Free or Pay option
+    capacity = models.PositiveIntegerField(null=True, blank=True)  # Seats available for booking; empty means unlimited
+    starts_at = models.DateTimeField(editable=False)  # date + time as one aware datetime, kept in sync on save
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Validator for conditional GETs
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.starts_at = self.compute_starts_at()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            extra = {'updated_at'}
+            if {'date', 'time'} & set(update_fields):
+                extra.add('starts_at')
+            kwargs['update_fields'] = {*update_fields, *extra}
+        super().save(*args, **kwargs)
+
+    def compute_starts_at(self):
+        """Combines `date` and `time` in the current timezone."""
+        date = self._meta.get_field('date').to_python(self.date)
+        time = self._meta.get_field('time').to_python(self.time)
+        return timezone.make_aware(datetime.combine(date, time))
+
+    @property
+    def has_started(self):
+        return self.starts_at < timezone.now()
+
     class Meta:
         ordering = ['date', 'time']
+        indexes = [
+            models.Index(fields=['date', 'time'], name='event_date_time_idx'),
+            # Serves past/future range filters and keyset pagination together
+            models.Index(fields=['starts_at', 'id'], name='event_starts_at_id_idx'),
+        ]
+
+
+class StatsQuerySet(models.QuerySet):
+    """
+    Registrations and bookings are counted in `EventStats` (see base.stats).
+
+    There are no delete signals for them, which would stop Django from
+    deleting them in bulk when their event or participant is deleted, so
+    deletes adjust the counters here instead: one aggregate, then one
+    UPDATE per event.
+    """
+
+    def delete(self):
+        from .stats import apply_removals, removals
+
+        with transaction.atomic(using=self.db):
+            changes = removals(self)
+            deleted = super().delete()
+            apply_removals(changes)
+        return deleted
+
+
+class StatsCountedMixin:
+    """The single-row counterpart of `StatsQuerySet.delete()`."""
+
+    def delete(self, *args, **kwargs):
+        from .stats import record_status_change
+
+        with transaction.atomic(using=kwargs.get('using')):
+            deleted = super().delete(*args, **kwargs)
+            record_status_change(type(self), self.event_id, old_status=self.status)
+        return deleted
 
 
 class Participant(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)  # Enforce unique email addresses
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -37,7 +102,7 @@ class Participant(models.Model):
         ordering = ['name']
 
 
-class Registration(models.Model):
+class Registration(StatsCountedMixin, models.Model):
     STATUS_CHOICES = [
         ('confirmed', 'Confirmed'),
         ('pending', 'Pending'),
@@ -49,19 +114,103 @@ class Registration(models.Model):
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StatsQuerySet.as_manager()
 
     class Meta:
         unique_together = ('event', 'participant')
         ordering = ['timestamp']
+        indexes = [
+            # Backs the per-event participant list, filtered by status and paged by timestamp
+            models.Index(fields=['event', 'status', 'timestamp'], name='registration_event_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.participant} registered for {self.event}"
     
-class Booking(models.Model):
+class Booking(StatsCountedMixin, models.Model):
+    ALLOCATED = 'allocated'
+    WAITLISTED = 'waitlisted'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (ALLOCATED, 'Allocated'),
+        (WAITLISTED, 'Waitlisted'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(default=timezone.now)
     booked = models.BooleanField(default=False)  # Whether the participant has booked their spot
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=ALLOCATED)  # Seat held, queued or released
+
+    objects = StatsQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Finds the head of an event's waitlist
+            models.Index(fields=['event', 'status', 'timestamp'], name='booking_event_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.participant} booked for {self.event}"
+
+
+class EventSeats(models.Model):
+    """
+    Remaining seats of an event with a capacity, kept as a counter row.
+
+    Bookings take a seat with one conditional UPDATE on this row, so they
+    never count bookings on the hot path and can never overbook.
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name='seats')
+    remaining = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.remaining} seats left for {self.event}"
+
+
+
+class EventStats(models.Model):
+    """
+    Registration and booking counts of an event, by status.
+
+    Maintained incrementally by `base.stats` as rows are written, so event
+    payloads can embed the numbers without counting on every request.
+    `manage.py rebuild_event_stats` recomputes them from the source rows.
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    confirmed = models.PositiveIntegerField(default=0)
+    pending = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    rsvp = models.PositiveIntegerField(default=0)
+    allocated = models.PositiveIntegerField(default=0)  # Bookings holding a seat
+    waitlisted = models.PositiveIntegerField(default=0)
+    bookings_cancelled = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.event}"
+
+
+class EventActivity(models.Model):
+    """
+    A registration or booking change of an event, as pushed to live subscribers.
+
+    Rows are the replay log behind `events/<pk>/live/`: their ids are the SSE
+    event ids, so a client resuming with `Last-Event-ID` gets what it missed.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='activity')
+    kind = models.CharField(max_length=30)  # e.g. registration, rsvp, booking, booking_cancelled
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Replays one event's activity after a given id
+            models.Index(fields=['event', 'id'], name='activity_event_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} on {self.event}"
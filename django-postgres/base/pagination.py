@@ -1,7 +1,171 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.utils.urls import replace_query_param
 
 class CustomPageNumberPagination(pagination.PageNumberPagination):
     page_size=10
     page_size_query_param='count'
     max_page_size=50
-    page_query_param= 'p'
\ No newline at end of file
+    page_query_param= 'p'
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """
+    Keyset (seek) pagination over a unique ordering.
+
+    DRF's CursorPagination only keeps the first ordering field in the cursor and
+    falls back to an OFFSET for ties. Here the cursor carries a value for every
+    ordering field, so each page is a single range condition that an index on
+    the same columns can serve no matter how deep the client pages.
+
+    Fields may be descending (`'-rank'`) and may be annotations, whose cursor
+    values are kept as plain JSON numbers or strings.
+    """
+    ordering = ('id',)
+    page_size = 10
+    page_size_query_param = 'count'
+    max_page_size = 50
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async version of `paginate_queryset()` for views on the async ORM."""
+        queryset = self.get_page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """The unevaluated query for the requested page, plus one extra row."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(self.cursor and self.cursor.reverse)
+
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(self.cursor.position, reverse))
+        ordering = [self._flip(field) if reverse else field for field in self.ordering]
+
+        # Fetch one extra row to find out whether there is another page
+        return queryset.order_by(*ordering)[:self.page_size + 1]
+
+    def set_page(self, results):
+        reverse = bool(self.cursor and self.cursor.reverse)
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_keyset_filter(self, position, reverse=False):
+        """
+        Builds `(f1, f2, ...) > (v1, v2, ...)` as an OR of equal-prefix clauses.
+
+        The OR is ANDed with the implied `f1 >= v1`, which gives the database
+        a range to seek to in the ordering index; without it the planner may
+        split the OR into separate index lookups and sort their union.
+        """
+        fields = [field.lstrip('-') for field in self.ordering]
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            lookup = 'lt' if reverse != field.startswith('-') else 'gt'
+            clause = dict(zip(fields[:index], position[:index]))
+            clause[f'{fields[index]}__{lookup}'] = position[index]
+            condition |= Q(**clause)
+        if len(fields) > 1:
+            lookup = 'lte' if reverse != self.ordering[0].startswith('-') else 'gte'
+            condition = Q(**{f'{fields[0]}__{lookup}': position[0]}) & condition
+        return condition
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request, model=None):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            values = tokens['p']
+            if len(values) != len(self.ordering):
+                raise ValueError('Cursor does not match the ordering')
+            position = [self.to_python(model, field.lstrip('-'), value) for field, value in zip(self.ordering, values)]
+            reverse = bool(tokens.get('r', 0))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def to_python(self, model, field, value):
+        try:
+            return model._meta.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            # An annotation such as a search rank
+            if not isinstance(value, (int, float, str)):
+                raise ValueError('Invalid cursor value')
+            return value
+
+    def encode_cursor(self, cursor):
+        # isoformat() keeps full microsecond precision, which DjangoJSONEncoder drops
+        position = [value.isoformat() if hasattr(value, 'isoformat') else value for value in cursor.position]
+        tokens = {'p': position}
+        if cursor.reverse:
+            tokens['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(tokens).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [field.lstrip('-') for field in ordering]
+        if isinstance(instance, dict):
+            return [instance[field] for field in fields]
+        return [getattr(instance, field) for field in fields]
+
+
+class EventKeysetPagination(KeysetPagination):
+    # Same order as Event.Meta.ordering (starts_at is date + time), with the
+    # primary key as a unique tiebreaker; backed by event_starts_at_id_idx
+    ordering = ('starts_at', 'id')
+
+
+class ParticipantKeysetPagination(KeysetPagination):
+    # Registrations in sign-up order; backed by registration_event_status_idx
+    ordering = ('timestamp', 'id')
+
+
+class EventSearchPagination(KeysetPagination):
+    # Best match first; the id breaks ties between equally ranked events
+    ordering = ('-rank', 'id')
@@ -0,0 +1,208 @@
+"""
+Fast read-only serializers for the list endpoints.
+
+`EventSerializer` and `EventParticipantSerializer` spend most of a large page
+in DRF's per-field machinery (attribute lookups, `SkipField` handling, one
+`build_absolute_uri()` per URL). The classes here produce the same JSON from
+`.values()` rows: each output key has one precompiled converter, and absolute
+media URLs are built from a prefix worked out once per request.
+
+They only read. Views keep their ModelSerializer as `serializer_class` for
+writes and the API schema, and add `FastReadMixin` with a `read_serializer_class`.
+`fields` also drives `?fields=` selections (see `base.sparse`).
+"""
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.encoding import filepath_to_uri, iri_to_uri
+from rest_framework import serializers
+
+from .metrics import measure
+from .sparse import SparseFieldsMixin
+
+
+class MediaURLs:
+    """Builds absolute media URLs for one request the way the model serializers do."""
+
+    def __init__(self, request, storage=default_storage):
+        self.request = request
+        self.storage = storage
+        self.host = request.build_absolute_uri('/')[:-1] if request is not None else None
+        # FileSystemStorage.url() is its base URL plus the quoted name, so that part can be resolved once
+        self.prefix = self.absolute(storage.base_url) if isinstance(storage, FileSystemStorage) else None
+
+    def absolute(self, url):
+        """`request.build_absolute_uri(url)`, minus the parsing for plain absolute paths."""
+        if self.request is None:
+            return url
+        if url.startswith('/') and not url.startswith('//') and '/./' not in url and '/../' not in url:
+            return iri_to_uri(self.host + url)
+        return self.request.build_absolute_uri(url)
+
+    def url(self, name):
+        """Absolute URL of the stored file `name`."""
+        if self.prefix is not None and '/.' not in '/' + name:
+            return self.prefix + filepath_to_uri(name).lstrip('/')
+        return self.absolute(self.storage.url(name))
+
+
+class ReadSerializer:
+    """
+    Minimal serializer interface over `.values()` rows.
+
+    Supports what the list views, pagination and streaming use: `.data` for
+    `many=True` pages and `.to_representation(row)` for single rows.
+    Subclasses declare their output keys in `fields` and implement one
+    `get_<key>(row)` per key.
+    """
+    # {output key: the columns it reads}, in output order
+    fields = {}
+    # Read whatever the selection, e.g. for the keyset cursor
+    key_columns = ('id',)
+
+    def __init__(self, instance=None, many=False, context=None, fields=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.urls = MediaURLs(self.context.get('request'))
+        self.converters = [(name, getattr(self, f'get_{name}')) for name in fields or self.fields]
+
+    @classmethod
+    def get_columns(cls, fields=None):
+        """The columns `fields` (default: all of them) read, in a stable order."""
+        columns = dict.fromkeys(cls.key_columns)
+        for name in fields or cls.fields:
+            columns.update(dict.fromkeys(cls.fields[name]))
+        return tuple(columns)
+
+    @classmethod
+    def prepare(cls, queryset, fields=None):
+        """Restricts `queryset` to the columns `to_representation()` reads."""
+        return queryset.values(*cls.get_columns(fields))
+
+    @property
+    def data(self):
+        with measure('serialize'):
+            if self.many:
+                return serializers.ReturnList([self.to_representation(row) for row in self.instance], serializer=self)
+            return serializers.ReturnDict(self.to_representation(self.instance), serializer=self)
+
+    def to_representation(self, row):
+        return {name: convert(row) for name, convert in self.converters}
+
+
+# Same formatting as the DRF fields of the model serializers
+_date = serializers.DateField().to_representation
+_time = serializers.TimeField().to_representation
+_datetime = serializers.DateTimeField().to_representation
+STATS_FIELDS = ('confirmed', 'pending', 'cancelled', 'rsvp', 'allocated', 'waitlisted', 'bookings_cancelled')
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+def _int(value):
+    return None if value is None else int(value)
+
+
+class EventReadSerializer(ReadSerializer):
+    """Read path of `EventSerializer`; same keys, order and values."""
+    fields = {
+        'id': ('id',),
+        'title': ('title',),
+        'description': ('description',),
+        'image': ('image',),
+        'date': ('date',),
+        'time': ('time',),
+        'venue': ('venue',),
+        'charge': ('charge',),
+        'capacity': ('capacity',),
+        'image_url': ('image',),
+        'image_srcset': ('image_renditions',),
+        'stats': ('stats__event', *(f'stats__{field}' for field in STATS_FIELDS)),
+    }
+    key_columns = ('id', 'starts_at')  # For the keyset cursor
+
+    def get_id(self, row):
+        return row['id']
+
+    def get_title(self, row):
+        return _str(row['title'])
+
+    def get_description(self, row):
+        return _str(row['description'])
+
+    def get_image(self, row):
+        return self.urls.url(row['image']) if row['image'] else None
+
+    def get_date(self, row):
+        return _date(row['date'])
+
+    def get_time(self, row):
+        return _time(row['time'])
+
+    def get_venue(self, row):
+        return _str(row['venue'])
+
+    def get_charge(self, row):
+        return _str(row['charge'])
+
+    def get_capacity(self, row):
+        return _int(row['capacity'])
+
+    get_image_url = get_image
+
+    def get_image_srcset(self, row):
+        return {
+            name: {format: self.urls.url(path) for format, path in paths.items()}
+            for name, paths in (row['image_renditions'] or {}).items()
+        }
+
+    def get_stats(self, row):
+        # null when the event has no stats row, as EventSerializer renders it
+        if row['stats__event'] is None:
+            return None
+        return {field: int(row[f'stats__{field}']) for field in STATS_FIELDS}
+
+
+class EventParticipantReadSerializer(ReadSerializer):
+    """Read path of `EventParticipantSerializer` over registration rows."""
+    fields = {
+        'id': ('participant',),
+        'name': ('participant__name',),
+        'email': ('participant__email',),
+        'registration_id': ('id',),
+        'status': ('status',),
+        'timestamp': ('timestamp',),
+    }
+    key_columns = ('id', 'timestamp')  # For the keyset cursor
+
+    def get_id(self, row):
+        return row['participant']
+
+    def get_name(self, row):
+        return _str(row['participant__name'])
+
+    def get_email(self, row):
+        return _str(row['participant__email'])
+
+    def get_registration_id(self, row):
+        return row['id']
+
+    def get_status(self, row):
+        return _str(row['status'])
+
+    def get_timestamp(self, row):
+        return _datetime(row['timestamp'])
+
+
+class FastReadMixin(SparseFieldsMixin):
+    """For generic list views: reads `.values()` rows through `read_serializer_class`."""
+
+    def project(self, queryset, fields):
+        return self.read_serializer_class.prepare(queryset, fields)
+
+    def get_serializer_class(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # Schema generation describes the model serializer
+            return super().get_serializer_class()
+        return self.read_serializer_class
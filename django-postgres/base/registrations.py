@@ -0,0 +1,134 @@
+from django.db import connections, router
+from django.utils import timezone
+
+from .models import Event, Participant, Registration
+from .stats import rebuild_stats, record_status_change
+
+
+class RegistrationClosed(Exception):
+    """The event has already started, so it no longer takes registrations."""
+
+
+def _column(model, name):
+    return connections[router.db_for_write(model)].ops.quote_name(model._meta.get_field(name).column)
+
+
+def _table(model):
+    return connections[router.db_for_write(model)].ops.quote_name(model._meta.db_table)
+
+
+def upsert_participant(name, email, now=None):
+    """
+    Returns the participant with `email`, creating it in the same statement if needed.
+
+    A single INSERT ... ON CONFLICT (email) ... RETURNING, so two concurrent
+    requests for a new address cannot both miss and then collide on the unique
+    constraint the way get_or_create() does. An existing participant keeps
+    their stored name.
+    """
+    using = router.db_for_write(Participant)
+    now = connections[using].ops.adapt_datetimefield_value(now or timezone.now())
+    email_column = _column(Participant, 'email')
+    sql = (
+        f"INSERT INTO {_table(Participant)} ({_column(Participant, 'name')}, {email_column}, {_column(Participant, 'updated_at')}) "
+        f"VALUES (%s, %s, %s) "
+        f"ON CONFLICT ({email_column}) DO UPDATE SET {email_column} = EXCLUDED.{email_column} "
+        f"RETURNING {_column(Participant, 'id')}, {_column(Participant, 'name')}, {email_column}"
+    )
+    return list(Participant.objects.raw(sql, [name, email, now], using=using))[0]
+
+
+def register_participant(event_id, participant, status='pending', overwrite_status=False):
+    """
+    Registers `participant` for an event and returns `(registration, created)`.
+
+    The insert only selects the event row when it has not started yet, and
+    ON CONFLICT (event, participant) makes a repeated request a no-op (or a
+    status change with `overwrite_status`). The happy path is this one
+    statement, which also returns whether the row is new and the status it
+    replaced; the follow-up reads below only run when nothing was written.
+
+    The registration's `old_status` is the status it had before the call
+    (None when new, or when a concurrent request wrote it first and the
+    status it replaced is unknown), so callers can tell whether anything
+    changed.
+
+    Raises `Event.DoesNotExist` or `RegistrationClosed`.
+    """
+    using = router.db_for_write(Registration)
+    connection = connections[using]
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    id_column = _column(Registration, 'id')
+    event_column = _column(Registration, 'event')
+    participant_column = _column(Registration, 'participant')
+    status_column = _column(Registration, 'status')
+    updated_column = _column(Registration, 'updated_at')
+    table = _table(Registration)
+    returning = f"{id_column}, {event_column}, {participant_column}, {_column(Registration, 'timestamp')}, {status_column}"
+    params = [participant.pk, now, status, now, event_id, now]
+
+    if overwrite_status:
+        on_conflict = (
+            f"DO UPDATE SET {status_column} = EXCLUDED.{status_column}, {updated_column} = EXCLUDED.{updated_column} "
+            f"WHERE {table}.{status_column} <> EXCLUDED.{status_column}"
+        )
+    else:
+        # Only new rows come back, so there is no old status
+        on_conflict = "DO NOTHING"
+    insert = (
+        f"INSERT INTO {table} ({event_column}, {participant_column}, {_column(Registration, 'timestamp')}, {status_column}, {updated_column}) "
+        f"SELECT {_column(Event, 'id')}, %s, %s, %s, %s FROM {_table(Event)} "
+        f"WHERE {_column(Event, 'id')} = %s AND {_column(Event, 'starts_at')} >= %s "
+        f"ON CONFLICT ({event_column}, {participant_column}) {on_conflict} "
+    )
+
+    old_status = None
+    if overwrite_status and connection.vendor == 'postgresql':
+        # RETURNING only sees the new row, but every part of the statement
+        # reads the same snapshot, so `old` is the row before the write.
+        # xmax is 0 on inserted rows
+        sql = (
+            f"WITH old AS (SELECT {status_column} FROM {table} "
+            f"WHERE {event_column} = %s AND {participant_column} = %s), "
+            f"written AS ({insert}RETURNING {returning}, (xmax = 0) AS created) "
+            f"SELECT written.*, (SELECT {status_column} FROM old) AS old_status FROM written"
+        )
+        params = [event_id, participant.pk, *params]
+    else:
+        if overwrite_status:
+            # Without data-modifying CTEs the status being replaced is read first
+            old_status = (
+                Registration.objects.using(using)
+                .filter(event_id=event_id, participant=participant)
+                .values_list('status', flat=True)
+                .first()
+            )
+        sql = f"{insert}RETURNING {returning}"
+
+    rows = list(Registration.objects.raw(sql, params, using=using))
+    if rows:
+        registration = rows[0]
+        registration.participant = participant
+        registration.old_status = old_status = getattr(registration, 'old_status', old_status)
+        created = getattr(registration, 'created', old_status is None)
+        if not created and old_status is None:
+            # The row was committed by a concurrent request after our snapshot
+            # was taken, so `old` missed it and the replaced status is unknown:
+            # recount the event instead of guessing
+            rebuild_stats([event_id])
+        else:
+            # Raw SQL sends no signals, so the stats row is moved here
+            record_status_change(Registration, event_id, old_status, status)
+        return registration, created
+
+    # Nothing was written: an unchanged duplicate, or an unknown or started event
+    registration = Registration.objects.using(using).filter(event_id=event_id, participant=participant).first()
+    if registration is not None:
+        registration.participant = participant
+        registration.old_status = registration.status
+        return registration, False
+    starts_at = Event.objects.using(using).filter(pk=event_id).values_list('starts_at', flat=True).first()
+    if starts_at is None:
+        raise Event.DoesNotExist
+    raise RegistrationClosed
@@ -0,0 +1,49 @@
+"""
+JSON rendering for every API response.
+
+`FastJSONRenderer` encodes with orjson when it is installed, which is several
+times faster than the stdlib encoder on list payloads, and falls back to
+DRF's encoder otherwise. The output matches DRF's `JSONRenderer` either way:
+compact, UTF-8, datetimes in UTC as `...Z`, Decimals as numbers, and
+`ErrorDetail` (a `str` subclass) as a plain string.
+"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Optional; pip install orjson
+    orjson = None
+
+_encoder = JSONEncoder()
+
+if orjson is not None:
+    # Keys of any type become strings, as with json.dumps; UTC datetimes end in Z, as with DRF
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def dumps(data, indent=False):
+        """Encodes `data` to UTF-8 JSON bytes."""
+        # Types orjson does not know (Decimal, lazy strings, QuerySets, ...) go through DRF's encoder
+        return orjson.dumps(data, default=_encoder.default, option=OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+else:
+    def dumps(data, indent=False):
+        """Encodes `data` to UTF-8 JSON bytes."""
+        if indent:
+            return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, indent=2).encode()
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in replacement for DRF's JSONRenderer, backed by `dumps()`."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = bool(self.get_indent(accepted_media_type or '', renderer_context or {}))
+        content = dumps(data, indent)
+        # Same as DRF: these are valid JSON but end a line in JavaScript
+        if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+            content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return content
@@ -0,0 +1,112 @@
+"""
+Read-replica routing.
+
+Views opt in with `ReplicaReadMixin` (or `read_from_replica` on the async
+views); every other query, and every write, goes to the primary. A client
+that just wrote something reads from the primary for `REPLICA_PIN_SECONDS`
+afterwards, so it sees its own registration even while the replica lags.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'ratiba_primary'
+
+# Per-request routing state, set up by ReplicaPinningMiddleware. A dict rather
+# than separate variables so writes seen in sync_to_async threads (which run
+# on a copy of the context) still reach the middleware.
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def use_replica_for_reads():
+    """Lets reads in the current request go to the replica (unless pinned)."""
+    state = _request_state.get()
+    if state is not None:
+        state['replica'] = True
+
+
+def reading_from_replica():
+    state = _request_state.get()
+    return bool(state and state['replica'] and not state['pinned'] and not state['wrote'] and replica_configured())
+
+
+class PrimaryReplicaRouter:
+    """Sends opted-in reads to the replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        return REPLICA_ALIAS if reading_from_replica() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        # Explicit, or Django would write back to wherever the instance was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so objects from either may be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replication brings the schema over
+        return db != REPLICA_ALIAS
+
+
+class ReplicaPinningMiddleware:
+    """
+    Tracks writes per request and pins the client to the primary after one.
+
+    The pin is a short-lived cookie, so it follows the client across workers
+    and processes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        state = {'replica': False, 'pinned': PIN_COOKIE in request.COOKIES, 'wrote': False}
+        return state, _request_state.set(state)
+
+    def finish(self, state, response):
+        if state['wrote'] and replica_configured():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10), httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class ReplicaReadMixin:
+    """For DRF views whose reads may be served by the replica."""
+
+    def initial(self, request, *args, **kwargs):
+        use_replica_for_reads()
+        super().initial(request, *args, **kwargs)
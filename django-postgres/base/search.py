@@ -0,0 +1,63 @@
+from django.db import connections, router
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from .models import Event
+
+# Text search configuration of the generated `search_vector` column (see
+# migration 0008); queries must use the same one to hit the GIN index
+SEARCH_CONFIG = 'english'
+
+
+def search_events(queryset, text):
+    """
+    Filters `queryset` to events matching `text`, annotated with a `rank`.
+
+    On Postgres this is full-text search over title, description and venue
+    plus trigram matching of the title, so a misspelt word still finds the
+    event. Other databases get a plain substring match.
+    """
+    if connections[router.db_for_read(Event)].vendor == 'postgresql':
+        return _postgres_search(queryset, text)
+    return _fallback_search(queryset, text)
+
+
+def _postgres_search(queryset, text):
+    # Imported here so other backends never need psycopg
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import (
+        SearchQuery,
+        SearchRank,
+        SearchVectorExact,
+        SearchVectorField,
+        TrigramWordSimilarity,
+    )
+
+    # The column is not a model field, so it is referenced directly
+    table = connections[router.db_for_read(Event)].ops.quote_name(Event._meta.db_table)
+    vector = RawSQL(f'{table}.search_vector', [], output_field=SearchVectorField())
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+
+    return (
+        queryset
+        # `@@` is served by event_search_vector_idx and `%>` by event_title_trgm_idx
+        .filter(Q(SearchVectorExact(vector, query)) | Q(TrigramWordSimilar(F('title'), Value(text))))
+        # Cast from real so the rank survives the round trip through the page cursor
+        .annotate(rank=Cast(SearchRank(vector, query) + TrigramWordSimilarity(text, 'title'), FloatField()))
+    )
+
+
+def _fallback_search(queryset, text):
+    words = text.split()
+    matches = Q()
+    for word in words:
+        matches &= Q(title__icontains=word) | Q(description__icontains=word) | Q(venue__icontains=word)
+    return queryset.filter(matches).annotate(
+        rank=Case(
+            When(title__icontains=text, then=Value(1.0)),
+            When(venue__icontains=text, then=Value(0.5)),
+            default=Value(0.1),
+            output_field=FloatField(),
+        )
+    )
@@ -0,0 +1,124 @@
+from django.db import transaction
+from django.db.models import F
+
+from .live import booking_data, publish, publish_many
+from .models import Booking, EventSeats
+from .stats import apply_changes
+
+
+def take_seat(event):
+    """
+    Takes one seat of `event` and returns whether one was free.
+
+    Must run inside the caller's transaction. The counter row is locked first,
+    exactly like `cancel()` does, so a booking and a cancellation of the same
+    event are serialised: either the booking sees the returned seat, or the
+    cancellation sees the new waitlisted booking and promotes it. The
+    conditional `UPDATE ... WHERE remaining > 0` makes overbooking impossible.
+    Events without a capacity always have room, and a missing counter row is
+    created on the spot.
+    """
+    if event.capacity is None:
+        return True
+    if not lock_seats(event_id=event.pk):
+        # No counter yet, e.g. the capacity was set without saving the event: build it
+        sync_seats(event)
+    return _take(event.pk)
+
+
+def lock_seats(**filters):
+    """Locks the counter row matching `filters` until the transaction ends; returns whether there is one."""
+    return EventSeats.objects.select_for_update(of=('self',)).filter(**filters).first() is not None
+
+
+def _take(event_id):
+    return EventSeats.objects.filter(event_id=event_id, remaining__gt=0).update(remaining=F('remaining') - 1) == 1
+
+
+def book(event, participant, booked=False):
+    """Creates a booking holding a seat, or on the waitlist when the event is full."""
+    with transaction.atomic():
+        status = Booking.ALLOCATED if take_seat(event) else Booking.WAITLISTED
+        booking = Booking.objects.create(event=event, participant=participant, booked=booked, status=status)
+        publish(event.pk, 'booking', booking_data(booking))
+        return booking
+
+
+def cancel(booking_id):
+    """
+    Cancels a booking and hands its seat to the head of the waitlist.
+
+    When nobody is waiting the seat goes back to the counter. Cancelling an
+    already cancelled booking is a no-op. The event's counter row is locked
+    before the booking, the same order `book()` and `sync_seats()` use.
+    """
+    with transaction.atomic():
+        lock_seats(event__booking=booking_id)
+        booking = Booking.objects.select_for_update().select_related('event').get(pk=booking_id)
+        if booking.status == Booking.CANCELLED:
+            return booking
+
+        held_seat = booking.status == Booking.ALLOCATED
+        booking.status = Booking.CANCELLED
+        booking.save(update_fields=['status'])
+        publish(booking.event_id, 'booking_cancelled', booking_data(booking))
+
+        if held_seat and booking.event.capacity is not None:
+            release_seat(booking.event_id)
+        return booking
+
+
+def release_seat(event_id):
+    """
+    Promotes the oldest waitlisted booking, or returns the seat to the counter.
+
+    The caller holds the lock on the event's counter row, so no booking can
+    join the waitlist between the lookup and the increment.
+    """
+    promoted = (
+        Booking.objects.select_for_update()
+        .filter(event_id=event_id, status=Booking.WAITLISTED)
+        .order_by('timestamp', 'id')
+        .first()
+    )
+    if promoted is not None:
+        promoted.status = Booking.ALLOCATED
+        promoted.save(update_fields=['status'])
+        publish(event_id, 'booking_promoted', booking_data(promoted))
+        return promoted
+
+    EventSeats.objects.filter(event_id=event_id).update(remaining=F('remaining') + 1)
+    return None
+
+
+def sync_seats(event):
+    """
+    Resets the counter of `event` from its capacity after the event is saved.
+
+    Counting allocated bookings is fine here since this only runs on event
+    writes, not on bookings (and once from `take_seat()` for an event that
+    has no counter yet). Freed seats go to the waitlist first.
+    """
+    if event.capacity is None:
+        EventSeats.objects.filter(event_id=event.pk).delete()
+        return
+
+    with transaction.atomic():
+        seats, _ = EventSeats.objects.select_for_update().get_or_create(event_id=event.pk)
+        allocated = Booking.objects.filter(event_id=event.pk, status=Booking.ALLOCATED).count()
+        free = max(event.capacity - allocated, 0)
+
+        waitlist = list(
+            Booking.objects.select_for_update()
+            .filter(event_id=event.pk, status=Booking.WAITLISTED)
+            .order_by('timestamp', 'id')[:free]
+        )
+        promoted = Booking.objects.filter(id__in=[booking.pk for booking in waitlist]).update(status=Booking.ALLOCATED)
+        apply_changes(event.pk, {'waitlisted': -promoted, 'allocated': promoted})
+        # queryset.update() sends nothing, so announce the promotions here
+        for booking in waitlist:
+            booking.status = Booking.ALLOCATED
+        publish_many(event.pk, 'booking_promoted', [booking_data(booking) for booking in waitlist])
+
+        seats.remaining = free - promoted
+        seats.save(update_fields=['remaining'])
@@ -1,20 +1,35 @@
 from rest_framework import serializers
-from .models import Event, Participant, Registration, Booking
+from .models import Event, EventStats, Participant, Registration, Booking
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
 from django.conf import settings
+from django.core.files.storage import default_storage
 from datetime import datetime
 from rest_framework.fields import ImageField
+from django.http import Http404
+from .registrations import RegistrationClosed, register_participant, upsert_participant
+from .seats import book
+from .live import publish, registration_data
+from .metrics import TimedListSerializer, TimedSerializerMixin
+from .sparse import SparseSerializerMixin
+
+class EventStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EventStats
+        fields = ['confirmed', 'pending', 'cancelled', 'rsvp', 'allocated', 'waitlisted', 'bookings_cancelled']
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(SparseSerializerMixin, TimedSerializerMixin, serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+    # Read from the precomputed stats row; list views select_related('stats')
+    stats = EventStatsSerializer(read_only=True)
 
     # Explicitly define the image field as an ImageField
     image = ImageField(required=False, allow_null=True)
 
     class Meta:
         model = Event
-        fields = ['id', 'title', 'description', 'image', 'date', 'time', 'venue', 'charge', 'image_url']
+        fields = ['id', 'title', 'description', 'image', 'date', 'time', 'venue', 'charge', 'capacity', 'image_url', 'image_srcset', 'stats']
+        list_serializer_class = TimedListSerializer
 
     def get_image_url(self, obj):
         """Returns the full URL for the image."""
@@ -24,6 +39,17 @@ class EventSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.image.url)
             return obj.image.url  # Directly return the image URL if no request context
         return None
+
+    def get_image_srcset(self, obj):
+        """Returns {rendition: {format: URL}} for the resized copies of the image."""
+        request = self.context.get('request')
+        srcset = {}
+        for name, paths in obj.image_renditions.items():
+            srcset[name] = {}
+            for format, path in paths.items():
+                url = default_storage.url(path)
+                srcset[name][format] = request.build_absolute_uri(url) if request else url
+        return srcset
     
 class EventImageUploadSerializer(serializers.Serializer):
     image = serializers.ImageField(required=True)
@@ -32,8 +58,22 @@ class ParticipantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Participant
         fields = ['id', 'name', 'email']  # Explicit fields
+        # Participants are upserted by email, so an address that already exists is not an error
+        extra_kwargs = {'email': {'validators': []}}
 
-class RegistrationSerializer(serializers.ModelSerializer):
+class EventParticipantSerializer(SparseSerializerMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    """A participant of one event, read from their registration."""
+    id = serializers.IntegerField(source='participant.id', read_only=True)
+    name = serializers.CharField(source='participant.name', read_only=True)
+    email = serializers.EmailField(source='participant.email', read_only=True)
+    registration_id = serializers.IntegerField(source='id', read_only=True)
+
+    class Meta:
+        model = Registration
+        fields = ['id', 'name', 'email', 'registration_id', 'status', 'timestamp']
+        list_serializer_class = TimedListSerializer
+
+class RegistrationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     event_id = serializers.IntegerField(source='event.id', write_only=True)  # Accept event ID directly
     participant = ParticipantSerializer()  # Allows nested input for participant
 
@@ -71,17 +111,18 @@ class RegistrationSerializer(serializers.ModelSerializer):
 
         return instance
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     event = serializers.PrimaryKeyRelatedField(queryset=Event.objects.all())
     participant = serializers.PrimaryKeyRelatedField(queryset=Participant.objects.all())
     
     class Meta:
         model = Booking
-        fields = ['id', 'event', 'participant', 'timestamp', 'booked']
+        fields = ['id', 'event', 'participant', 'timestamp', 'booked', 'status']
+        read_only_fields = ['status']
     
     def create(self, validated_data):
-        """Custom create method, add any additional logic here if needed"""
-        booking = Booking.objects.create(**validated_data)
+        """Takes a seat if one is free, otherwise joins the event's waitlist."""
+        booking = book(validated_data['event'], validated_data['participant'], validated_data.get('booked', False))
         return booking
 
     def update(self, instance, validated_data):
@@ -94,19 +135,6 @@ class RSVPSerializer(serializers.Serializer):
     event_id = serializers.IntegerField()
     participant = ParticipantSerializer()
 
-    def validate_event_id(self, value):
-        """Ensure the event exists and is in the future."""
-        event = get_object_or_404(Event, id=value)
-        
-        # Check if the event date/time has passed
-        event_datetime = timezone.make_aware(
-            timezone.datetime.combine(event.date, event.time)
-        )
-        if event_datetime < timezone.now():
-            raise serializers.ValidationError("Cannot RSVP to an event that has already passed.")
-        
-        return value
-
     def validate_participant(self, value):
         """Ensure participant data is valid."""
         email = value.get('email')
@@ -116,28 +144,21 @@ class RSVPSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         """Handle RSVP creation."""
-        event_id = validated_data['event_id']
         participant_data = validated_data['participant']
-
-        # Retrieve or create the participant
-        participant, created = Participant.objects.get_or_create(
-            email=participant_data['email'],
-            defaults=participant_data
-        )
-
-        # Retrieve the event instance by ID
-        event = get_object_or_404(Event, id=event_id)
-
-        # Retrieve or create the registration and set the status to 'rsvp'
-        registration, created = Registration.objects.get_or_create(
-            event=event,
-            participant=participant,
-            defaults={'status': 'rsvp'}
-        )
-
-        # If the registration already exists but isn't RSVP, update it
-        if not created and registration.status != 'rsvp':
-            registration.status = 'rsvp'
-            registration.save()
-
+        participant = upsert_participant(participant_data['name'], participant_data['email'])
+
+        # Insert the registration as 'rsvp', or switch an existing one to 'rsvp'.
+        # The event's existence and start time are checked by the same statement.
+        try:
+            registration, created = register_participant(
+                validated_data['event_id'], participant, status='rsvp', overwrite_status=True
+            )
+        except Event.DoesNotExist:
+            raise Http404("No Event matches the given query.")
+        except RegistrationClosed:
+            raise serializers.ValidationError({'event_id': ["Cannot RSVP to an event that has already passed."]})
+
+        # A repeated RSVP writes nothing, so there is nothing to announce
+        if created or registration.old_status != registration.status:
+            publish(registration.event_id, 'rsvp', registration_data(registration))
         return registration
\ No newline at end of file
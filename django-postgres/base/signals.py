@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_generation, invalidate_event
+from .metrics import install_query_recorder
+from .models import Booking, Event, EventStats, Participant, Registration
+from .seats import sync_seats
+from .stats import apply_removals, rebuild_stats, record_status_change, removals
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_cache(sender, instance, **kwargs):
+    # Wait for the commit so a concurrent read cannot cache the old row again
+    pk = instance.pk
+    transaction.on_commit(lambda: invalidate_event(pk))
+    # Calendar buckets only hold event columns, so registrations leave them alone
+    transaction.on_commit(lambda: bump_generation('calendar'))
+
+
+@receiver(post_save, sender=Event)
+def sync_event_seats(sender, instance, created, **kwargs):
+    # Only events that ever had a capacity need a counter row
+    if instance.capacity is not None or not created:
+        sync_seats(instance)
+
+
+@receiver(post_save, sender=Event)
+def create_event_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        EventStats.objects.create(event=instance)
+
+
+@receiver(post_init, sender=Registration)
+@receiver(post_init, sender=Booking)
+def remember_stats_key(sender, instance, **kwargs):
+    # What the row counted towards when loaded, to move it on save. Read from
+    # __dict__: a field left out by only()/defer() must not cost a query here
+    values = instance.__dict__
+    instance._stats_key = (values['event_id'], values['status']) if 'event_id' in values and 'status' in values else None
+
+
+@receiver(post_save, sender=Registration)
+@receiver(post_save, sender=Booking)
+def update_event_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created and instance._stats_key is None:
+        # Loaded without its event or status, so where it counted is unknown.
+        # Neither changed unless it was assigned since; then recount the event
+        if 'event_id' in instance.__dict__ or 'status' in instance.__dict__:
+            rebuild_stats([instance.event_id])
+            instance._stats_key = (instance.event_id, instance.status)
+        return
+    new_key = (instance.event_id, instance.status)
+    old_key = None if created else instance._stats_key
+    if old_key is not None and old_key[0] != new_key[0]:
+        record_status_change(sender, old_key[0], old_status=old_key[1])
+        old_key = None
+    record_status_change(sender, new_key[0], old_key and old_key[1], new_key[1])
+    instance._stats_key = new_key
+
+
+@receiver(pre_delete, sender=Participant)
+def remember_participant_rows(sender, instance, **kwargs):
+    # Their registrations and bookings are deleted in bulk with them, without signals
+    instance._stats_removals = [removals(model.objects.filter(participant=instance)) for model in (Registration, Booking)]
+
+
+@receiver(post_delete, sender=Participant)
+def remove_participant_rows(sender, instance, **kwargs):
+    for changes in getattr(instance, '_stats_removals', ()):
+        apply_removals(changes)
@@ -0,0 +1,83 @@
+"""
+Sparse fieldsets: `?fields=id,title,date` on the event and participant read endpoints.
+
+Only the named keys are serialized, and only the columns they read are
+fetched. Which columns a key reads is declared once, on the read serializers
+(`ReadSerializer.fields`): list views pass the selection to `.values()`, and
+views that still load models (detail, search) to `.only()`.
+
+Keys always come back in the serializer's order, whatever order they were
+asked for in. Cached pages and ETags are keyed by the full URL, so each
+selection is cached separately.
+"""
+from rest_framework.exceptions import ValidationError
+
+FIELDS_QUERY_PARAM = 'fields'
+
+
+def requested_fields(request, available):
+    """The `?fields=` selection as a tuple in `available` order, or None for every field."""
+    value = request.query_params.get(FIELDS_QUERY_PARAM, '')
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    if not names:
+        return None
+    unknown = names.difference(available)
+    if unknown:
+        raise ValidationError({FIELDS_QUERY_PARAM: [
+            f"Unknown field(s): {', '.join(sorted(unknown))}. Available: {', '.join(available)}."
+        ]})
+    return tuple(name for name in available if name in names)
+
+
+def only(queryset, columns):
+    """`queryset.only(*columns)`, keeping `select_related()` to the relations `columns` reach."""
+    relations = {column.split('__')[0] for column in columns if '__' in column}
+    # A relation that is deferred cannot also be select_related()
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*columns)
+
+
+class SparseSerializerMixin:
+    """For model serializers: takes a `fields=` selection and drops every other field."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=` for generic views whose serializer uses `SparseSerializerMixin`.
+
+    `read_serializer_class` says which columns each field reads.
+    """
+    read_serializer_class = None
+
+    def get_fields(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # Schema generation describes every field
+            return None
+        if not hasattr(self, '_fields'):
+            self._fields = requested_fields(self.request, tuple(self.read_serializer_class.fields))
+        return self._fields
+
+    def filter_queryset(self, queryset):
+        # After filtering, so filtersets still see model querysets
+        queryset = super().filter_queryset(queryset)
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset
+        return self.project(queryset, self.get_fields())
+
+    def project(self, queryset, fields):
+        """Loads only the columns `fields` read."""
+        if fields is None:
+            return queryset
+        return only(queryset, self.read_serializer_class.get_columns(fields))
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_fields())
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,119 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .cache import bump_generation
+from .models import Booking, Event, EventStats, Registration
+
+# Status -> EventStats column, for each model the table summarises
+REGISTRATION_COLUMNS = {
+    'confirmed': 'confirmed',
+    'pending': 'pending',
+    'cancelled': 'cancelled',
+    'rsvp': 'rsvp',
+}
+BOOKING_COLUMNS = {
+    Booking.ALLOCATED: 'allocated',
+    Booking.WAITLISTED: 'waitlisted',
+    Booking.CANCELLED: 'bookings_cancelled',
+}
+COLUMNS = {Registration: REGISTRATION_COLUMNS, Booking: BOOKING_COLUMNS}
+
+
+def apply_changes(event_id, changes):
+    """
+    Adds `{column: delta}` to the stats row of one event.
+
+    One UPDATE with `column = column + delta`, so concurrent writers never
+    lose each other's increments. A missing row (e.g. an event created before
+    the table existed) is rebuilt from the source rows instead.
+    """
+    changes = {column: delta for column, delta in changes.items() if delta}
+    if not changes:
+        return
+    values = {column: Greatest(F(column) + delta, 0) for column, delta in changes.items()}
+    if not EventStats.objects.filter(event_id=event_id).update(updated_at=timezone.now(), **values):
+        rebuild_stats([event_id])
+        return
+    # queryset.update() sends no post_save. Only the event's detail is dropped:
+    # cached list pages read their counts afresh (base.cache.refresh_stats)
+    transaction.on_commit(lambda: bump_generation(event_id))
+
+
+def record_status_change(model, event_id, old_status=None, new_status=None):
+    """Moves one row of `model` from `old_status` to `new_status` (None for insert/delete)."""
+    if old_status == new_status:
+        return
+    columns = COLUMNS[model]
+    changes = {}
+    if old_status in columns:
+        changes[columns[old_status]] = -1
+    if new_status in columns:
+        changes[columns[new_status]] = changes.get(columns[new_status], 0) + 1
+    apply_changes(event_id, changes)
+
+
+def removals(queryset):
+    """`{event_id: {column: -count}}` that takes the rows of `queryset` out of the stats."""
+    columns = COLUMNS[queryset.model]
+    changes = {}
+    for event_id, status, total in queryset.order_by().values_list('event_id', 'status').annotate(total=Count('pk')):
+        if status in columns:
+            changes.setdefault(event_id, {})[columns[status]] = -total
+    return changes
+
+
+def apply_removals(changes):
+    for event_id, event_changes in changes.items():
+        apply_changes(event_id, event_changes)
+
+
+def count_stats(event_ids=None):
+    """Recounts registrations and bookings per event; returns `{event_id: {column: count}}`."""
+    counts = {}
+    for model, columns in COLUMNS.items():
+        rows = model.objects.order_by()
+        if event_ids is not None:
+            rows = rows.filter(event_id__in=event_ids)
+        for event_id, status, total in rows.values_list('event_id', 'status').annotate(total=Count('pk')):
+            if status in columns:
+                counts.setdefault(event_id, {})[columns[status]] = total
+    return counts
+
+
+def rebuild_stats(event_ids=None, dry_run=False):
+    """
+    Recomputes the stats rows of `event_ids` (or of every event) from scratch.
+
+    Returns the ids of events whose stored counts were wrong or missing;
+    with `dry_run` they are only reported, not fixed.
+    """
+    events = Event.objects.order_by('id')
+    if event_ids is not None:
+        events = events.filter(id__in=event_ids)
+    event_ids = list(events.values_list('id', flat=True))
+    if not event_ids:
+        return []
+
+    columns = [*REGISTRATION_COLUMNS.values(), *BOOKING_COLUMNS.values()]
+    counts = count_stats(event_ids)
+    stored = {row['event_id']: row for row in EventStats.objects.filter(event_id__in=event_ids).values('event_id', *columns)}
+    now = timezone.now()
+
+    drifted = []
+    rows = []
+    for event_id in event_ids:
+        expected = {column: counts.get(event_id, {}).get(column, 0) for column in columns}
+        current = stored.get(event_id)
+        if current is not None and all(current[column] == expected[column] for column in columns):
+            continue
+        drifted.append(event_id)
+        rows.append(EventStats(event_id=event_id, updated_at=now, **expected))
+
+    if rows and not dry_run:
+        EventStats.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['event'], update_fields=[*columns, 'updated_at']
+        )
+        transaction.on_commit(lambda: [bump_generation(event_id) for event_id in drifted])
+    return drifted
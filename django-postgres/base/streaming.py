@@ -0,0 +1,70 @@
+from django.http import StreamingHttpResponse
+
+from .renderers import dumps
+
+
+class StreamingListMixin:
+    """
+    Lets a list view stream its whole queryset as one JSON array (`?stream=true`).
+
+    Rows are read with `.iterator()` in chunks and written out as they are
+    serialized, so full exports run in constant memory instead of building
+    the complete response body first.
+    """
+    stream_query_param = 'stream'
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        if self.should_stream(request):
+            return self.stream_list(request)
+        return super().list(request, *args, **kwargs)
+
+    def should_stream(self, request):
+        value = request.query_params.get(self.stream_query_param, '')
+        return value.lower() in ('1', 'true', 'yes')
+
+    def stream_list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        return StreamingHttpResponse(
+            stream_json_array(queryset, serializer, self.stream_chunk_size),
+            content_type='application/json',
+        )
+
+
+def stream_json_array(queryset, serializer, chunk_size=500):
+    """Yields a JSON array of `queryset` rows, one chunk of rows at a time."""
+    separator = b'['
+    buffer = []
+
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        buffer.append(separator)
+        buffer.append(dumps(serializer.to_representation(instance)))
+        separator = b','
+        if len(buffer) >= chunk_size * 2:
+            yield b''.join(buffer)
+            buffer = []
+
+    if separator == b'[':
+        buffer.append(separator)
+    buffer.append(b']')
+    yield b''.join(buffer)
+
+
+async def astream_json_array(queryset, serializer, chunk_size=500):
+    """Async version of `stream_json_array()`, reading rows with `.aiterator()`."""
+    separator = b'['
+    buffer = []
+
+    async for instance in queryset.aiterator(chunk_size=chunk_size):
+        buffer.append(separator)
+        buffer.append(dumps(serializer.to_representation(instance)))
+        separator = b','
+        if len(buffer) >= chunk_size * 2:
+            yield b''.join(buffer)
+            buffer = []
+
+    if separator == b'[':
+        buffer.append(separator)
+    buffer.append(b']')
+    yield b''.join(buffer)
@@ -1,3 +1,824 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import hashlib
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from authentication.models import User
+from authentication.tokens import RefreshToken
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .async_views import EventLiveUpdates
+from .cache import get_event_cache
+from .calendar import bucket_start, bucket_starts, count_buckets
+from .imports import import_registrations, read_rows
+from .live import MemoryBroker
+from .models import Booking, Event, EventActivity, EventSeats, EventStats, Participant, Registration
+from .pagination import EventKeysetPagination
+from .read_serializers import EventParticipantReadSerializer, EventReadSerializer
+from .registrations import RegistrationClosed, register_participant, upsert_participant
+from .renderers import FastJSONRenderer
+from .replicas import (
+    PIN_COOKIE, REPLICA_ALIAS, PrimaryReplicaRouter, ReplicaPinningMiddleware, ReplicaReadMixin, use_replica_for_reads,
+)
+from .seats import book, cancel
+from .serializers import BookingSerializer, EventParticipantSerializer, EventSerializer
+from .sparse import only
+from .stats import rebuild_stats
+from .uploads import EventImageUploadHandler
+
+
+class ReadSerializerParityTests(TestCase):
+    """The fast read serializers must render exactly what the model serializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.plain = Event.objects.create(
+            title='Plain', description='No image', date=datetime.date(2031, 1, 1), time=datetime.time(9, 30),
+        )
+        cls.illustrated = Event.objects.create(
+            title='Illustrated ü', description='With image', date=datetime.date(2031, 2, 1),
+            time=datetime.time(18, 0, 5, 123456), venue='Main hall', charge='pay', capacity=40,
+            image='event_images/poster one?#ü.jpg',
+            image_renditions={'thumb': {'webp': 'event_images/renditions/poster one_thumb.webp',
+                                        'jpeg': 'event_images/renditions/poster one_thumb.jpg'}},
+        )
+        cls.orphan = Event.objects.create(title='No stats', description='', date=datetime.date(2030, 5, 5))
+        EventStats.objects.filter(event=cls.orphan).delete()
+
+        people = [Participant.objects.create(name=f'Person {n}', email=f'person{n}@example.com') for n in range(3)]
+        for person, status in zip(people, ('confirmed', 'pending', 'rsvp')):
+            Registration.objects.create(
+                event=cls.illustrated, participant=person, status=status,
+                timestamp=timezone.now().replace(microsecond=0 if status == 'rsvp' else 654321),
+            )
+
+    def setUp(self):
+        self.context = {'request': RequestFactory().get('/events/')}
+
+    def render(self, data):
+        return FastJSONRenderer().render(data)
+
+    def test_events(self):
+        queryset = Event.objects.select_related('stats').order_by('id')
+        expected = EventSerializer(queryset, many=True, context=self.context).data
+        fast = EventReadSerializer(EventReadSerializer.prepare(queryset), many=True, context=self.context).data
+        self.assertEqual(self.render(fast), self.render(expected))
+
+    def test_events_without_request(self):
+        queryset = Event.objects.select_related('stats').order_by('id')
+        expected = EventSerializer(queryset, many=True).data
+        fast = EventReadSerializer(EventReadSerializer.prepare(queryset), many=True).data
+        self.assertEqual(self.render(fast), self.render(expected))
+
+    def test_events_with_fields(self):
+        fields = ('title', 'image_url', 'stats')
+        queryset = Event.objects.select_related('stats').order_by('id')
+        expected = EventSerializer(
+            only(queryset, EventReadSerializer.get_columns(fields)), many=True, context=self.context, fields=fields
+        ).data
+        fast = EventReadSerializer(EventReadSerializer.prepare(queryset, fields), many=True, context=self.context, fields=fields).data
+        self.assertEqual(self.render(fast), self.render(expected))
+        self.assertEqual(list(fast[0]), list(fields))
+
+    def test_participants(self):
+        queryset = Registration.objects.filter(event=self.illustrated).select_related('participant').order_by('id')
+        expected = EventParticipantSerializer(queryset, many=True, context=self.context).data
+        fast = EventParticipantReadSerializer(
+            EventParticipantReadSerializer.prepare(queryset), many=True, context=self.context
+        ).data
+        self.assertEqual(self.render(fast), self.render(expected))
+
+
+class RegistrationUpsertTests(TestCase):
+    """Repeated registrations and RSVPs change nothing the second time."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(title='Upcoming', description='', date=datetime.date(2031, 1, 1), time=datetime.time(9))
+        cls.past = Event.objects.create(title='Past', description='', date=datetime.date(2001, 1, 1), time=datetime.time(9))
+
+    def stats(self):
+        return EventStats.objects.values('pending', 'rsvp', 'confirmed').get(event=self.event)
+
+    def test_upsert_participant_keeps_the_stored_name(self):
+        first = upsert_participant('Ann', 'ann@example.com')
+        again = upsert_participant('Someone else', 'ann@example.com')
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(again.name, 'Ann')
+        self.assertEqual(Participant.objects.filter(email='ann@example.com').count(), 1)
+
+    def test_registering_twice(self):
+        participant = upsert_participant('Ann', 'ann@example.com')
+        registration, created = register_participant(self.event.pk, participant)
+        self.assertTrue(created)
+        self.assertIsNone(registration.old_status)
+
+        again, created = register_participant(self.event.pk, participant, status='confirmed')
+        self.assertFalse(created)
+        self.assertEqual(again.pk, registration.pk)
+        self.assertEqual(again.status, 'pending')
+        self.assertEqual(self.stats(), {'pending': 1, 'rsvp': 0, 'confirmed': 0})
+
+    def test_rsvp_twice(self):
+        participant = upsert_participant('Ann', 'ann@example.com')
+        register_participant(self.event.pk, participant)
+
+        registration, created = register_participant(self.event.pk, participant, status='rsvp', overwrite_status=True)
+        self.assertFalse(created)
+        self.assertEqual((registration.old_status, registration.status), ('pending', 'rsvp'))
+        registration, created = register_participant(self.event.pk, participant, status='rsvp', overwrite_status=True)
+        self.assertFalse(created)
+        self.assertEqual((registration.old_status, registration.status), ('rsvp', 'rsvp'))
+
+        self.assertEqual(Registration.objects.filter(event=self.event).count(), 1)
+        self.assertEqual(self.stats(), {'pending': 0, 'rsvp': 1, 'confirmed': 0})
+
+    def test_repeated_rsvp_is_published_once(self):
+        body = {'event_id': self.event.pk, 'participant': {'name': 'Ann', 'email': 'ann@example.com'}}
+        for _ in range(2):
+            response = self.client.post('/events/rsvp/', body, content_type='application/json')
+            self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(EventActivity.objects.filter(event=self.event, kind='rsvp').count(), 1)
+
+    def test_closed_and_unknown_events(self):
+        participant = upsert_participant('Ann', 'ann@example.com')
+        with self.assertRaises(RegistrationClosed):
+            register_participant(self.past.pk, participant)
+        with self.assertRaises(Event.DoesNotExist):
+            register_participant(0, participant)
+        self.assertFalse(Registration.objects.exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs the data-modifying CTE and row locks of Postgres')
+class RegistrationRaceTests(TransactionTestCase):
+    """An RSVP that waits on a concurrent first registration still leaves the stats right."""
+
+    def test_overwrite_after_concurrent_insert(self):
+        event = Event.objects.create(title='Upcoming', description='', date=datetime.date(2031, 1, 1), time=datetime.time(9))
+        participant = upsert_participant('Ann', 'ann@example.com')
+        inserted, finish = threading.Event(), threading.Event()
+
+        def first_registration():
+            try:
+                with transaction.atomic():
+                    register_participant(event.pk, participant)
+                    inserted.set()
+                    finish.wait(timeout=10)
+            finally:
+                connection.close()
+
+        def rsvp():
+            try:
+                return register_participant(event.pk, participant, status='rsvp', overwrite_status=True)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            pool.submit(first_registration)
+            inserted.wait(timeout=10)
+            pending = pool.submit(rsvp)
+            # Let the RSVP block on the uncommitted row before it is committed
+            with connection.cursor() as cursor:
+                for _ in range(100):
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND datname = current_database()"
+                    )
+                    if cursor.fetchone()[0]:
+                        break
+                    time.sleep(0.05)
+            finish.set()
+            registration, created = pending.result()
+
+        self.assertFalse(created)
+        self.assertEqual(registration.status, 'rsvp')
+        self.assertEqual(EventStats.objects.values('pending', 'rsvp').get(event=event), {'pending': 0, 'rsvp': 1})
+        self.assertEqual(rebuild_stats([event.pk], dry_run=True), [])
+
+
+class RegistrationImportTests(TestCase):
+    """Imports report on every row, keep stored names and statuses unless a row sets one, and fix up the stats."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(title='Upcoming', description='', date=datetime.date(2031, 1, 1), time=datetime.time(9))
+        cls.past = Event.objects.create(title='Past', description='', date=datetime.date(2001, 1, 1), time=datetime.time(9))
+        cls.ann = Participant.objects.create(name='Ann', email='ann@example.com')
+        Registration.objects.create(event=cls.event, participant=cls.ann, status='confirmed')
+
+    def run_import(self, rows, **kwargs):
+        return list(import_registrations(enumerate(rows, start=1), **kwargs))
+
+    def row(self, email, **fields):
+        return {'event_id': self.event.pk, 'name': email.split('@')[0].title(), 'email': email, **fields}
+
+    def statuses(self):
+        return dict(Registration.objects.filter(event=self.event).values_list('participant__email', 'status'))
+
+    def test_invalid_rows(self):
+        lines = [
+            '{"event_id": 1',
+            '[1, 2]',
+            *[json.dumps(row) for row in (
+                self.row('bob@example.com'),
+                self.row('not-an-email'),
+                self.row('cat@example.com', status='maybe'),
+                {**self.row('dan@example.com'), 'event_id': 0},
+                {**self.row('eve@example.com'), 'event_id': self.past.pk},
+                self.row('bob@example.com', status='rsvp'),
+            )],
+        ]
+        results = list(import_registrations(read_rows(lines)))
+        self.assertEqual([result['row'] for result in results], list(range(1, 9)))
+        self.assertEqual([result['result'] for result in results], ['failed'] * 2 + ['imported'] + ['failed'] * 5)
+        errors = {result['row']: result['errors'] for result in results if result['result'] == 'failed'}
+        self.assertEqual(errors[1], {'row': ['Expected a JSON object.']})
+        self.assertEqual(errors[2], {'row': ['Expected a JSON object.']})
+        self.assertEqual(set(errors[4]), {'email'})
+        self.assertEqual(set(errors[5]), {'status'})
+        self.assertEqual(errors[6], {'event_id': ['Event not found.']})
+        self.assertEqual(errors[7], {'event_id': ['Event date or time has passed. Registration is closed.']})
+        self.assertEqual(errors[8], {'row': ['Duplicate of row 3.']})
+        self.assertEqual(self.statuses(), {'ann@example.com': 'confirmed', 'bob@example.com': 'pending'})
+
+    def test_rows_with_and_without_a_status(self):
+        results = self.run_import([
+            self.row('ann@example.com', name='Someone else'),
+            self.row('bob@example.com'),
+            self.row('cat@example.com', status='confirmed'),
+        ], default_status='rsvp')
+        self.assertEqual([(result['email'], result['status']) for result in results], [
+            ('ann@example.com', 'confirmed'), ('bob@example.com', 'rsvp'), ('cat@example.com', 'confirmed'),
+        ])
+        self.assertEqual(Participant.objects.get(email='ann@example.com').name, 'Ann')
+        self.assertEqual(
+            self.statuses(), {'ann@example.com': 'confirmed', 'bob@example.com': 'rsvp', 'cat@example.com': 'confirmed'},
+        )
+
+        # A status in the row replaces the stored one
+        results = self.run_import([self.row('ann@example.com', status='pending'), self.row('bob@example.com', status='')])
+        self.assertEqual([result['status'] for result in results], ['pending', 'rsvp'])
+        self.assertEqual(self.statuses()['ann@example.com'], 'pending')
+
+    def test_stats_are_rebuilt(self):
+        self.run_import([self.row(f'person{n}@example.com', status=status) for n, status in enumerate(['rsvp', 'rsvp', 'pending'])])
+        self.run_import([self.row('ann@example.com', status='rsvp'), self.row('person2@example.com', status='confirmed')], batch_size=1)
+        self.assertEqual(
+            EventStats.objects.values('pending', 'rsvp', 'confirmed').get(event=self.event), {'pending': 0, 'rsvp': 3, 'confirmed': 1},
+        )
+        self.assertEqual(rebuild_stats([self.event.pk], dry_run=True), [])
+
+    def test_endpoint_needs_a_signed_in_user(self):
+        body = f'event_id,name,email,status\n{self.event.pk},Bob,bob@example.com,rsvp\n'
+        response = self.client.post('/register/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Participant.objects.filter(email='bob@example.com').exists())
+
+        user = User.objects.create_user('ann', 'ann@example.com', 'secret-password')
+        token = RefreshToken.for_user(user).access_token
+        response = self.client.post('/register/bulk/', body, content_type='text/csv', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['imported'], response.json()['failed']), (1, 0))
+        self.assertEqual(self.statuses()['bob@example.com'], 'rsvp')
+
+
+class SeatAllocationTests(TestCase):
+    """Bookings take seats up to the capacity; freed seats go to the waitlist in order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.people = [Participant.objects.create(name=f'Person {n}', email=f'person{n}@example.com') for n in range(4)]
+
+    def create_event(self, capacity):
+        return Event.objects.create(
+            title='Limited', description='', date=datetime.date(2031, 1, 1), time=datetime.time(9), capacity=capacity,
+        )
+
+    def statuses(self, event):
+        return list(Booking.objects.filter(event=event).order_by('id').values_list('status', flat=True))
+
+    def remaining(self, event):
+        return EventSeats.objects.get(event=event).remaining
+
+    def test_waitlist_once_full(self):
+        event = self.create_event(2)
+        for person in self.people[:3]:
+            book(event, person)
+        self.assertEqual(self.statuses(event), [Booking.ALLOCATED, Booking.ALLOCATED, Booking.WAITLISTED])
+        self.assertEqual(self.remaining(event), 0)
+
+    def test_cancelling_promotes_the_head_of_the_waitlist(self):
+        event = self.create_event(1)
+        first, second, third = (book(event, person) for person in self.people[:3])
+        cancel(first.pk)
+        self.assertEqual(self.statuses(event), [Booking.CANCELLED, Booking.ALLOCATED, Booking.WAITLISTED])
+        self.assertEqual(self.remaining(event), 0)
+        self.assertEqual(list(EventActivity.objects.filter(kind='booking_promoted').values_list('data__booking_id', flat=True)), [second.pk])
+
+        # Cancelling twice, or cancelling a waitlisted booking, frees nothing
+        cancel(first.pk)
+        cancel(third.pk)
+        self.assertEqual(self.statuses(event), [Booking.CANCELLED, Booking.ALLOCATED, Booking.CANCELLED])
+        self.assertEqual(self.remaining(event), 0)
+
+    def test_cancelling_with_nobody_waiting_returns_the_seat(self):
+        event = self.create_event(1)
+        cancel(book(event, self.people[0]).pk)
+        self.assertEqual(self.remaining(event), 1)
+
+    def test_raising_the_capacity_promotes_and_publishes(self):
+        event = self.create_event(1)
+        bookings = [book(event, person) for person in self.people[:4]]
+        event.capacity = 3
+        event.save()
+        self.assertEqual(self.statuses(event), [Booking.ALLOCATED] * 3 + [Booking.WAITLISTED])
+        self.assertEqual(self.remaining(event), 0)
+        promoted = EventActivity.objects.filter(kind='booking_promoted').order_by('id').values_list('data__booking_id', flat=True)
+        self.assertEqual(list(promoted), [bookings[1].pk, bookings[2].pk])
+        self.assertEqual(EventStats.objects.values('allocated', 'waitlisted').get(event=event), {'allocated': 3, 'waitlisted': 1})
+
+    def test_missing_counter_is_created(self):
+        event = self.create_event(None)
+        Event.objects.filter(pk=event.pk).update(capacity=2)
+        event.refresh_from_db()
+        self.assertFalse(EventSeats.objects.filter(event=event).exists())
+        self.assertEqual(book(event, self.people[0]).status, Booking.ALLOCATED)
+        self.assertEqual(self.remaining(event), 1)
+
+    def test_no_capacity_never_waitlists(self):
+        event = self.create_event(None)
+        for person in self.people:
+            book(event, person)
+        self.assertEqual(self.statuses(event), [Booking.ALLOCATED] * 4)
+
+    def test_booked_flag_is_kept(self):
+        event = self.create_event(1)
+        serializer = BookingSerializer(data={'event': event.pk, 'participant': self.people[0].pk, 'booked': True})
+        serializer.is_valid(raise_exception=True)
+        self.assertTrue(Booking.objects.get(pk=serializer.save().pk).booked)
+
+
+@skipUnlessDBFeature('has_select_for_update')  # Needs row locks, e.g. Postgres; sqlite locks the whole file
+class SeatRaceTests(TransactionTestCase):
+    """A booking racing a cancellation never leaves a seat free while someone is waitlisted."""
+
+    def test_concurrent_book_and_cancel(self):
+        holder, newcomer = (Participant.objects.create(name=name, email=f'{name}@example.com') for name in ('ann', 'bob'))
+        for _ in range(10):
+            event = Event.objects.create(
+                title='Limited', description='', date=datetime.date(2031, 1, 1), time=datetime.time(9), capacity=1,
+            )
+            held = book(event, holder)
+            barrier = threading.Barrier(2)
+
+            def run(func, *args):
+                barrier.wait()
+                try:
+                    return func(*args)
+                finally:
+                    connection.close()
+
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                futures = [pool.submit(run, cancel, held.pk), pool.submit(run, book, event, newcomer)]
+                for future in futures:
+                    future.result()
+
+            remaining = EventSeats.objects.get(event=event).remaining
+            allocated = Booking.objects.filter(event=event, status=Booking.ALLOCATED).count()
+            self.assertEqual(remaining + allocated, 1)
+            self.assertFalse(remaining and Booking.objects.filter(event=event, status=Booking.WAITLISTED).exists())
+
+
+class StatsCounterTests(TestCase):
+    """The stats counters follow every kind of write without drifting from a recount."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(title='One', description='', date=datetime.date(2031, 1, 1), time=datetime.time(9))
+        cls.other = Event.objects.create(title='Two', description='', date=datetime.date(2031, 1, 2), time=datetime.time(9))
+        cls.people = [Participant.objects.create(name=f'Person {n}', email=f'person{n}@example.com') for n in range(3)]
+
+    def counts(self, event):
+        return EventStats.objects.values('confirmed', 'pending', 'rsvp').get(event=event)
+
+    def assertNoDrift(self):
+        self.assertEqual(rebuild_stats(dry_run=True), [])
+
+    def test_create_update_delete(self):
+        registrations = [Registration.objects.create(event=self.event, participant=person) for person in self.people]
+        self.assertEqual(self.counts(self.event), {'confirmed': 0, 'pending': 3, 'rsvp': 0})
+
+        registrations[0].status = 'confirmed'
+        registrations[0].save()
+        registrations[1].event = self.other
+        registrations[1].status = 'rsvp'
+        registrations[1].save()
+        self.assertEqual(self.counts(self.event), {'confirmed': 1, 'pending': 1, 'rsvp': 0})
+        self.assertEqual(self.counts(self.other), {'confirmed': 0, 'pending': 0, 'rsvp': 1})
+
+        registrations[2].delete()
+        self.assertEqual(self.counts(self.event), {'confirmed': 1, 'pending': 0, 'rsvp': 0})
+        self.assertNoDrift()
+
+    def test_saving_a_partially_loaded_row(self):
+        registration = Registration.objects.create(event=self.event, participant=self.people[0])
+        # Neither status nor event loaded: nothing to move
+        Registration.objects.only('id').get(pk=registration.pk).save()
+        # Status assigned without being loaded: the event is recounted
+        partial = Registration.objects.only('id').get(pk=registration.pk)
+        partial.status = 'confirmed'
+        partial.save()
+        self.assertEqual(self.counts(self.event), {'confirmed': 1, 'pending': 0, 'rsvp': 0})
+        self.assertNoDrift()
+
+    def test_bulk_deletes(self):
+        for person in self.people:
+            Registration.objects.create(event=self.event, participant=person, status='rsvp')
+            Registration.objects.create(event=self.other, participant=person)
+        Registration.objects.filter(event=self.event, participant__in=self.people[:2]).delete()
+        self.assertEqual(self.counts(self.event), {'confirmed': 0, 'pending': 0, 'rsvp': 1})
+
+        # Cascades from a participant delete send no per-row signals
+        self.people[2].delete()
+        self.assertEqual(self.counts(self.event), {'confirmed': 0, 'pending': 0, 'rsvp': 0})
+        self.assertEqual(self.counts(self.other), {'confirmed': 0, 'pending': 2, 'rsvp': 0})
+        self.assertNoDrift()
+
+    def test_rebuild_fixes_drift(self):
+        Registration.objects.create(event=self.event, participant=self.people[0])
+        EventStats.objects.filter(event=self.event).update(pending=7)
+        EventStats.objects.filter(event=self.other).delete()
+        self.assertEqual(sorted(rebuild_stats()), sorted([self.event.pk, self.other.pk]))
+        self.assertEqual(self.counts(self.event), {'confirmed': 0, 'pending': 1, 'rsvp': 0})
+        self.assertNoDrift()
+
+
+class LiveUpdateTests(TransactionTestCase):
+    """One feed per event reads new activity for all its streams; reconnects replay what they missed."""
+
+    def setUp(self):
+        self.event = Event.objects.create(title='Live', description='', date=datetime.date(2031, 1, 1), time=datetime.time(9))
+        self.earlier = EventActivity.objects.create(event=self.event, kind='registration', data={'n': 1})
+        self.broker = MemoryBroker()
+
+    async def publish(self, n):
+        activity = await sync_to_async(EventActivity.objects.create)(event=self.event, kind='rsvp', data={'n': n})
+        self.broker.notify(self.event.pk)
+        return activity
+
+    async def test_subscriptions_share_a_feed(self):
+        first = await self.broker.subscribe(self.event.pk)
+        second = await self.broker.subscribe(self.event.pk)
+        self.assertIs(first.feed, second.feed)
+        self.assertEqual(first.start_id, self.earlier.pk)
+
+        activity = await self.publish(2)
+        for subscription in (first, second):
+            batch = await subscription.get(timeout=2)
+            self.assertEqual([row.pk for row in batch], [activity.pk])
+
+        first.close()
+        second.close()
+        self.assertEqual(self.broker.feeds, {})
+
+    async def test_stream_resumes_after_last_event_id(self):
+        missed = await self.publish(2)
+        request = AsyncRequestFactory().get('/', headers={'Last-Event-ID': str(self.earlier.pk)})
+        with mock.patch('base.async_views.get_broker', return_value=self.broker):
+            response = await EventLiveUpdates.as_view()(request, pk=self.event.pk)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = aiter(response)
+            self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+            self.assertIn(f'id: {missed.pk}\n'.encode(), await anext(chunks))
+            live = await self.publish(3)
+            self.assertIn(f'id: {live.pk}\n'.encode(), await anext(chunks))
+
+            # The client goes away: Django cancels the task reading the stream
+            reading = asyncio.ensure_future(anext(chunks))
+            await asyncio.sleep(0)
+            reading.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await reading
+        self.assertEqual(self.broker.feeds, {})
+
+    async def test_refused_outside_asgi(self):
+        response = await EventLiveUpdates.as_view()(RequestFactory().get('/'), pk=self.event.pk)
+        self.assertEqual(response.status_code, 501)
+
+
+class CalendarTests(TestCase):
+    """Buckets cover whole days, weeks and months, and ranges are checked before any are built."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for day in (datetime.date(2031, 1, 31), datetime.date(2031, 2, 1), datetime.date(2031, 2, 2), datetime.date(2031, 3, 3)):
+            Event.objects.create(title=f'On {day}', description='', date=day, time=datetime.time(23, 59))
+
+    def setUp(self):
+        # Generations only move on commit, which a TestCase never reaches
+        get_event_cache().clear()
+
+    def get(self, query):
+        return self.client.get(f'/events/calendar/?{query}')
+
+    def test_bucket_starts(self):
+        self.assertEqual(bucket_start(datetime.date(2031, 1, 1), 'week'), datetime.date(2030, 12, 30))
+        self.assertEqual(bucket_start(datetime.date(2031, 1, 31), 'month'), datetime.date(2031, 1, 1))
+        self.assertEqual(
+            bucket_starts(datetime.date(2031, 1, 31), datetime.date(2031, 3, 1), 'month'),
+            [datetime.date(2031, 1, 1), datetime.date(2031, 2, 1), datetime.date(2031, 3, 1)],
+        )
+
+    def test_count_matches_the_buckets(self):
+        start = datetime.date(2027, 12, 25)
+        for length in range(0, 800, 7):
+            end = start + datetime.timedelta(days=length)
+            for bucket in ('day', 'week', 'month'):
+                self.assertEqual(count_buckets(start, end, bucket), len(bucket_starts(start, end, bucket)), (end, bucket))
+
+    def test_events_fall_in_their_bucket(self):
+        data = self.get('from=2031-01-15&to=2031-02-10&bucket=month').json()
+        self.assertEqual((data['from'], data['to']), ('2031-01-01', '2031-02-28'))
+        self.assertEqual([(item['start'], item['count']) for item in data['buckets']], [('2031-01-01', 1), ('2031-02-01', 2)])
+
+        data = self.get('from=2031-01-31&to=2031-02-01&bucket=week').json()
+        self.assertEqual((data['from'], data['to']), ('2031-01-27', '2031-02-02'))
+        self.assertEqual(data['count'], 3)
+
+    def test_invalid_ranges(self):
+        for query in (
+            'from=2031-02-01&to=2031-01-01',
+            'from=2031-01-01&to=2031-01-01&bucket=year',
+            'from=2031-01-01',
+            'from=2031-02-30&to=2031-03-01',
+        ):
+            self.assertEqual(self.get(query).status_code, 400, query)
+
+    def test_ranges_too_wide_or_too_late(self):
+        response = self.get('from=0001-01-01&to=9999-12-01&bucket=day')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('366', response.json()['to'][0])
+        for query in (
+            'from=9999-12-01&to=9999-12-31',
+            'from=9999-12-01&to=9999-12-31&bucket=week',
+            'from=9999-12-01&to=9999-12-02&bucket=month',
+        ):
+            self.assertEqual(self.get(query).status_code, 400, query)
+        self.assertEqual(self.get('from=9999-12-01&to=9999-12-20&bucket=week').status_code, 200)
+
+
+class EventCacheTests(TestCase):
+    """Cached event pages stay correct across event writes and registrations."""
+
+    def setUp(self):
+        get_event_cache().clear()
+        self.event = Event.objects.create(title='Cached', description='', date=datetime.date(2031, 1, 1), time=datetime.time(9))
+
+    def test_pages_are_served_from_the_cache(self):
+        for url in ('/events/', f'/events/{self.event.pk}/'):
+            first = self.client.get(url).json()
+            # Only the validators (and, for lists, the current counts) are read
+            with self.assertNumQueries(2 if url == '/events/' else 1):
+                self.assertEqual(self.client.get(url).json(), first)
+
+    def test_event_writes_replace_cached_pages(self):
+        self.client.get('/events/')
+        self.client.get(f'/events/{self.event.pk}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.title = 'Renamed'
+            self.event.save()
+        self.assertEqual(self.client.get('/events/').json()['results'][0]['title'], 'Renamed')
+        self.assertEqual(self.client.get(f'/events/{self.event.pk}/').json()['title'], 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.delete()
+        self.assertEqual(self.client.get('/events/').json()['results'], [])
+        self.assertEqual(self.client.get(f'/events/{self.event.pk}/').status_code, 404)
+
+    def test_cached_lists_show_current_counts(self):
+        self.client.get('/events/')
+        participant = Participant.objects.create(name='Ann', email='ann@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            Registration.objects.create(event=self.event, participant=participant, status='confirmed')
+        self.assertEqual(self.client.get('/events/').json()['results'][0]['stats']['confirmed'], 1)
+        self.assertEqual(self.client.get(f'/events/{self.event.pk}/').json()['stats']['confirmed'], 1)
+
+
+    def test_unchanged_list_is_not_sent_again(self):
+        etag = self.client.get('/events/')['ETag']
+        # Only the validator query runs
+        with self.assertNumQueries(1):
+            response = self.client.get('/events/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.title = 'Renamed'
+            self.event.save()
+        response = self.client.get('/events/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['title'], 'Renamed')
+        self.assertEqual(self.client.get('/events/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # A new event changes the list too
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Event.objects.create(title='Another', description='', date=datetime.date(2031, 2, 1), time=datetime.time(9))
+        self.assertEqual(self.client.get('/events/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+class KeysetPaginationTests(TestCase):
+    """Cursors walk every row exactly once in both directions, including rows with equal keys."""
+
+    @classmethod
+    def setUpTestData(cls):
+        times = [datetime.time(9), datetime.time(9), datetime.time(9, 0, 0, 1), datetime.time(9, 0, 0, 999999), datetime.time(10)]
+        cls.events = [
+            Event.objects.create(title=f'Event {n}', description='', date=datetime.date(2031, 1, 1 + n % 2), time=time)
+            for n, time in enumerate(times * 2)
+        ]
+
+    def setUp(self):
+        get_event_cache().clear()
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([event['id'] for event in data['results']])
+            url = data[link]
+        return pages
+
+    def test_round_trip(self):
+        expected = list(Event.objects.order_by('starts_at', 'id').values_list('id', flat=True))
+        forward = self.walk('/events/?count=3', 'next')
+        self.assertEqual([pk for page in forward for pk in page], expected)
+        self.assertEqual([len(page) for page in forward], [3, 3, 3, 1])
+
+        last = self.client.get('/events/?count=3').json()
+        for _ in range(len(forward) - 1):
+            last = self.client.get(last['next']).json()
+        backward = self.walk(last['previous'], 'previous')
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_invalid_cursors(self):
+        for cursor in ('nope', 'eyJwIjogWzFdfQ==', 'eyJwIjogWyJ4IiwgMV19'):
+            self.assertEqual(self.client.get(f'/events/?cursor={cursor}').status_code, 404, cursor)
+
+
+    def test_pages_are_read_in_index_order(self):
+        first = self.client.get('/events/?count=3').json()
+        second = self.client.get(first['next']).json()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # The test table is tiny, so a scan plus sort would otherwise be cheapest
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        for url in ('/events/?count=3', first['next'], second['previous']):
+            queryset = EventKeysetPagination().get_page_queryset(Event.objects.all(), Request(RequestFactory().get(url)))
+            plan = queryset.explain()
+            with self.subTest(url=url):
+                self.assertIn('event_starts_at_id_idx', plan)
+                self.assertNotIn('SORT', plan.upper())
+                self.assertNotIn('TEMP B-TREE', plan.upper())
+
+class EventImageUploadTests(SimpleTestCase):
+    """The upload handler reads the format and dimensions however the body is chunked."""
+
+    def image(self, format):
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 200), 'red').save(buffer, format=format)
+        return buffer.getvalue()
+
+    def upload(self, chunks):
+        request = RequestFactory().post('/')
+        handler = EventImageUploadHandler(request)
+        handler.new_file('image', 'poster', 'application/octet-stream', sum(map(len, chunks)))
+        start = 0
+        for chunk in chunks:
+            handler.receive_data_chunk(chunk, start)
+            start += len(chunk)
+        return request, handler.file_complete(start)
+
+    def test_tiny_first_chunks(self):
+        for format, extension in (('PNG', '.png'), ('JPEG', '.jpg'), ('GIF', '.gif'), ('WEBP', '.webp')):
+            data = self.image(format)
+            for chunks in ([data], [data[:3], data[3:10], data[10:]], [data[:1], data[1:17], data[17:]]):
+                with self.subTest(format=format, sizes=[len(chunk) for chunk in chunks]):
+                    request, file = self.upload(chunks)
+                    self.assertIsNotNone(file, getattr(request, 'upload_rejection', None))
+                    self.assertEqual((file.extension, file.width, file.height), (extension, 300, 200))
+                    self.assertEqual(file.sha256, hashlib.sha256(data).hexdigest())
+                    file.close()
+
+    def test_too_short_to_be_an_image(self):
+        request, file = self.upload([b'\x89PNG'])
+        self.assertIsNone(file)
+        self.assertEqual(str(request.upload_rejection), "Could not read the image dimensions.")
+
+
+class ReplicaProbe(ReplicaReadMixin, APIView):
+    authentication_classes = []
+
+    def get(self, request):
+        return Response(PrimaryReplicaRouter().db_for_read(Event))
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    """Opted-in reads go to the replica until the client writes; writes always go to the primary."""
+
+    def setUp(self):
+        replica = {**settings.DATABASES[DEFAULT_DB_ALIAS], 'TEST': {'MIRROR': DEFAULT_DB_ALIAS}}
+        patcher = mock.patch.dict(settings.DATABASES, {REPLICA_ALIAS: replica})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = PrimaryReplicaRouter()
+
+    def request(self, view, cookies=None):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinningMiddleware(view)(request)
+
+    def probe(self, cookies=None):
+        response = self.request(ReplicaProbe.as_view(), cookies)
+        return response.data
+
+    def test_reads_opt_in(self):
+        self.assertEqual(self.router.db_for_read(Event), DEFAULT_DB_ALIAS)  # Outside a request
+        self.assertEqual(self.request(lambda request: HttpResponse(self.router.db_for_read(Event))).content.decode(), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.probe(), REPLICA_ALIAS)
+        self.assertFalse(self.router.allow_migrate(REPLICA_ALIAS, 'base'))
+
+    def test_write_pins_the_client_to_the_primary(self):
+        def write_then_read(request):
+            self.assertEqual(self.router.db_for_write(Event), DEFAULT_DB_ALIAS)
+            use_replica_for_reads()
+            return HttpResponse(self.router.db_for_read(Event))
+
+        response = self.request(write_then_read)
+        self.assertEqual(response.content.decode(), DEFAULT_DB_ALIAS)  # Reads after a write in the same request
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+        self.assertTrue(cookie['httponly'])
+
+        self.assertEqual(self.probe({PIN_COOKIE: cookie.value}), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.probe(), REPLICA_ALIAS)  # Once the cookie expired
+
+    def test_without_a_replica(self):
+        del settings.DATABASES[REPLICA_ALIAS]
+        self.assertEqual(self.probe(), DEFAULT_DB_ALIAS)
+        response = self.request(lambda request: HttpResponse(self.router.db_for_write(Event)))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@skipUnless(REPLICA_ALIAS in settings.DATABASES, 'Needs the replica alias, e.g. DB_REPLICA_HOST set to the primary')
+class ReplicaQueryTests(TransactionTestCase):
+    """The event endpoints really query the replica, except right after a write."""
+    databases = '__all__'
+
+    def setUp(self):
+        get_event_cache().clear()
+        self.event = Event.objects.create(title='Upcoming', description='', date=datetime.date(2031, 1, 1), time=datetime.time(9))
+
+    def request(self, method, path, **kwargs):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            response = getattr(self.client, method)(path, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_routing(self):
+        response, primary, replica = self.request('get', f'/events/{self.event.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        # Not opted in
+        response, primary, replica = self.request('get', f'/events/{self.event.pk}/participants/')
+        self.assertEqual(replica, 0)
+
+        body = {'event_id': self.event.pk, 'participant': {'name': 'Ann', 'email': 'ann@example.com'}}
+        response, primary, replica = self.request('post', '/register/', data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(replica, 0)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        response, primary, replica = self.request('get', '/events/future/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.client.cookies.clear()
+        response, primary, replica = self.request('get', '/events/future/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
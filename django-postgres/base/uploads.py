@@ -0,0 +1,120 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from PIL import ImageFile
+
+# Leading bytes of the formats we accept, with the extension files are stored under
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+]
+
+# How far into the file we look for the dimensions before giving up (JPEG
+# headers can sit behind a large EXIF block)
+HEADER_LIMIT = 256 * 1024
+
+
+def get_max_bytes():
+    return getattr(settings, 'EVENT_IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+
+
+def get_max_dimension():
+    return getattr(settings, 'EVENT_IMAGE_MAX_DIMENSION', 8000)
+
+
+def sniff_extension(header):
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+class UploadRejected(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class EventImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams an event image to a temporary file while checking it.
+
+    The byte limit is enforced as chunks arrive, and the format and pixel
+    dimensions are read from the first chunks, so oversized or non-image
+    uploads are dropped without being buffered. A SHA-256 of the content is
+    computed along the way and attached to the file as `sha256`, with the
+    sniffed `extension`, `width` and `height`.
+
+    The reason a file was dropped is left on the request as `upload_rejection`.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+        self.header = b''
+        self.parser = ImageFile.Parser()
+        self.extension = None
+        self.dimensions = None
+
+    def reject(self, message, status_code=400):
+        self.request.upload_rejection = UploadRejected(message, status_code)
+        raise SkipFile(message)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > get_max_bytes():
+            self.reject(f"Image is larger than {get_max_bytes()} bytes.", status_code=413)
+
+        if self.dimensions is None:
+            self.inspect(raw_data)
+
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def inspect(self, raw_data):
+        if self.extension is None:
+            # Chunks can be shorter than a signature, so buffer them until one can be read
+            self.header += raw_data
+            if len(self.header) < 16:
+                return
+            self.extension = sniff_extension(self.header)
+            if self.extension is None:
+                self.reject("Upload a JPEG, PNG, GIF or WebP image.")
+            # The parser needs every byte from the start, including the buffered ones
+            raw_data, self.header = self.header, b''
+
+        # The parser only needs the header to report the size
+        try:
+            self.parser.feed(raw_data)
+        except Exception:
+            self.reject("The image header is corrupt.")
+        if self.parser.image is not None:
+            width, height = self.dimensions = self.parser.image.size
+            if max(width, height) > get_max_dimension():
+                self.reject(f"Image dimensions exceed {get_max_dimension()} pixels.")
+        elif self.received > HEADER_LIMIT:
+            self.reject("Could not read the image dimensions.")
+
+    def file_complete(self, file_size):
+        if self.dimensions is None:
+            # Too short to hold a header; SkipFile is not handled at this point
+            self.request.upload_rejection = UploadRejected("Could not read the image dimensions.")
+            self.file.close()
+            return None
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        file.extension = self.extension
+        file.width, file.height = self.dimensions
+        return file
+
+
+def content_addressed_name(file):
+    """Storage name derived from the content hash, shared by identical uploads."""
+    return os.path.join('event_images', file.sha256[:2], f'{file.sha256}{file.extension}')
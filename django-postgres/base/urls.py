@@ -1,14 +1,23 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
-    EventList, EventDetail, RegisterEvent, CreateEvent,
+    EventList, EventDetail, RegisterEvent, BulkRegisterEvent, CreateEvent,
     ListParticipants, PastEventList, FutureEventList,
-    DeleteEvent, DeleteParticipant, RSVPEvent, EventImageUploadView
+    DeleteEvent, DeleteParticipant, RSVPEvent, EventImageUploadView,
+    CreateBooking, UpdateBooking, CancelBooking, EventSearch, EventCalendar
 )
 
+if getattr(settings, 'ASYNC_VIEWS', False):
+    # Served under ASGI: the read endpoints use the async ORM (see base.async_views)
+    from .async_views import EventList, EventDetail, ListParticipants, PastEventList, FutureEventList  # noqa: F811
+
 urlpatterns = [
     path('events/', EventList.as_view(), name='event-list'),  # List all events
     path('events/<int:pk>/', EventDetail.as_view(), name='event-detail'),  # Retrieve a specific event
+    path('events/search/', EventSearch.as_view(), name='event-search'),  # Full-text and fuzzy search over events
+    path('events/calendar/', EventCalendar.as_view(), name='event-calendar'),  # Event counts and summaries per day, week or month
     path('register/', RegisterEvent.as_view(), name='register-event'),  # Register a participant for an event
+    path('register/bulk/', BulkRegisterEvent.as_view(), name='bulk-register-event'),  # Register many participants from CSV or JSON lines
     path('events/create/', CreateEvent.as_view(), name='create-event'),  # Create a new event
     path('events/<int:event_id>/upload-image/', EventImageUploadView.as_view(), name='event-image-upload'),  # Upload image for a specific event
     path('events/<int:pk>/participants/', ListParticipants.as_view(), name='list-participants'),  # List participants of a specific event
@@ -17,5 +26,15 @@ urlpatterns = [
     path('events/<int:pk>/delete/', DeleteEvent.as_view(), name='delete-event'),  # Delete an event
     path('participants/<int:pk>/delete/', DeleteParticipant.as_view(), name='delete-participant'),  # Delete a participant
     path('events/rsvp/', RSVPEvent.as_view(), name='rsvp-event'),
+    path('bookings/', CreateBooking.as_view(), name='create-booking'),  # Book a seat, or join the waitlist when full
+    path('bookings/<int:booking_id>/confirm/', UpdateBooking.as_view(), name='confirm-booking'),
+    path('bookings/<int:booking_id>/cancel/', CancelBooking.as_view(), name='cancel-booking'),  # Frees the seat for the waitlist
     # path('events/book/', BookEvent.as_view(), name='book-event'),
 ]
+
+if getattr(settings, 'ASYNC_VIEWS', False):
+    from .async_views import EventLiveUpdates
+
+    urlpatterns.append(
+        path('events/<int:pk>/live/', EventLiveUpdates.as_view(), name='event-live-updates'),  # SSE stream of registrations and bookings
+    )
@@ -1,125 +1,253 @@
 # base/views.py
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from authentication.authentication import CachedJWTAuthentication, StatelessJWTAuthentication
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.utils.timezone import make_aware
+from django.utils.dateparse import parse_date
 from drf_yasg.utils import swagger_auto_schema
-from datetime import datetime
-from django.db.models import Q
+from django_filters.rest_framework import DjangoFilterBackend
 from .models import Event, Participant, Registration, Booking
-from .serializers import EventSerializer, ParticipantSerializer, RegistrationSerializer, RSVPSerializer, BookingSerializer, EventImageUploadSerializer
+from .serializers import EventSerializer, ParticipantSerializer, RegistrationSerializer, RSVPSerializer, BookingSerializer, EventImageUploadSerializer, EventParticipantSerializer
+from .cache import CachedEventDetailMixin, CachedEventListMixin
+from .conditional import ConditionalGetMixin, aggregate_validators
+from .images import delete_renditions, rendition_paths, schedule_renditions
+from .live import booking_data, publish, registration_data
+from .uploads import EventImageUploadHandler, content_addressed_name, get_max_bytes
+from .imports import import_registrations, read_rows
+from . import seats
+from .registrations import RegistrationClosed, register_participant, upsert_participant
+from .pagination import EventKeysetPagination, EventSearchPagination, ParticipantKeysetPagination
+from .filters import EventSearchFilter, ParticipantFilter
+from .search import search_events
+from .streaming import StreamingListMixin
+from .replicas import ReplicaReadMixin
+from .read_serializers import EventParticipantReadSerializer, EventReadSerializer, FastReadMixin
+from .sparse import SparseFieldsMixin
+from .calendar import BUCKETS, bucket_start, bucket_starts, count_buckets, get_buckets, get_max_buckets, next_bucket
 from rest_framework.parsers import MultiPartParser, FormParser
+import codecs
+import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 class AuthenticatedAPIView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [AllowAny]
 
-class EventList(AuthenticatedAPIView, generics.ListAPIView):
+class ReadOnlyAPIView(AuthenticatedAPIView):
+    # Read endpoints only need the token's claims, not the user row
+    authentication_classes = [StatelessJWTAuthentication]
+
+class EventList(ReplicaReadMixin, ConditionalGetMixin, StreamingListMixin, CachedEventListMixin, FastReadMixin, ReadOnlyAPIView, generics.ListAPIView):
     """View to list all events."""
-    queryset = Event.objects.all()
+    queryset = Event.objects.select_related('stats')
     serializer_class = EventSerializer
+    read_serializer_class = EventReadSerializer
+    pagination_class = EventKeysetPagination
+
+    def get_validators(self, request, *args, **kwargs):
+        return aggregate_validators(Event.objects.all(), 'updated_at', 'stats__updated_at')
+
+class EventSearch(SparseFieldsMixin, ReadOnlyAPIView, generics.ListAPIView):
+    """View to search events by text (`q`), best matches first."""
+    serializer_class = EventSerializer
+    read_serializer_class = EventReadSerializer  # Columns for `?fields=`
+    pagination_class = EventSearchPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = EventSearchFilter
+
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': ['A search query is required.']})
+        return search_events(Event.objects.select_related('stats'), text)
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = EventSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+class EventCalendar(ReplicaReadMixin, ReadOnlyAPIView):
+    """View to count and summarise events per day, week or month between two dates."""
+
+    @swagger_auto_schema(operation_summary="Events per day, week or month (?from=&to=&bucket=)")
+    def get(self, request, *args, **kwargs):
+        start, end = self.get_date(request, 'from'), self.get_date(request, 'to')
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            raise ValidationError({'bucket': [f"Choose one of: {', '.join(BUCKETS)}."]})
+        if start > end:
+            raise ValidationError({'to': ["Must not be before 'from'."]})
+
+        try:
+            # Queries stop at the start of the bucket after 'to', which must exist
+            next_bucket(bucket_start(end, bucket), bucket)
+        except OverflowError:
+            raise ValidationError({'to': [f"Too close to {datetime.date.max} for {bucket} buckets; pick an earlier date."]})
+        if count_buckets(start, end, bucket) > get_max_buckets():
+            raise ValidationError({'to': [f"The range spans more than {get_max_buckets()} {bucket} buckets."]})
+        starts = bucket_starts(start, end, bucket)
+        buckets = get_buckets(starts, bucket)
+        return Response({
+            "bucket": bucket,
+            # Widened to whole buckets
+            "from": starts[0].isoformat(),
+            "to": (next_bucket(starts[-1], bucket) - datetime.timedelta(days=1)).isoformat(),
+            "count": sum(item['count'] for item in buckets),
+            "buckets": buckets,
+        })
+
+    def get_date(self, request, name):
+        try:
+            value = parse_date(request.query_params.get(name, ''))
+        except ValueError:  # Well formed but not a real date
+            value = None
+        if value is None:
+            raise ValidationError({name: ["A date in YYYY-MM-DD format is required."]})
+        return value
 
 class CreateEvent(AuthenticatedAPIView, generics.CreateAPIView):
     """View to create a new event."""
     queryset = Event.objects.all()
     serializer_class = EventSerializer
+
+    def perform_create(self, serializer):
+        event = serializer.save()
+        schedule_renditions(event)
     
 class EventImageUploadView(APIView):
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request, event_id):
+        # Refuse before reading the body when the declared size is already too large
+        if request.META.get('CONTENT_LENGTH', '').isdigit() and int(request.META['CONTENT_LENGTH']) > get_max_bytes() + 64 * 1024:
+            return Response({"error": f"Image is larger than {get_max_bytes()} bytes."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        # Must be set before request.data is parsed
+        request._request.upload_handlers = [EventImageUploadHandler(request._request)]
+
         event = get_object_or_404(Event, id=event_id)
         serializer = EventImageUploadSerializer(data=request.data)
 
+        rejection = getattr(request._request, 'upload_rejection', None)
+        if rejection is not None:
+            return Response({"error": str(rejection)}, status=rejection.status_code)
+
         if serializer.is_valid():
             image = serializer.validated_data['image']
-            event.image = image
+            name = content_addressed_name(image)
+            if event.image and event.image.name == name:
+                # Same file uploaded again; nothing to write or re-render
+                return Response({"message": "Image uploaded successfully"}, status=status.HTTP_200_OK)
+
+            # Identical images are stored once and shared between events
+            if not default_storage.exists(name):
+                name = default_storage.save(name, image)
+            event.image.name = name
+            # Renditions of the old image no longer apply
+            stale = rendition_paths(event.image_renditions)
+            event.image_renditions = {}
             event.save()
+            transaction.on_commit(lambda: delete_renditions(stale))
+            schedule_renditions(event)  # Resized off the request thread
             return Response({"message": "Image uploaded successfully"}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class EventDetail(AuthenticatedAPIView, generics.RetrieveAPIView):
+class EventDetail(ReplicaReadMixin, ConditionalGetMixin, CachedEventDetailMixin, SparseFieldsMixin, ReadOnlyAPIView, generics.RetrieveAPIView):
     """View to retrieve details of a specific event."""
-    queryset = Event.objects.all()
+    queryset = Event.objects.select_related('stats')
     serializer_class = EventSerializer
+    read_serializer_class = EventReadSerializer  # Columns for `?fields=`
 
-    def get(self, request, *args, **kwargs):
-        event_instance = self.get_object()
-        serializer = EventSerializer(event_instance, context={'request': request})
-        return Response(serializer.data)
+    def get_validators(self, request, *args, **kwargs):
+        stamps = Event.objects.filter(pk=kwargs['pk']).values_list('updated_at', 'stats__updated_at').first()
+        if stamps is None:
+            return None, None
+        last_modified = max(stamp for stamp in stamps if stamp is not None)
+        return last_modified, ':'.join(str(stamp) for stamp in stamps)
 
 class RegisterEvent(AuthenticatedAPIView):
     """View to register a participant for an event."""
     
     @swagger_auto_schema(request_body=RegistrationSerializer)
     def post(self, request, *args, **kwargs):
-        event_id = request.data.get('event_id')
-        participant_data = request.data.get('participant')
+        try:
+            event_id = int(request.data.get('event_id'))
+        except (TypeError, ValueError):
+            return Response({"error": "A valid event_id is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        event = get_object_or_404(Event, pk=event_id)
-
-        # Check if the event date and time have passed
-        event_datetime = make_aware(
-            timezone.datetime.combine(event.date, event.time)
-        )
-        if event_datetime < timezone.now():
+        # Validate and handle participant data
+        participant_serializer = ParticipantSerializer(data=request.data.get('participant'))
+        if not participant_serializer.is_valid():
+            return Response(participant_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Upsert the participant, then insert the registration only if the event
+        # exists and has not started; repeated requests return the same registration
+        participant = upsert_participant(**participant_serializer.validated_data)
+        try:
+            registration, created = register_participant(event_id, participant)
+        except Event.DoesNotExist:
+            raise Http404("No Event matches the given query.")
+        except RegistrationClosed:
             return Response({"error": "Event date or time has passed. Registration is closed."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # Validate and handle participant data
-        participant_serializer = ParticipantSerializer(data=participant_data)
-        if participant_serializer.is_valid():
-            participant_email = participant_data['email']
-            participant, created = Participant.objects.get_or_create(
-                email=participant_email,
-                defaults=participant_serializer.validated_data
-            )
-
-            # Check for existing registration
-            if Registration.objects.filter(event=event, participant=participant).exists():
-                return Response({"error": "Participant is already registered for this event."},
-                                status=status.HTTP_400_BAD_REQUEST)
-
-            # Create registration using RegistrationSerializer
-            registration_data = {'event': event.id, 'participant': participant.id}
-            registration_serializer = RegistrationSerializer(data=registration_data)
-            if registration_serializer.is_valid():
-                registration_serializer.save()
-                return Response(registration_serializer.data, status=status.HTTP_201_CREATED)
-
-            return Response(registration_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-        return Response(participant_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-class ListParticipants(AuthenticatedAPIView, generics.ListAPIView):
-    """View to list participants of a specific event."""
-    serializer_class = ParticipantSerializer
+        if created:
+            publish(event_id, 'registration', registration_data(registration))
+        return Response(RegistrationSerializer(registration).data,
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+class BulkRegisterEvent(AuthenticatedAPIView):
+    """View to register many participants at once from CSV or JSON lines."""
+    # Each call can write thousands of rows, so it is not open to anonymous clients
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(operation_summary="Import registrations from CSV (text/csv) or JSON lines")
+    def post(self, request, *args, **kwargs):
+        default_status = request.query_params.get('status', 'pending')
+        if default_status not in dict(Registration.STATUS_CHOICES):
+            return Response({"error": f"Invalid status '{default_status}'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Read the body line by line instead of parsing it into request.data
+        format = 'csv' if request.content_type.startswith('text/csv') else 'jsonl'
+        lines = codecs.iterdecode(request.stream or [], 'utf-8')
+        results = list(import_registrations(read_rows(lines, format), default_status=default_status))
+
+        imported = sum(1 for result in results if result['result'] == 'imported')
+        return Response({
+            "imported": imported,
+            "failed": len(results) - imported,
+            "results": results,
+        }, status=status.HTTP_200_OK)
+
+class ListParticipants(ConditionalGetMixin, FastReadMixin, ReadOnlyAPIView, generics.ListAPIView):
+    """View to list participants of a specific event, with their registration status."""
+    serializer_class = EventParticipantSerializer
+    read_serializer_class = EventParticipantReadSerializer
+    pagination_class = ParticipantKeysetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ParticipantFilter
+
+    def get_validators(self, request, *args, **kwargs):
+        registrations = Registration.objects.filter(event_id=kwargs.get('pk'))
+        return aggregate_validators(registrations, 'updated_at', 'participant__updated_at')
 
     def get_queryset(self):
         event_id = self.kwargs.get('pk')
         if event_id:
-            registration_objects = Registration.objects.filter(event_id=event_id)
-            participants_ids = registration_objects.values_list('participant', flat=True)
-            return Participant.objects.filter(id__in=participants_ids)
+            # One JOIN instead of a participant id subselect
+            return Registration.objects.filter(event_id=event_id).select_related('participant')
         else:
-            return Participant.objects.none()
+            return Registration.objects.none()
         
 class CreateBooking(APIView):
     def post(self, request, *args, **kwargs):
         serializer = BookingSerializer(data=request.data)
         if serializer.is_valid():
-            # Perform any additional checks (e.g., booking availability) before saving
+            # Takes a seat atomically, or waitlists the booking when the event is full
             booking = serializer.save()  # Save the new booking
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -127,15 +255,31 @@ class CreateBooking(APIView):
         
 class UpdateBooking(APIView):
     def put(self, request, booking_id, *args, **kwargs):
-        booking = Booking.objects.get(id=booking_id)
+        booking = get_object_or_404(Booking, id=booking_id)
+        if booking.status != Booking.ALLOCATED:
+            return Response({"error": f"Booking is {booking.status} and has no seat to confirm."},
+                            status=status.HTTP_400_BAD_REQUEST)
         
         # Confirm the booking by setting the 'booked' field to True
         booking.booked = True
         booking.save()
+        publish(booking.event_id, 'booking_confirmed', booking_data(booking))
         
         return Response({"message": "Booking confirmed", "booking_id": booking.id}, status=status.HTTP_200_OK)
 
 
+class CancelBooking(APIView):
+    """View to cancel a booking; its seat goes to the next waitlisted booking."""
+
+    @swagger_auto_schema(operation_summary="Cancel a booking")
+    def post(self, request, booking_id, *args, **kwargs):
+        try:
+            booking = seats.cancel(booking_id)
+        except Booking.DoesNotExist:
+            raise Http404("No Booking matches the given query.")
+        return Response({"message": "Booking cancelled", "booking_id": booking.id}, status=status.HTTP_200_OK)
+
+
 class RSVPEvent(APIView):
     """API to RSVP to an event."""
     
@@ -148,7 +292,7 @@ class RSVPEvent(APIView):
             registration = serializer.save()
 
             # Log the successful RSVP (optional)
-            logger.info(f"RSVP successful for participant {registration.participant.email} to event {registration.event.id}")
+            logger.info(f"RSVP successful for participant {registration.participant.email} to event {registration.event_id}")
 
             return Response({
                 "message": "RSVP successful!",
@@ -179,24 +323,24 @@ class DeleteParticipant(AuthenticatedAPIView, generics.DestroyAPIView):
         participant.delete()
         return Response({"message": "Participant deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
-class PastEventList(AuthenticatedAPIView, generics.ListAPIView):
+class PastEventList(ReplicaReadMixin, StreamingListMixin, CachedEventListMixin, FastReadMixin, ReadOnlyAPIView, generics.ListAPIView):
     """View to list all past events."""
     serializer_class = EventSerializer
+    read_serializer_class = EventReadSerializer
+    pagination_class = EventKeysetPagination
+    cache_scope = 'past'
+    expires_on_event_start = True
 
     def get_queryset(self):
-        now = timezone.now()
-        return Event.objects.filter(
-            Q(date__lt=now.date()) | 
-            (Q(date=now.date()) & Q(time__lt=now.time()))
-        )
+        return Event.objects.filter(starts_at__lt=timezone.now()).select_related('stats')
 
-class FutureEventList(AuthenticatedAPIView, generics.ListAPIView):
+class FutureEventList(ReplicaReadMixin, StreamingListMixin, CachedEventListMixin, FastReadMixin, ReadOnlyAPIView, generics.ListAPIView):
     """View to list all future events."""
     serializer_class = EventSerializer
+    read_serializer_class = EventReadSerializer
+    pagination_class = EventKeysetPagination
+    cache_scope = 'future'
+    expires_on_event_start = True
 
     def get_queryset(self):
-        now = timezone.now()
-        return Event.objects.filter(
-            Q(date__gt=now.date()) | 
-            (Q(date=now.date()) & Q(time__gte=now.time()))
-        )
\ No newline at end of file
+        return Event.objects.filter(starts_at__gte=timezone.now()).select_related('stats')
\ No newline at end of file
@@ -3,6 +3,15 @@ ASGI config for ratiba project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with uvicorn workers under gunicorn, with ASYNC_VIEWS on so the event
+read endpoints use their async views and one process can hold many slow
+clients at once:
+
+    cd django-postgres
+    ASYNC_VIEWS=true gunicorn ratiba.asgi:application -k uvicorn.workers.UvicornWorker --workers 2
+
+or, for a single process, `ASYNC_VIEWS=true uvicorn ratiba.asgi:application`.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
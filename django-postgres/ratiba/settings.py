@@ -61,6 +61,7 @@ SWAGGER_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    'base.metrics.RequestMetricsMiddleware',  # First, so its timings cover the whole stack
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,6 +71,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'authentication.middleware.TokenValidationMiddleware',
+    'base.replicas.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'ratiba.urls'
@@ -101,9 +103,52 @@ DATABASES = {
         'PASSWORD': env('DB_PASSWORD', default='password'),
         'HOST': env('DB_HOST', default='127.0.0.1'),
         'PORT': env('DB_PORT', default='5432'),
+        # Keep connections open between requests, and check them before reuse.
+        # Forced to 0 with ASYNC_VIEWS below, as ASGI does not reuse them.
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+# psycopg 3's connection pool (needs `psycopg[pool]`); replaces persistent connections
+if env.bool('DB_POOL', default=False):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+        'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+        'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+    }
+
+# Optional read replica (base.replicas): event list/detail reads go there, and
+# a client that just wrote reads from the primary for REPLICA_PIN_SECONDS
+if env('DB_REPLICA_HOST', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'HOST': env('DB_REPLICA_HOST'),
+        'PORT': env('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['base.replicas.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = env.int('REPLICA_PIN_SECONDS', default=10)
+
+# Cache settings
+# CACHE_URL selects the backend: locmemcache:// (default), filecache:///var/tmp/ratiba
+# or redis://127.0.0.1:6379/1
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Serialized event payloads (base.cache)
+EVENT_CACHE_ALIAS = 'default'
+EVENT_CACHE_TIMEOUT = env.int('EVENT_CACHE_TIMEOUT', default=300)
+
+# events/calendar/ (base.calendar): the widest range it serves, in buckets, and
+# how many event summaries each bucket carries besides its count
+CALENDAR_MAX_BUCKETS = env.int('CALENDAR_MAX_BUCKETS', default=366)
+CALENDAR_EVENTS_PER_BUCKET = env.int('CALENDAR_EVENTS_PER_BUCKET', default=20)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -112,17 +157,47 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# Password hashing. New hashes use PASSWORD_HASHER ('argon2' needs argon2-cffi,
+# 'bcrypt' needs bcrypt); hashes made by the others still verify and are
+# upgraded on the user's next login.
+_PASSWORD_HASHERS = {
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHER = env('PASSWORD_HASHER', default='pbkdf2')
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS[PASSWORD_HASHER],
+    *(hasher for name, hasher in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+# Login hashing runs in a pool of this many threads (authentication.passwords);
+# once PASSWORD_HASH_QUEUE more logins wait on it, new ones get a 429
+PASSWORD_HASH_WORKERS = env.int('PASSWORD_HASH_WORKERS', default=2)
+PASSWORD_HASH_QUEUE = env.int('PASSWORD_HASH_QUEUE', default=16)
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
     'NON_FIELD_ERRORS_KEY': 'error',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    # orjson-backed when installed, same output as DRF's JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'base.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Used by the login throttles (authentication.throttles); an empty value
+    # turns one off, e.g. on a benchmark server
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': env('LOGIN_RATE_IP', default='30/min') or None,
+        'login_account': env('LOGIN_RATE_ACCOUNT', default='10/min') or None,
+    },
 }
 
 # Simple JWT settings
@@ -131,8 +206,24 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Checks the blacklist through authentication.blacklist's caches
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.CachedTokenRefreshSerializer',
 }
 
+# Refresh token blacklist lookups (authentication.blacklist). The caches are
+# only used with a cache shared by all processes; leave TOKEN_BLACKLIST_FILTER
+# unset to decide from CACHE_URL, or force it with true/false.
+TOKEN_BLACKLIST_CACHE_ALIAS = 'default'
+TOKEN_BLACKLIST_FILTER = env.bool('TOKEN_BLACKLIST_FILTER', default=None)
+TOKEN_BLACKLIST_FILTER_TTL = env.int('TOKEN_BLACKLIST_FILTER_TTL', default=300)
+
+# Users behind JWTs are cached per user id (authentication.authentication).
+# Like the blacklist caches, only with a cache shared by all processes; leave
+# JWT_USER_CACHE unset to decide from CACHE_URL, or force it with true/false.
+JWT_USER_CACHE = env.bool('JWT_USER_CACHE', default=None)
+JWT_USER_CACHE_ALIAS = 'default'
+JWT_USER_CACHE_TIMEOUT = env.int('JWT_USER_CACHE_TIMEOUT', default=60)
+
 # Localization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'Africa/Nairobi'
@@ -151,6 +242,28 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Serve the read-heavy event endpoints with async views (base.async_views).
+# Turn on when running under an ASGI server, see ratiba/asgi.py
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+if ASYNC_VIEWS:
+    # Under ASGI queries run in per-request threads whose connections are
+    # never reused, so persistent ones would only pile up
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 0
+
+# Live updates (events/<pk>/live/, only routed with ASYNC_VIEWS) are signalled
+# with Postgres LISTEN/NOTIFY; 'memory' wakes only streams in the same process.
+# Empty picks by database
+LIVE_UPDATES_BROKER = env('LIVE_UPDATES_BROKER', default='')
+
+# Event image uploads (base.uploads)
+EVENT_IMAGE_MAX_BYTES = env.int('EVENT_IMAGE_MAX_BYTES', default=10 * 1024 * 1024)
+EVENT_IMAGE_MAX_DIMENSION = 8000
+
+# Event image renditions (base.images) are rendered on a background thread pool
+IMAGE_PIPELINE_ASYNC = True
+IMAGE_PIPELINE_WORKERS = env.int('IMAGE_PIPELINE_WORKERS', default=2)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -163,6 +276,26 @@ EMAIL_USE_SSL = False
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
 
+# Outgoing emails are queued in the database and sent by `manage.py send_outbox`
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 30,
+    'RATE_LIMIT': env.float('EMAIL_RATE_LIMIT', default=10),
+    'POLL_INTERVAL': 5,
+}
+
+
+# Request metrics (see base/metrics.py)
+# Adds a Server-Timing header (db, serialize, render, total) to every response
+SERVER_TIMING = env.bool('SERVER_TIMING', default=True)
+# Serve the Prometheus scrape endpoint at /metrics
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+# Scrapers send it as "Authorization: Token <token>"; otherwise only staff users may read /metrics
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+# Log a warning when one statement runs this many times in a request (likely an N+1)
+METRICS_DUPLICATE_QUERY_THRESHOLD = env.int('METRICS_DUPLICATE_QUERY_THRESHOLD', default=5)
+
 
 # Logging configuration
 LOGGING = {
@@ -176,6 +309,7 @@ LOGGING = {
     },
     'root': {
         'handlers': ['console'],
-        'level': 'DEBUG',
+        # DEBUG logs every SQL statement (in DEBUG mode) and every autoreload tick
+        'level': env('LOG_LEVEL', default='INFO'),
     },
 }
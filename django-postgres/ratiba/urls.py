@@ -23,6 +23,8 @@ from drf_yasg import openapi
 from django.conf import settings
 from django.conf.urls.static import static
 
+from base.metrics import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="RATIBA API",
@@ -57,6 +59,9 @@ urlpatterns = [
                                        cache_timeout=0), name='schema-redoc'),
 ]
 
+if settings.METRICS_ENABLED:
+    urlpatterns.insert(0, path('metrics', metrics_view, name='metrics'))
+
 # Serve media files during development
 if settings.DEBUG:  # Only serve media files in debug mode
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)